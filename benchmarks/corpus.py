@@ -0,0 +1,189 @@
+"""合成多语言语料
+
+按固定随机种子生成中英混合的文档（含产品代码、数字、列表），
+并写成 txt / md / docx / pdf 四种格式，供基准测试使用。
+同一参数多次生成的语料完全一致，便于跨提交对比。
+"""
+
+import random
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+FORMATS = ("txt", "md", "docx", "pdf")
+
+_ZH_SUBJECTS = ["系统", "用户", "管理员", "设备", "服务", "数据库", "接口", "模块", "客户端", "网关"]
+_ZH_VERBS = ["支持", "需要", "会自动", "可以手动", "定期", "按需", "优先", "在启动时"]
+_ZH_OBJECTS = [
+    "同步配置文件", "备份历史记录", "校验访问权限", "压缩日志数据", "更新固件版本",
+    "清理临时缓存", "重建检索索引", "发送告警通知", "导出统计报表", "限制并发请求",
+]
+_ZH_TAILS = ["。", "，以保证服务稳定。", "，默认每天执行一次。", "，详见运维手册。", "，失败时会重试三次。"]
+
+_EN_SUBJECTS = ["The gateway", "Each client", "The scheduler", "An operator", "The storage layer",
+                "The indexer", "Every worker", "The API server"]
+_EN_VERBS = ["validates", "replicates", "compresses", "rotates", "caches", "encrypts", "monitors",
+             "throttles"]
+_EN_OBJECTS = ["incoming requests", "audit logs", "session tokens", "configuration snapshots",
+               "firmware images", "search indexes", "billing records", "health checks"]
+_EN_TAILS = [".", " every hour.", " before shutdown.", " using a bounded queue.",
+             " when the disk is almost full."]
+
+
+def product_code(rng: random.Random) -> str:
+    return f"{rng.choice('ABCDKMXZ')}{rng.choice('ABCDKMXZ')}-{rng.randint(100, 999)}"
+
+
+def _zh_sentence(rng: random.Random) -> str:
+    sentence = rng.choice(_ZH_SUBJECTS) + rng.choice(_ZH_VERBS) + rng.choice(_ZH_OBJECTS)
+    if rng.random() < 0.3:
+        sentence = f"型号 {product_code(rng)} 的" + sentence
+    return sentence + rng.choice(_ZH_TAILS)
+
+
+def _en_sentence(rng: random.Random) -> str:
+    sentence = f"{rng.choice(_EN_SUBJECTS)} {rng.choice(_EN_VERBS)} {rng.choice(_EN_OBJECTS)}"
+    if rng.random() < 0.3:
+        sentence += f" for model {product_code(rng)}"
+    return sentence + rng.choice(_EN_TAILS)
+
+
+def paragraph(rng: random.Random, sentences: int = 6, ascii_only: bool = False) -> str:
+    """生成一个段落；ascii_only 时只含英文句子"""
+    parts = []
+    for _ in range(sentences):
+        if ascii_only or rng.random() < 0.4:
+            parts.append(_en_sentence(rng) + " ")
+        else:
+            parts.append(_zh_sentence(rng))
+    return "".join(parts).strip()
+
+
+def generate_document(
+    rng: random.Random, paragraphs: int = 8, ascii_only: bool = False
+) -> Tuple[str, List[str]]:
+    """生成一篇文档，返回（标题，段落列表）"""
+    title = f"{product_code(rng)} 技术说明" if not ascii_only else f"{product_code(rng)} Manual"
+    return title, [paragraph(rng, ascii_only=ascii_only) for _ in range(paragraphs)]
+
+
+def generate_texts(count: int, seed: int = 0) -> List[str]:
+    """直接生成 count 个片段长度的文本（不经过文件解析）"""
+    rng = random.Random(seed)
+    return [paragraph(rng, sentences=rng.randint(4, 8)) for _ in range(count)]
+
+
+def generate_queries(count: int, seed: int = 1) -> List[str]:
+    """生成检索 / 问答用的问题"""
+    rng = random.Random(seed)
+    templates = [
+        lambda: f"{rng.choice(_ZH_SUBJECTS)}如何{rng.choice(_ZH_OBJECTS)}？",
+        lambda: f"型号 {product_code(rng)} 需要{rng.choice(_ZH_OBJECTS)}吗？",
+        lambda: f"How does {rng.choice(_EN_SUBJECTS).lower()} handle {rng.choice(_EN_OBJECTS)}?",
+        lambda: f"{product_code(rng)} {rng.choice(_EN_OBJECTS)}",
+    ]
+    return [rng.choice(templates)() for _ in range(count)]
+
+
+# ================================
+# 各格式写出
+# ================================
+def write_txt(path: Path, title: str, paragraphs: List[str]):
+    path.write_text(title + "\n\n" + "\n\n".join(paragraphs), encoding="utf-8")
+
+
+def write_md(path: Path, title: str, paragraphs: List[str]):
+    lines = [f"# {title}", ""]
+    for idx, text in enumerate(paragraphs, start=1):
+        lines += [f"## 第 {idx} 节", "", text, ""]
+        if idx % 3 == 0:
+            lines += [f"- 要点：{text[:30]}", f"- **注意**：{text[-30:]}", ""]
+    path.write_text("\n".join(lines), encoding="utf-8")
+
+
+def write_docx(path: Path, title: str, paragraphs: List[str]):
+    from docx import Document
+
+    doc = Document()
+    doc.add_heading(title, level=1)
+    for text in paragraphs:
+        doc.add_paragraph(text)
+    doc.save(str(path))
+
+
+def write_pdf(path: Path, title: str, paragraphs: List[str], line_width: int = 90):
+    """写出最小化的文本 PDF（Helvetica 标准字体，仅支持 ASCII 文本）"""
+    lines = [title, ""]
+    for text in paragraphs:
+        words, current = text.split(), ""
+        for word in words:
+            if len(current) + len(word) + 1 > line_width:
+                lines.append(current)
+                current = word
+            else:
+                current = f"{current} {word}".strip()
+        lines += [current, ""]
+
+    def escape(line: str) -> str:
+        return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+    per_page = 60
+    pages = [lines[i:i + per_page] for i in range(0, len(lines), per_page)] or [[""]]
+
+    # 对象编号：1 Catalog，2 Pages，3 Font，之后每页 Page + Contents 各一个
+    objects = {3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"}
+    kids = []
+    for page_idx, page_lines in enumerate(pages):
+        page_id, content_id = 4 + page_idx * 2, 5 + page_idx * 2
+        kids.append(f"{page_id} 0 R")
+        body = "BT /F1 10 Tf 12 TL 50 800 Td " + " ".join(
+            f"({escape(line)}) '" for line in page_lines
+        ) + " ET"
+        stream = body.encode("latin-1", errors="replace")
+        objects[content_id] = (
+            f"<< /Length {len(stream)} >>\nstream\n".encode() + stream + b"\nendstream"
+        )
+        objects[page_id] = (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>"
+        ).encode()
+    objects[1] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    objects[2] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(pages)} >>".encode()
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for obj_id in sorted(objects):
+        offsets[obj_id] = len(out)
+        out += f"{obj_id} 0 obj\n".encode() + objects[obj_id] + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for obj_id in sorted(objects):
+        out += f"{offsets[obj_id]:010d} 00000 n \n".encode()
+    out += (
+        f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\n"
+        f"startxref\n{xref}\n%%EOF\n"
+    ).encode()
+    path.write_bytes(bytes(out))
+
+
+_WRITERS = {"txt": write_txt, "md": write_md, "docx": write_docx, "pdf": write_pdf}
+
+
+def write_corpus(
+    root: Path, docs_per_format: int, paragraphs: int = 8, formats=FORMATS, seed: int = 0
+) -> Dict[str, List[Path]]:
+    """在 root 下按格式生成语料文件，返回 {格式: [文件路径]}
+
+    PDF 只包含英文文本（标准 14 字体不含中文字形）。
+    """
+    rng = random.Random(seed)
+    files: Dict[str, List[Path]] = {}
+    for fmt in formats:
+        directory = Path(root) / fmt
+        directory.mkdir(parents=True, exist_ok=True)
+        files[fmt] = []
+        for idx in range(docs_per_format):
+            title, paras = generate_document(rng, paragraphs, ascii_only=(fmt == "pdf"))
+            path = directory / f"doc_{idx:05d}.{fmt}"
+            _WRITERS[fmt](path, title, paras)
+            files[fmt].append(path)
+    return files
@@ -0,0 +1,951 @@
+#!/usr/bin/env python3
+"""端到端性能基准
+
+在临时目录中生成合成语料与独立的向量库，依次测量：
+
+- load：DocumentProcessor.load_document 各格式吞吐（文件/秒、MB/秒、片段/秒）
+- chunks：入库路径的片段表示（每片段一个 Document vs. 列式 ChunkBatch）的内存、GC 与跨进程序列化开销
+- extract：Markdown / DOCX 按结构提取、按章节分段 vs. 旧的整篇提取与分段（提取耗时、片段数、向量化字符数）
+- splitter：按字符数与按 token 数分段的片段数、片段 token 数分布与实际参与编码的 token 数
+- embed：embedding 批量编码吞吐与单条查询编码延迟
+- search：similarity_search 在不同索引规模下的 p50/p95/p99 延迟
+- chat：ChatAgent.chat 端到端延迟（本地 StubChatModel 代替 Ollama）
+- rerank：交叉编码器重排序的耗时与进入提示词的上下文大小（及估算的预填充耗时）之间的取舍
+- ann：向量索引的召回率与检索延迟（Chroma HNSW 不同 ef_search，NumPy flat / IVF 不同 nprobe）
+- tenants：大小两个租户与元数据过滤下的检索延迟（检索开销应与租户 / 命中的数据量相关）
+- condense：多轮追问改写对检索命中率的影响，以及门控跳过 / 调用 LLM / 命中缓存时增加的延迟
+
+结果写为 JSON，可用 --compare 与历史结果对比，超过阈值的退化返回非零退出码。
+
+用法:
+    python benchmarks/run_benchmarks.py
+        [--sections load,chunks,extract,splitter,embed,search,chat,rerank,ann,tenants,condense]
+        [--embeddings model|hash] [--sizes 1000,5000,10000]
+        [--output 结果.json] [--compare 基线.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from corpus import FORMATS, generate_queries, generate_texts, write_corpus  # noqa: E402
+from stubs import (  # noqa: E402
+    HashEmbeddings,
+    StubChatModel,
+    StubCondenseModel,
+    StubCrossEncoder,
+)
+
+from config import Config  # noqa: E402
+
+
+# ================================
+# 统计工具
+# ================================
+def percentile(sorted_samples: List[float], pct: float) -> float:
+    """最近秩百分位数（输入需已排序）"""
+    if not sorted_samples:
+        return 0.0
+    rank = max(1, round(pct / 100 * len(sorted_samples) + 0.4999))
+    return sorted_samples[min(rank, len(sorted_samples)) - 1]
+
+
+def summarize(samples: List[float]) -> dict:
+    """把秒为单位的耗时样本汇总为毫秒统计"""
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3) if ordered else 0.0,
+        "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3) if ordered else 0.0,
+    }
+
+
+def timed(func: Callable, *args, **kwargs):
+    """返回（耗时秒数, 函数返回值）"""
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - started, result
+
+
+# ================================
+# 运行上下文
+# ================================
+@dataclass
+class BenchContext:
+    args: argparse.Namespace
+    workdir: Path
+    queries: List[str]
+    _vector_store: Optional[object] = field(default=None, repr=False)
+
+    def embeddings(self):
+        if self.args.embeddings == "hash":
+            return HashEmbeddings()
+        from embedding_backends import create_embeddings
+
+        return create_embeddings()[0]
+
+    def vector_store(self):
+        """各节共用的向量库（隔离在临时目录，关闭 embedding 缓存以测量真实开销）"""
+        if self._vector_store is None:
+            from vector_store import VectorStore
+
+            self._vector_store = VectorStore(embeddings=self.embeddings())
+        return self._vector_store
+
+    def grow_store(self, size: int, seed: int = 0):
+        """把向量库扩充到 size 个片段（直接写入预先计算的向量）"""
+        store = self.vector_store()
+        current = store._count_docs()
+        if current >= size:
+            return
+        texts = generate_texts(size - current, seed=seed + current)
+        vectors = store.embeddings.embed_documents(texts)
+        ids = [f"bench-{current + i:08d}" for i in range(len(texts))]
+        metadatas = [{"source": f"bench_{(current + i) // 50:05d}.txt"} for i in range(len(texts))]
+        store.write_chunks(ids, texts, metadatas, vectors)
+
+
+def isolate_config(workdir: Path):
+    """把所有持久化路径指向临时目录，避免污染真实数据"""
+    Config.VECTOR_DB_DIR = workdir / "chroma_db"
+    Config.UPLOAD_DIR = workdir / "uploads"
+    Config.TENANT_UPLOAD_DIR = workdir / "tenants"
+    Config.CACHE_DIR = workdir / "cache"
+    Config.MANIFEST_DIR = workdir / "chroma_manifest"
+    Config.LEXICAL_INDEX_DIR = workdir / "lexical_index"
+    Config.COLLECTION_NAME = "bench"
+    Config.EXTRACTION_CACHE_DIR = workdir / "cache" / "extracted"
+    Config.EMBEDDING_CACHE_ENABLED = False
+    Config.EXTRACTION_CACHE_ENABLED = False
+    Config.ANSWER_CACHE_ENABLED = False
+
+
+# ================================
+# 各基准节
+# ================================
+def bench_load(ctx: BenchContext) -> dict:
+    from document_processor import DocumentProcessor
+    from extraction_cache import ExtractionCache
+
+    processor = DocumentProcessor()
+    # 开启提取缓存的处理器：第一遍写入缓存，第二遍测量命中缓存时（只分段）的吞吐
+    cached_processor = DocumentProcessor()
+    cached_processor.extraction_cache = ExtractionCache(Config.EXTRACTION_CACHE_DIR)
+    files = write_corpus(
+        ctx.workdir / "corpus", ctx.args.docs, paragraphs=ctx.args.paragraphs,
+        formats=ctx.args.formats,
+    )
+
+    results = {}
+    for fmt, paths in files.items():
+        total_bytes = sum(path.stat().st_size for path in paths)
+        processor.load_document(str(paths[0]))  # 预热（解析库按需导入）
+        chunks, elapsed = 0, 0.0
+        for path in paths:
+            seconds, docs = timed(processor.load_document, str(path))
+            elapsed += seconds
+            chunks += len(docs)
+        for path in paths:
+            cached_processor.load_document(str(path))
+        cached = sum(timed(cached_processor.load_document, str(path))[0] for path in paths)
+        results[fmt] = {
+            "files": len(paths),
+            "bytes": total_bytes,
+            "chunks": chunks,
+            "seconds": round(elapsed, 4),
+            "files_per_s": round(len(paths) / elapsed, 2) if elapsed else 0.0,
+            "mb_per_s": round(total_bytes / 1e6 / elapsed, 3) if elapsed else 0.0,
+            "chunks_per_s": round(chunks / elapsed, 2) if elapsed else 0.0,
+            "cached_files_per_s": round(len(paths) / cached, 2) if cached else 0.0,
+        }
+        print(f"  {fmt:5s} {results[fmt]['files_per_s']:>9.2f} 文件/秒 "
+              f"{results[fmt]['chunks_per_s']:>10.2f} 片段/秒，"
+              f"命中提取缓存 {results[fmt]['cached_files_per_s']:>9.2f} 文件/秒")
+    stats = cached_processor.extraction_cache.stats()
+    results["extraction_cache"] = {"entries": stats["entries"], "bytes": stats["bytes"]}
+    return results
+
+
+def bench_chunks(ctx: BenchContext) -> dict:
+    """解析约 --chunk-corpus 个片段并全部保留，对比两种片段表示：
+
+    - documents：每个片段一个 LangChain Document + 元数据字典（解析进程传回 (文本, 元数据) 列表）
+    - batch：每个文件一个列式 ChunkBatch（文件级元数据共享，逐片段的列为 array）
+
+    测量解析后保留的 Python 堆内存与峰值（tracemalloc）、GC 跟踪的对象数与各代回收次数、
+    解析进程传回结果的序列化字节数。
+    """
+    import gc
+    import pickle
+    import tracemalloc
+
+    from document_processor import DocumentProcessor
+
+    args = ctx.args
+    processor = DocumentProcessor()
+    # 每篇约 55 个片段（CHUNK_SIZE=1000 时）
+    docs = max(1, args.chunk_corpus // 55)
+    paths = write_corpus(
+        ctx.workdir / "chunk_corpus", docs, paragraphs=200, formats=["txt"], seed=args.seed
+    )["txt"]
+
+    def documents(path):
+        docs = processor.load_batch(str(path)).to_documents()
+        return docs, [(doc.page_content, doc.metadata) for doc in docs]
+
+    def batch(path):
+        chunk_batch = processor.load_batch(str(path))
+        return chunk_batch, chunk_batch
+
+    def measure(load) -> dict:
+        gc.collect()
+        collections = [stats["collections"] for stats in gc.get_stats()]
+        tracked = len(gc.get_objects())
+        tracemalloc.start()
+        started = time.perf_counter()
+        held, chunks, wire = [], 0, 0
+        for path in paths:
+            result, payload = load(path)
+            held.append(result)
+            chunks += len(result)
+            wire += len(pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL))
+        seconds = time.perf_counter() - started
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result = {
+            "chunks": chunks,
+            "seconds": round(seconds, 3),
+            "python_mb": round(current / 1e6, 1),
+            "peak_mb": round(peak / 1e6, 1),
+            "gc_tracked_objects": len(gc.get_objects()) - tracked,
+            "gc_collections": [
+                stats["collections"] - before
+                for stats, before in zip(gc.get_stats(), collections)
+            ],
+            "pickle_mb": round(wire / 1e6, 1),
+        }
+        del held
+        gc.collect()
+        return result
+
+    processor.load_batch(str(paths[0]))  # 预热
+    results = {"documents": measure(documents), "batch": measure(batch)}
+    for name, result in results.items():
+        print(f"  {name:>9s}: {result['chunks']} 片段，保留 {result['python_mb']} MB"
+              f"（峰值 {result['peak_mb']} MB），GC 跟踪对象 +{result['gc_tracked_objects']}，"
+              f"回收 {result['gc_collections']}，序列化 {result['pickle_mb']} MB")
+    return results
+
+
+def _legacy_extract(path: Path) -> str:
+    """旧的整篇提取：Markdown 渲染为 HTML 后去标签，DOCX 只取段落文字（对比基线）"""
+    import re
+
+    if path.suffix == ".md":
+        import markdown
+
+        return re.sub(r"<[^>]+>", "", markdown.markdown(path.read_text(encoding="utf-8")))
+    from docx import Document
+
+    return "\n\n".join(para.text for para in Document(str(path)).paragraphs if para.text.strip())
+
+
+def bench_extract(ctx: BenchContext) -> dict:
+    """Markdown / DOCX：旧的整篇提取 + 整篇分段 vs. 按结构提取 + 按章节分段。
+
+    测量每个文件的提取耗时、片段数与需要向量化的总字符数（含片段间重叠）。
+    旧路径依赖 markdown 库，未安装时只测量结构化路径。
+    """
+    from document_processor import DocumentProcessor
+
+    args = ctx.args
+    processor = DocumentProcessor()
+    formats = [fmt for fmt in ("md", "docx") if fmt in args.formats]
+    files = write_corpus(
+        ctx.workdir / "extract_corpus", args.docs, paragraphs=args.extract_paragraphs,
+        formats=formats, seed=args.seed,
+    )
+    try:
+        import markdown  # noqa: F401
+        has_legacy = True
+    except ImportError:
+        has_legacy = False
+        print("  ℹ 未安装 markdown，跳过旧提取路径的对比")
+
+    extractors = {"md": processor._extract_markdown, "docx": processor._extract_docx}
+    results = {}
+    for fmt, paths in files.items():
+        modes = {
+            "structured": (
+                lambda path, fmt=fmt: extractors[fmt](path),
+                lambda sections: [chunk for chunk, _, _ in processor._split_sections(sections)],
+            ),
+        }
+        if has_legacy:
+            modes["legacy"] = (_legacy_extract, processor.text_splitter.split_text)
+        results[fmt] = {}
+        for mode, (extract, split) in sorted(modes.items()):
+            extract(paths[0])  # 预热（解析库按需导入）
+            extract_seconds, chunks, chars = 0.0, 0, 0
+            for path in paths:
+                seconds, extracted = timed(extract, path)
+                extract_seconds += seconds
+                pieces = split(extracted)
+                chunks += len(pieces)
+                chars += sum(len(piece) for piece in pieces)
+            results[fmt][mode] = {
+                "extract_ms": round(extract_seconds / len(paths) * 1000, 3),
+                "chunks": chunks,
+                "embedded_chars": chars,
+            }
+            print(f"  {fmt:5s} {mode:>10s}: 提取 {results[fmt][mode]['extract_ms']:.3f} ms/文件，"
+                  f"{chunks} 片段，向量化 {chars} 字符")
+    return results
+
+
+def bench_splitter(ctx: BenchContext) -> dict:
+    """同一语料（txt / md）分别按字符数（CHUNK_SIZE / CHUNK_OVERLAP）与按 token 数分段：
+
+    片段数、片段 token 数分布、超出模型最大序列长度（编码时被截断）的片段数，
+    以及片段 token 总数与实际参与编码的 token 数。
+    --embeddings hash 时 token 数按字符估算（estimate_tokens），否则使用模型的分词器。
+    """
+    from context_packer import estimate_tokens
+    from document_processor import DocumentProcessor
+    from embedding_backends import TokenCounter, embedding_max_seq_length
+    from text_splitters import SentenceTokenSplitter
+
+    args = ctx.args
+    if args.embeddings == "hash":
+        def count(texts):
+            return [estimate_tokens(text) for text in texts]
+    else:
+        count = TokenCounter().lengths
+    limit = embedding_max_seq_length() - 2
+    files = write_corpus(
+        ctx.workdir / "splitter_corpus", args.docs, paragraphs=args.extract_paragraphs,
+        formats=[fmt for fmt in ("txt", "md") if fmt in args.formats], seed=args.seed,
+    )
+    paths = [path for fmt_paths in files.values() for path in fmt_paths]
+
+    by_chars = DocumentProcessor()
+    by_tokens = DocumentProcessor()
+    by_tokens.text_splitter = SentenceTokenSplitter(count, limit, Config.CHUNK_OVERLAP_TOKENS)
+    by_tokens.chunk_length, by_tokens.chunk_size = by_tokens.text_splitter.length, limit
+
+    results = {"max_tokens": limit}
+    for name, processor in (("chars", by_chars), ("tokens", by_tokens)):
+        started = time.perf_counter()
+        texts = [text for path in paths for text in processor.load_batch(str(path)).texts]
+        seconds = time.perf_counter() - started
+        counts = sorted(count(texts))
+        results[name] = {
+            "chunks": len(texts),
+            "seconds": round(seconds, 3),
+            "tokens": sum(counts),
+            "embedded_tokens": sum(min(tokens, limit) for tokens in counts),
+            "truncated_chunks": sum(1 for tokens in counts if tokens > limit),
+            "tokens_p50": percentile(counts, 50),
+            "tokens_p95": percentile(counts, 95),
+            "tokens_max": counts[-1] if counts else 0,
+        }
+        result = results[name]
+        print(f"  {name:>6s}: {result['chunks']} 片段，token p50/p95/max "
+              f"{result['tokens_p50']}/{result['tokens_p95']}/{result['tokens_max']}，"
+              f"共 {result['tokens']} token，参与编码 {result['embedded_tokens']}，"
+              f"被截断片段 {result['truncated_chunks']}")
+    return results
+
+
+def bench_embed(ctx: BenchContext) -> dict:
+    embeddings = ctx.vector_store().embeddings
+    texts = generate_texts(ctx.args.embed_texts, seed=100)
+
+    embeddings.embed_documents(texts[:8])  # 预热
+    seconds, _ = timed(embeddings.embed_documents, texts)
+    query_samples = [timed(embeddings.embed_query, q)[0] for q in ctx.queries]
+
+    result = {
+        "texts": len(texts),
+        "seconds": round(seconds, 4),
+        "texts_per_s": round(len(texts) / seconds, 2) if seconds else 0.0,
+        "query": summarize(query_samples),
+    }
+    print(f"  批量编码 {result['texts_per_s']:.2f} 条/秒，"
+          f"查询编码 p50 {result['query']['p50_ms']} ms")
+    return result
+
+
+def bench_search(ctx: BenchContext) -> dict:
+    store = ctx.vector_store()
+    modes = ["vector"] + (["hybrid"] if store.lexical_index is not None else [])
+
+    results = {}
+    for size in ctx.args.sizes:
+        build_seconds, _ = timed(ctx.grow_store, size)
+        entry = {"build_seconds": round(build_seconds, 3)}
+        for mode in modes:
+            store.similarity_search(ctx.queries[0], mode=mode)  # 预热
+            samples = [
+                timed(store.similarity_search, query, None, mode)[0] for query in ctx.queries
+            ]
+            entry[mode] = summarize(samples)
+        results[str(size)] = entry
+        print("  " + f"{size:>8d} 片段: " + "，".join(
+            f"{mode} p50 {entry[mode]['p50_ms']} / p99 {entry[mode]['p99_ms']} ms"
+            for mode in modes
+        ))
+    return results
+
+
+def bench_chat(ctx: BenchContext) -> dict:
+    from chat_agent import ChatAgent
+    from metrics import metrics
+
+    ctx.grow_store(ctx.args.sizes[0])
+    agent = ChatAgent(ctx.vector_store())
+    agent.llm = StubChatModel(
+        first_token_ms=ctx.args.stub_first_token_ms,
+        tokens_per_second=ctx.args.stub_tokens_per_second,
+    )
+    if agent.condenser is not None:
+        agent.condenser.llm = StubCondenseModel(
+            first_token_ms=ctx.args.stub_first_token_ms,
+            tokens_per_second=ctx.args.stub_tokens_per_second,
+        )
+    stub_ms = agent.llm._total_delay() * 1000
+
+    metrics.reset()
+    samples = []
+    for idx, query in enumerate(ctx.queries[:ctx.args.chat_queries]):
+        seconds, _ = timed(agent.chat, query, f"bench-{idx % 4}")
+        samples.append(seconds)
+
+    result = summarize(samples)
+    result["stub_llm_ms"] = round(stub_ms, 3)
+    result["overhead_p50_ms"] = round(result["p50_ms"] - stub_ms, 3)
+    # 内置指标中的各阶段 p50，定位开销所在
+    result["stages_p50_ms"] = {
+        stage: summary["p50"] for stage, summary in metrics.snapshot()["stages_ms"].items()
+    }
+    print(f"  chat p50 {result['p50_ms']} ms（其中模拟 LLM {result['stub_llm_ms']} ms），"
+          f"p99 {result['p99_ms']} ms")
+    return result
+
+
+def bench_rerank(ctx: BenchContext) -> dict:
+    """对比直接取前 k 个片段与"多取候选 + 重排保留前 N 个"的检索耗时、上下文 token 数与估算的预填充耗时"""
+    from context_packer import ContextPacker
+    from reranker import CrossEncoderReranker, create_cross_encoder
+
+    args = ctx.args
+    ctx.grow_store(args.sizes[0])
+    store = ctx.vector_store()
+    queries = ctx.queries[:args.rerank_queries]
+    # 不限预算，只用来按提示词中的格式统计片段 token 数
+    packer = ContextPacker(budget=10 ** 9, chunk_overlap=Config.CHUNK_OVERLAP)
+
+    if args.embeddings == "hash":
+        reranker = CrossEncoderReranker(
+            lambda: StubCrossEncoder(pair_ms=args.stub_rerank_pair_ms),
+            batch_size=Config.RERANK_BATCH_SIZE,
+        )
+    else:
+        reranker = CrossEncoderReranker(create_cross_encoder, batch_size=Config.RERANK_BATCH_SIZE)
+    reranker.load()
+
+    def context_tokens(query: str, docs) -> int:
+        return packer.pack(query, docs, []).tokens["context"]
+
+    def entry(retrieve, rerank, tokens) -> dict:
+        prefill_ms = sum(tokens) / len(tokens) / args.prefill_tokens_per_second * 1000
+        result = {
+            "retrieve": summarize(retrieve),
+            "context_tokens": round(sum(tokens) / len(tokens), 1),
+            "prefill_est_ms": round(prefill_ms, 3),
+        }
+        if rerank is not None:
+            result["rerank"] = summarize(rerank)
+        result["total_est_ms"] = round(
+            result["retrieve"]["p50_ms"] + (result["rerank"]["p50_ms"] if rerank else 0.0)
+            + prefill_ms, 3
+        )
+        return result
+
+    results = {}
+    store.similarity_search(queries[0])  # 预热
+    for k in sorted({Config.RETRIEVAL_K, *args.rerank_candidates}):
+        retrieve, tokens = [], []
+        for query in queries:
+            seconds, docs = timed(store.similarity_search, query, k)
+            retrieve.append(seconds)
+            tokens.append(context_tokens(query, docs))
+        results[f"top{k}"] = entry(retrieve, None, tokens)
+
+    for candidates in args.rerank_candidates:
+        reranker.clear_cache()
+        retrieve, rerank, cached, tokens = [], [], [], []
+        for query in queries:
+            seconds, docs = timed(store.similarity_search, query, candidates)
+            retrieve.append(seconds)
+            seconds, kept = timed(reranker.rerank, query, docs, args.rerank_top_n)
+            rerank.append(seconds)
+            tokens.append(context_tokens(query, kept))
+            # 相同问题再次重排：分数全部命中缓存
+            cached.append(timed(reranker.rerank, query, docs, args.rerank_top_n)[0])
+        name = f"rerank{candidates}_top{args.rerank_top_n}"
+        results[name] = entry(retrieve, rerank, tokens)
+        results[name]["rerank_cached"] = summarize(cached)
+
+    for name, result in results.items():
+        rerank_ms = result["rerank"]["p50_ms"] if "rerank" in result else 0.0
+        print(f"  {name:>16s}: 上下文 {result['context_tokens']:>8.1f} token，"
+              f"重排 p50 {rerank_ms} ms，估算预填充 {result['prefill_est_ms']} ms，"
+              f"合计 {result['total_est_ms']} ms")
+    return results
+
+
+def exact_neighbors(vectors, queries, k: int, space: str) -> List[set]:
+    """暴力计算每个查询的真实前 k 个近邻（行号集合）"""
+    import numpy as np
+
+    if space == "l2":
+        scores = 2 * queries @ vectors.T - np.einsum("ij,ij->i", vectors, vectors)
+    else:
+        if space == "cosine":
+            vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        scores = queries @ vectors.T
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    return [set(row.tolist()) for row in top]
+
+
+def bench_ann(ctx: BenchContext) -> dict:
+    """同一批向量分别写入各索引，测量 recall@k 与检索延迟（不含查询编码）"""
+    import numpy as np
+
+    from vector_store import VectorStore
+
+    args = ctx.args
+    k = args.ann_k
+    embeddings = ctx.embeddings()
+    texts = generate_texts(args.ann_size, seed=args.seed + 200)
+    vectors = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+    queries = [embeddings.embed_query(query) for query in ctx.queries]
+    truth = exact_neighbors(vectors, np.asarray(queries, dtype=np.float32), k, Config.VECTOR_SPACE)
+    ids = [f"ann-{i:08d}" for i in range(len(texts))]
+    metadatas = [{"source": f"ann_{i // 50:05d}.txt"} for i in range(len(texts))]
+    rows = {doc_id: row for row, doc_id in enumerate(ids)}
+
+    @contextmanager
+    def index(name: str, **overrides):
+        """按临时覆盖的配置新建一个只含向量索引的 VectorStore 并写入全部向量
+
+        返回（VectorStore, 构建秒数）；覆盖在 with 块内一直有效（调整 ef_search 会重新打开集合）。
+        """
+        overrides = {"COLLECTION_NAME": f"ann_{name}", "LEXICAL_INDEX_ENABLED": False, **overrides}
+        saved = {key: getattr(Config, key) for key in overrides}
+        for key, value in overrides.items():
+            setattr(Config, key, value)
+        try:
+            store = VectorStore(embeddings=embeddings)
+            # NumPy IVF 在写入过程中训练，构建耗时已包含训练
+            seconds, _ = timed(store.write_chunks, ids, texts, metadatas, vectors.tolist())
+            yield store, round(seconds, 3)
+            if store._is_numpy_backend():
+                store.vectorstore.close()
+        finally:
+            for key, value in saved.items():
+                setattr(Config, key, value)
+
+    def measure(store: VectorStore) -> dict:
+        vectorstore = store.vectorstore
+        vectorstore.similarity_search_by_vector(queries[0], k)  # 预热
+        samples, found = [], 0
+        for query, expected in zip(queries, truth):
+            seconds, docs = timed(vectorstore.similarity_search_by_vector, query, k)
+            samples.append(seconds)
+            found += len(expected & {rows[doc.id] for doc in docs})
+        return {"recall": round(found / (k * len(queries)), 4), **summarize(samples)}
+
+    results = {}
+    with index("chroma", VECTOR_BACKEND="chroma") as (store, build_seconds):
+        for ef_search in args.ann_ef_search:
+            store.set_search_params(ef_search=ef_search)
+            results[f"chroma_ef{ef_search}"] = {"build_seconds": build_seconds, **measure(store)}
+
+    for dtype in ("float32", "float16"):
+        with index(f"flat_{dtype}", VECTOR_BACKEND="numpy", NUMPY_INDEX_DTYPE=dtype) as (
+            store, build_seconds
+        ):
+            vector_mb = len(texts) * vectors.shape[1] * np.dtype(dtype).itemsize / 1e6
+            results[f"numpy_flat_{dtype}"] = {
+                "build_seconds": build_seconds, "vector_mb": round(vector_mb, 2), **measure(store),
+            }
+
+    with index("ivf", VECTOR_BACKEND="numpy", NUMPY_IVF_NLIST=args.ann_nlist) as (
+        store, build_seconds
+    ):
+        for nprobe in args.ann_nprobe:
+            store.set_search_params(nprobe=nprobe)
+            results[f"numpy_ivf{args.ann_nlist}_nprobe{nprobe}"] = {
+                "build_seconds": build_seconds, **measure(store),
+            }
+
+    print(f"  {len(texts)} 个向量，{len(queries)} 个查询，recall@{k}：")
+    for name, result in results.items():
+        print(f"  {name:>24s}: 召回率 {result['recall']:.4f}，"
+              f"p50 {result['p50_ms']} / p95 {result['p95_ms']} ms")
+    return results
+
+
+def bench_tenants(ctx: BenchContext) -> dict:
+    """大租户与小租户各自检索、大租户内按文档类型过滤，对比检索延迟（不含查询编码）"""
+    from search_filters import SearchFilter
+    from vector_store import VectorStore
+
+    args = ctx.args
+    embeddings = ctx.embeddings()
+    queries = [embeddings.embed_query(query) for query in ctx.queries]
+    # 10 种文档类型均匀分布，按一种类型过滤时命中 10% 的片段
+    doc_types = [f"t{i}" for i in range(10)]
+
+    def fill(store: VectorStore, size: int, seed: int) -> float:
+        texts = generate_texts(size, seed=seed)
+        ids = [f"{store.logical_name}-{i:08d}" for i in range(size)]
+        metadatas = [
+            {"source": f"tenant_{i // 50:05d}.txt", "doc_type": doc_types[i % 10],
+             "modified_at": 1_700_000_000 + i}
+            for i in range(size)
+        ]
+        return timed(
+            store.write_chunks, ids, texts, metadatas, embeddings.embed_documents(texts)
+        )[0]
+
+    def measure(store: VectorStore, where: Optional[dict] = None) -> dict:
+        vectorstore = store.vectorstore
+        vectorstore.similarity_search_by_vector(queries[0], k=Config.RETRIEVAL_K, filter=where)
+        samples = [
+            timed(vectorstore.similarity_search_by_vector, query, k=Config.RETRIEVAL_K,
+                  filter=where)[0]
+            for query in queries
+        ]
+        return summarize(samples)
+
+    results = {}
+    for backend in ("chroma", "numpy"):
+        saved = Config.VECTOR_BACKEND, Config.COLLECTION_NAME, Config.LEXICAL_INDEX_ENABLED
+        Config.VECTOR_BACKEND = backend
+        Config.COLLECTION_NAME = f"tenants_{backend}"
+        Config.LEXICAL_INDEX_ENABLED = False
+        try:
+            root = VectorStore(embeddings=embeddings)
+            large, small = root.for_tenant("large"), root.for_tenant("small")
+            build = fill(large, args.tenant_large, args.seed + 300)
+            build += fill(small, args.tenant_small, args.seed + 400)
+            where = SearchFilter(doc_type=doc_types[0]).where()
+            results[backend] = {
+                "build_seconds": round(build, 3),
+                f"large_{args.tenant_large}": measure(large),
+                f"small_{args.tenant_small}": measure(small),
+                f"large_{args.tenant_large}_doc_type_10pct": measure(large, where),
+            }
+            for store in (large, small):
+                store.close()
+        finally:
+            Config.VECTOR_BACKEND, Config.COLLECTION_NAME, Config.LEXICAL_INDEX_ENABLED = saved
+
+    for backend, result in results.items():
+        print(f"  {backend}: " + "，".join(
+            f"{name} p50 {entry['p50_ms']} ms"
+            for name, entry in result.items() if isinstance(entry, dict)
+        ))
+    return results
+
+
+# 依赖上文的追问（单独检索时与目标片段无关）
+_FOLLOW_UPS = ["它多久执行一次？", "那失败了怎么办？", "这个操作需要管理员权限吗？", "还有其他限制吗？",
+               "它的默认配置呢？", "What happens if it fails?"]
+
+
+def bench_condense(ctx: BenchContext) -> dict:
+    """多轮对话：首轮问题取自目标片段，追问省略主语。
+
+    对比直接用追问检索与先改写再检索时目标片段进入前 k 个的比例，
+    并测量门控跳过（首轮 / 自包含问题）、调用 LLM 改写与命中改写缓存时增加的延迟。
+    """
+    import re
+
+    from langchain_core.messages import AIMessage, HumanMessage
+
+    from query_condenser import QueryCondenser
+
+    args = ctx.args
+    ctx.grow_store(args.sizes[0])
+    store = ctx.vector_store()
+    k = Config.RETRIEVAL_K
+    rng = random.Random(args.seed + 500)
+    chunks = store._collection().get(limit=args.sizes[0], include=["documents"])
+    picks = rng.sample(range(len(chunks["ids"])), min(args.condense_queries, len(chunks["ids"])))
+
+    model = StubCondenseModel(
+        first_token_ms=args.stub_first_token_ms, tokens_per_second=args.stub_tokens_per_second
+    )
+    condenser = QueryCondenser(
+        model,
+        history_messages=Config.CONDENSE_HISTORY_MESSAGES,
+        min_query_chars=Config.CONDENSE_MIN_QUERY_CHARS,
+    )
+
+    def opening(text: str) -> str:
+        """片段的前两句作为首轮问题"""
+        sentences = [part for part in re.split(r"(?<=[。.])\s*", text) if part]
+        return "".join(sentences[:2])
+
+    def hit(query: str, target: str) -> bool:
+        return any(doc.id == target for doc in store.similarity_search(query, k))
+
+    answer = StubChatModel().answer
+    hits = {"first_turn": 0, "follow_up_raw": 0, "follow_up_condensed": 0}
+    skipped, llm, cached = [], [], []
+    self_contained_skipped = 0
+    store.similarity_search(ctx.queries[0])  # 预热
+    for idx in picks:
+        target, first = chunks["ids"][idx], opening(chunks["documents"][idx])
+        history = [HumanMessage(content=first), AIMessage(content=answer)]
+        follow_up = rng.choice(_FOLLOW_UPS)
+
+        hits["first_turn"] += hit(first, target)
+        hits["follow_up_raw"] += hit(follow_up, target)
+        seconds, rewritten = timed(condenser.condense, follow_up, history)
+        llm.append(seconds)
+        hits["follow_up_condensed"] += hit(rewritten, target)
+        cached.append(timed(condenser.condense, follow_up, history)[0])
+
+        # 首轮（没有历史）与自包含的问题（另一个片段的开头）都应被门控跳过
+        skipped.append(timed(condenser.condense, first, [])[0])
+        other = opening(chunks["documents"][rng.randrange(len(chunks["ids"]))])
+        before = condenser.skipped
+        condenser.condense(other, history)
+        self_contained_skipped += condenser.skipped - before
+
+    turns = len(picks)
+    stats = condenser.stats()
+    result = {
+        "k": k,
+        "turns": turns,
+        "hit_rate": {name: round(count / turns, 4) for name, count in hits.items()},
+        "self_contained_skip_rate": round(self_contained_skipped / turns, 4),
+        "skipped": summarize(skipped),
+        "llm": summarize(llm),
+        "cached": summarize(cached),
+        "llm_calls": stats["rewrites"] + stats["failures"],
+    }
+    rates = result["hit_rate"]
+    print(f"  命中率@{k}: 首轮 {rates['first_turn']:.1%}，追问直接检索 {rates['follow_up_raw']:.1%}，"
+          f"改写后 {rates['follow_up_condensed']:.1%}；自包含问题跳过 "
+          f"{result['self_contained_skip_rate']:.1%}")
+    print(f"  增加延迟 p50: 门控跳过 {result['skipped']['p50_ms']} ms，"
+          f"调用 LLM {result['llm']['p50_ms']} ms，命中缓存 {result['cached']['p50_ms']} ms")
+    return result
+
+
+# 节名 -> 测量函数（按此顺序执行）
+SECTIONS: Dict[str, Callable[[BenchContext], dict]] = {
+    "load": bench_load,
+    "chunks": bench_chunks,
+    "extract": bench_extract,
+    "splitter": bench_splitter,
+    "embed": bench_embed,
+    "search": bench_search,
+    "chat": bench_chat,
+    "rerank": bench_rerank,
+    "ann": bench_ann,
+    "tenants": bench_tenants,
+    "condense": bench_condense,
+}
+
+
+# ================================
+# 结果对比
+# ================================
+def flatten(data: dict, prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in data.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> List[str]:
+    """对比两次结果，返回超过阈值的退化项
+
+    *_ms 越小越好，*_per_s 越大越好；max_ms（单次抖动大）与其他指标只记录不判定。
+    """
+    now, before = flatten(current["results"]), flatten(baseline["results"])
+    regressions = []
+    for name in sorted(now.keys() & before.keys()):
+        old, new = before[name], now[name]
+        if not old:
+            continue
+        change = (new - old) / old
+        if name.endswith("_ms") and not name.endswith(("max_ms", "stub_llm_ms")):
+            worse = change > threshold
+        elif name.endswith("_per_s"):
+            worse = -change > threshold
+        else:
+            continue
+        marker = "✗" if worse else " "
+        print(f"  {marker} {name:45s} {old:>12.3f} -> {new:>12.3f} ({change:+.1%})")
+        if worse:
+            regressions.append(name)
+    return regressions
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    def int_list(value: str) -> List[int]:
+        return sorted(int(item) for item in value.split(",") if item)
+
+    parser = argparse.ArgumentParser(description="端到端性能基准")
+    parser.add_argument("--sections", default=",".join(SECTIONS),
+                        help=f"要运行的基准节（逗号分隔）：{','.join(SECTIONS)}")
+    parser.add_argument("--embeddings", choices=["model", "hash"], default="model",
+                        help="model：按 Config.EMBEDDING_BACKEND 加载模型；hash：离线哈希向量")
+    parser.add_argument("--docs", type=int, default=20, help="每种格式生成的文档数")
+    parser.add_argument("--paragraphs", type=int, default=8, help="每篇文档的段落数")
+    parser.add_argument("--formats", default=",".join(FORMATS), help="测量的文档格式")
+    parser.add_argument("--chunk-corpus", type=int, default=100000, help="chunks 节的片段数")
+    parser.add_argument("--extract-paragraphs", type=int, default=60,
+                        help="extract / splitter 节每篇文档的段落数")
+    parser.add_argument("--embed-texts", type=int, default=1000, help="embedding 吞吐测试的文本数")
+    parser.add_argument("--sizes", type=int_list, default=[1000, 5000, 10000],
+                        help="检索延迟测试的索引规模（逗号分隔）")
+    parser.add_argument("--queries", type=int, default=200, help="每个规模下的查询数")
+    parser.add_argument("--chat-queries", type=int, default=50, help="chat 延迟测试的问题数")
+    parser.add_argument("--stub-first-token-ms", type=float, default=50.0, help="模拟 LLM 首 token 延迟")
+    parser.add_argument("--stub-tokens-per-second", type=float, default=200.0, help="模拟 LLM 生成速度")
+    parser.add_argument("--rerank-candidates", type=int_list, default=[10, 20, 40],
+                        help="重排序前从向量库取的候选数（逗号分隔）")
+    parser.add_argument("--rerank-top-n", type=int, default=Config.RERANK_TOP_N,
+                        help="重排序后保留的片段数")
+    parser.add_argument("--rerank-queries", type=int, default=50, help="重排序测试的问题数")
+    parser.add_argument("--stub-rerank-pair-ms", type=float, default=2.0,
+                        help="--embeddings hash 时模拟交叉编码器每对打分耗时")
+    parser.add_argument("--prefill-tokens-per-second", type=float, default=200.0,
+                        help="估算 LLM 预填充耗时所用的速度（token/秒）")
+    parser.add_argument("--ann-size", type=int, default=20000, help="ann 节的向量数")
+    parser.add_argument("--ann-k", type=int, default=10, help="ann 节计算召回率的 k")
+    parser.add_argument("--ann-ef-search", type=int_list, default=[10, 20, 50, 100, 200],
+                        help="Chroma HNSW 的 ef_search（逗号分隔）")
+    parser.add_argument("--ann-nlist", type=int, default=64, help="NumPy IVF 的簇数")
+    parser.add_argument("--ann-nprobe", type=int_list, default=[1, 4, 8, 16, 32],
+                        help="NumPy IVF 每次查询扫描的簇数（逗号分隔）")
+    parser.add_argument("--tenant-large", type=int, default=20000, help="tenants 节大租户的片段数")
+    parser.add_argument("--tenant-small", type=int, default=1000, help="tenants 节小租户的片段数")
+    parser.add_argument("--condense-queries", type=int, default=50, help="condense 节的对话数")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--workdir", help="工作目录（缺省使用临时目录，结束后删除）")
+    parser.add_argument("--output", help="结果 JSON 文件路径")
+    parser.add_argument("--compare", help="与之对比的基线结果 JSON")
+    parser.add_argument("--threshold", type=float, default=0.2, help="判定退化的相对变化阈值")
+    args = parser.parse_args(argv)
+
+    args.sections = [name.strip() for name in args.sections.split(",") if name.strip()]
+    unknown = [name for name in args.sections if name not in SECTIONS]
+    if unknown:
+        parser.error(f"未知的基准节: {', '.join(unknown)}")
+    args.formats = [fmt.strip() for fmt in args.formats.split(",") if fmt.strip()]
+    return args
+
+
+def run(args: argparse.Namespace, workdir: Path) -> dict:
+    isolate_config(workdir)
+    random.seed(args.seed)
+    ctx = BenchContext(args=args, workdir=workdir, queries=generate_queries(args.queries, args.seed + 1))
+
+    results = {}
+    for name in SECTIONS:
+        if name not in args.sections:
+            continue
+        print(f"\n[{name}]")
+        results[name] = SECTIONS[name](ctx)
+
+    return {
+        "meta": {
+            "git_revision": git_revision(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "embeddings": args.embeddings if args.embeddings == "hash" else Config.EMBEDDING_BACKEND,
+            "retrieval_mode": Config.RETRIEVAL_MODE,
+            "chunk_size": Config.CHUNK_SIZE,
+            "retrieval_k": Config.RETRIEVAL_K,
+            "args": {key: value for key, value in vars(args).items()
+                     if key not in ("output", "compare", "workdir")},
+        },
+        "results": results,
+    }
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+
+    if args.workdir:
+        workdir = Path(args.workdir)
+        workdir.mkdir(parents=True, exist_ok=True)
+        report = run(args, workdir)
+    else:
+        with tempfile.TemporaryDirectory(prefix="chatbot-bench-") as tmp:
+            report = run(args, Path(tmp))
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(output + "\n", encoding="utf-8")
+        print(f"\n✓ 结果已写入 {args.output}")
+    else:
+        print("\n" + output)
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        print(f"\n与基线对比（{baseline['meta'].get('git_revision')}，阈值 {args.threshold:.0%}）：")
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"\n✗ 发现 {len(regressions)} 项性能退化")
+            return 1
+        print("\n✓ 未发现超过阈值的性能退化")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+"""基准测试用的本地替身
+
+- HashEmbeddings：基于特征哈希的确定性向量，无需下载模型，
+  用于离线 / CI 环境下测量检索链路本身的开销
+- StubChatModel：模拟 Ollama 的首 token 延迟与生成速度，
+  用于测量 ChatAgent 除模型推理之外的开销
+- StubCrossEncoder：按词项重合度打分、按配置耗时模拟交叉编码器推理
+- StubCondenseModel：模拟追问改写（把上一个用户问题补进追问），耗时同 StubChatModel
+"""
+
+import asyncio
+import hashlib
+import math
+import time
+from typing import Any, AsyncIterator, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from lexical_index import tokenize
+
+
+class HashEmbeddings(Embeddings):
+    """特征哈希向量（词项哈希到固定维度后 L2 归一化）"""
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def _encode(self, text: str) -> List[float]:
+        vector = [0.0] * self.dim
+        for token in tokenize(text):
+            digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            vector[value % self.dim] += 1.0 if value >> 63 else -1.0
+        norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+        return [x / norm for x in vector]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._encode(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode(text)
+
+
+class StubCrossEncoder:
+    """与 CrossEncoder.predict 接口一致的替身：分数为问题词项在片段中的覆盖率"""
+
+    def __init__(self, pair_ms: float = 2.0, batch_overhead_ms: float = 5.0):
+        self.pair_ms = pair_ms
+        self.batch_overhead_ms = batch_overhead_ms
+
+    def predict(
+        self, pairs: Sequence[Tuple[str, str]], batch_size: int = 32, **kwargs: Any
+    ) -> List[float]:
+        batches = math.ceil(len(pairs) / batch_size) if pairs else 0
+        time.sleep((batches * self.batch_overhead_ms + len(pairs) * self.pair_ms) / 1000)
+        scores = []
+        for query, text in pairs:
+            terms = set(tokenize(query))
+            scores.append(len(terms & set(tokenize(text))) / len(terms) if terms else 0.0)
+        return scores
+
+
+class StubChatModel(BaseChatModel):
+    """固定回答的聊天模型，按配置的延迟模拟首 token 与逐 token 生成"""
+
+    answer: str = "根据提供的上下文，该操作由系统自动完成，详见文档片段 1。"
+    first_token_ms: float = 50.0
+    tokens_per_second: float = 200.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def _tokens(self) -> List[str]:
+        return [self.answer[i:i + 2] for i in range(0, len(self.answer), 2)]
+
+    def _token_delay(self) -> float:
+        return 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+    def _total_delay(self) -> float:
+        return self.first_token_ms / 1000 + len(self._tokens()) * self._token_delay()
+
+    def _result(self, messages: List[BaseMessage]) -> ChatResult:
+        # 与 Ollama 一样返回 token 用量（输入按字符数粗略估算）
+        prompt_tokens = sum(len(str(message.content)) for message in messages) // 2
+        completion_tokens = len(self._tokens())
+        message = AIMessage(content=self.answer, usage_metadata={
+            "input_tokens": prompt_tokens,
+            "output_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        })
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(
+        self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+        run_manager: Any = None, **kwargs: Any,
+    ) -> ChatResult:
+        time.sleep(self._total_delay())
+        return self._result(messages)
+
+    async def _agenerate(
+        self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+        run_manager: Any = None, **kwargs: Any,
+    ) -> ChatResult:
+        await asyncio.sleep(self._total_delay())
+        return self._result(messages)
+
+    def _stream(
+        self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+        run_manager: Any = None, **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.first_token_ms / 1000)
+        for token in self._tokens():
+            time.sleep(self._token_delay())
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    async def _astream(
+        self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+        run_manager: Any = None, **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.first_token_ms / 1000)
+        for token in self._tokens():
+            await asyncio.sleep(self._token_delay())
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+
+class StubCondenseModel(StubChatModel):
+    """追问改写替身：把对话历史中最近一个用户问题作为主语补进追问
+
+    解析 QueryCondenser 的提示词（"用户：…" 与 "追问：…" 行），延迟按改写结果的长度计算。
+    """
+
+    def _rewrite(self, messages: List[BaseMessage]) -> "StubCondenseModel":
+        previous, follow_up = "", ""
+        for line in str(messages[-1].content).splitlines():
+            if line.startswith("用户："):
+                previous = line[len("用户："):]
+            elif line.startswith("追问："):
+                follow_up = line[len("追问："):]
+        answer = f"{previous.rstrip('？?。')}，{follow_up}" if previous else follow_up
+        return self.model_copy(update={"answer": answer})
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        return StubChatModel._generate(self._rewrite(messages), messages, stop, **kwargs)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        return await StubChatModel._agenerate(self._rewrite(messages), messages, stop, **kwargs)
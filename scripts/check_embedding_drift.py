@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""检查 ONNX（int8）embedding 相对 fp32 模型的召回偏差
+
+在本地语料上分别用 fp32（huggingface 后端）与 ONNX 后端编码，
+比较两者检索结果的 top-k 重合率（recall@k）与向量余弦相似度。
+
+用法:
+    python scripts/check_embedding_drift.py [语料目录] [--k 10] [--max-chunks 5000]
+                                            [--queries 问题文件] [--no-quantize]
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+# 添加 src 到路径
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from bulk_ingest import iter_files
+from config import Config
+from document_processor import DocumentProcessor
+from embedding_backends import create_embeddings
+
+
+def load_corpus(root: Path, max_chunks: int):
+    """读取语料目录下的文档片段"""
+    processor = DocumentProcessor()
+    chunks = []
+    for path in iter_files(root):
+        try:
+            chunks.extend(doc.page_content for doc in processor.load_document(str(path)))
+        except Exception as e:
+            print(f"⚠ 跳过 {path}: {e}")
+        if len(chunks) >= max_chunks:
+            break
+    return chunks[:max_chunks]
+
+
+def encode(embeddings, corpus, queries):
+    import numpy as np
+
+    started = time.perf_counter()
+    doc_vectors = np.array(embeddings.embed_documents(corpus), dtype=np.float32)
+    elapsed = time.perf_counter() - started
+    query_vectors = np.array([embeddings.embed_query(q) for q in queries], dtype=np.float32)
+    return doc_vectors, query_vectors, elapsed
+
+
+def top_k(query_vectors, doc_vectors, k):
+    import numpy as np
+
+    scores = query_vectors @ doc_vectors.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def main():
+    import numpy as np
+
+    parser = argparse.ArgumentParser(description="检查 ONNX embedding 的召回偏差")
+    parser.add_argument("root", nargs="?", default=str(Config.UPLOAD_DIR), help="语料目录")
+    parser.add_argument("--k", type=int, default=10, help="比较 top-k 检索结果")
+    parser.add_argument("--max-chunks", type=int, default=5000, help="最多使用的片段数")
+    parser.add_argument("--queries", help="问题文件（每行一个）；缺省时从语料中抽样")
+    parser.add_argument("--sample", type=int, default=200, help="抽样问题数")
+    parser.add_argument("--no-quantize", action="store_true", help="比较未量化的 ONNX 模型")
+    parser.add_argument("--min-recall", type=float, default=0.95, help="低于该召回率时返回非零退出码")
+    args = parser.parse_args()
+
+    corpus = load_corpus(Path(args.root), args.max_chunks)
+    if len(corpus) < args.k:
+        print(f"✗ 语料片段不足（{len(corpus)} < k={args.k}）")
+        return 1
+
+    if args.queries:
+        queries = [line.strip() for line in open(args.queries, encoding="utf-8") if line.strip()]
+    else:
+        # 以片段开头作为近似问题
+        rng = random.Random(0)
+        queries = [chunk[:64] for chunk in rng.sample(corpus, min(args.sample, len(corpus)))]
+
+    print(f"语料片段: {len(corpus)}，问题: {len(queries)}，k={args.k}\n")
+
+    Config.ONNX_QUANTIZED = not args.no_quantize
+    reference, _ = create_embeddings("huggingface")
+    candidate, candidate_id = create_embeddings("onnx")
+
+    ref_docs, ref_queries, ref_seconds = encode(reference, corpus, queries)
+    cand_docs, cand_queries, cand_seconds = encode(candidate, corpus, queries)
+
+    ref_top = top_k(ref_queries, ref_docs, args.k)
+    cand_top = top_k(cand_queries, cand_docs, args.k)
+    recall = float(np.mean([
+        len(set(a) & set(b)) / args.k for a, b in zip(ref_top, cand_top)
+    ]))
+    cosine = np.sum(ref_docs * cand_docs, axis=1)
+
+    print("=" * 60)
+    print(f"  对比模型: {candidate_id}")
+    print("=" * 60)
+    print(f"recall@{args.k}（相对 fp32）: {recall:.4f}")
+    print(f"向量余弦相似度: 平均 {cosine.mean():.4f}，最小 {cosine.min():.4f}")
+    print(f"语料编码耗时: fp32 {ref_seconds:.2f}s，ONNX {cand_seconds:.2f}s"
+          f"（加速 {ref_seconds / max(cand_seconds, 1e-9):.2f}x）")
+
+    if recall < args.min_recall:
+        print(f"\n✗ 召回偏差超出阈值（{recall:.4f} < {args.min_recall}）")
+        return 1
+    print("\n✓ 召回偏差在阈值内")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
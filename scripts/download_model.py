@@ -34,6 +34,93 @@ def download_embedding_model():
         print(f"✗ 下载失败: {e}")
         return False
 
+def export_onnx_model(quantize=True):
+    """导出 ONNX 模型（可选 int8 动态量化），供 EMBEDDING_BACKEND=onnx 使用"""
+    model_path = Path(__file__).parent.parent / "model" / "paraphrase-multilingual-MiniLM-L12-v2"
+    onnx_dir = model_path.parent / "paraphrase-multilingual-MiniLM-L12-v2-onnx"
+    source = str(model_path) if model_path.exists() else \
+        "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+
+    print(f"\n正在导出 ONNX 模型: {source}")
+    print(f"保存路径: {onnx_dir}\n")
+
+    try:
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+
+        onnx_dir.mkdir(parents=True, exist_ok=True)
+        tokenizer = AutoTokenizer.from_pretrained(source)
+        model = AutoModel.from_pretrained(source)
+        model.eval()
+
+        # 导出 Transformer 主体，mean pooling 与归一化在推理端完成
+        sample = tokenizer(["导出示例", "export sample"], padding=True, return_tensors="pt")
+        input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids")
+                       if name in sample]
+        dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+        dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+        fp32_path = onnx_dir / "model.onnx"
+        with torch.no_grad():
+            torch.onnx.export(
+                model,
+                tuple(sample[name] for name in input_names),
+                str(fp32_path),
+                input_names=input_names,
+                output_names=["last_hidden_state"],
+                dynamic_axes=dynamic_axes,
+                opset_version=14,
+            )
+        tokenizer.save_pretrained(str(onnx_dir))
+        print(f"✓ fp32 模型已导出: {fp32_path}")
+
+        if quantize:
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+
+            int8_path = onnx_dir / "model_int8.onnx"
+            quantize_dynamic(str(fp32_path), str(int8_path), weight_type=QuantType.QInt8)
+            print(f"✓ int8 量化模型已导出: {int8_path}")
+
+        print("\n提示: 设置 EMBEDDING_BACKEND=onnx 启用，")
+        print("      并运行 python scripts/check_embedding_drift.py 检查召回偏差")
+        return True
+
+    except ImportError as e:
+        print(f"✗ 错误: 缺少依赖 {e.name}")
+        print("请运行: uv sync --extra onnx（导出还需要 sentence-transformers 附带的 torch/transformers）")
+        return False
+
+    except Exception as e:
+        print(f"✗ 导出失败: {e}")
+        return False
+
+def download_rerank_model():
+    """下载交叉编码器重排序模型（RERANK_ENABLED=true 时使用）"""
+    model_name = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"
+    model_path = Path(__file__).parent.parent / "model" / "mmarco-mMiniLMv2-L12-H384-v1"
+
+    print(f"\n正在下载重排序模型: {model_name}")
+    print(f"保存路径: {model_path}\n")
+
+    try:
+        from sentence_transformers import CrossEncoder
+
+        model = CrossEncoder(model_name)
+        model.save(str(model_path))
+
+        print(f"\n✓ 重排序模型已保存到: {model_path}")
+        print("提示: 设置 RERANK_ENABLED=true 启用")
+        return True
+
+    except ImportError:
+        print("✗ 错误: 未安装 sentence-transformers")
+        print("请运行: pip install sentence-transformers")
+        return False
+
+    except Exception as e:
+        print(f"✗ 下载失败: {e}")
+        return False
+
 def download_ollama_model():
     """下载 Ollama 模型（需要 Ollama 服务运行）"""
     model_name = "deepseek-r1:7b"
@@ -67,11 +154,27 @@ def download_ollama_model():
 
 def main():
     """主函数"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="模型下载工具")
+    parser.add_argument("--onnx", action="store_true", help="导出 ONNX 模型（默认同时生成 int8 量化版本）")
+    parser.add_argument("--no-quantize", action="store_true", help="导出 ONNX 时不做 int8 量化")
+    parser.add_argument("--rerank", action="store_true", help="下载交叉编码器重排序模型")
+    args = parser.parse_args()
+
     print("=" * 60)
     print("  模型下载工具")
     print("=" * 60)
     print()
     
+    if args.onnx:
+        export_onnx_model(quantize=not args.no_quantize)
+        return
+
+    if args.rerank:
+        download_rerank_model()
+        return
+
     # 下载 Embedding 模型
     embedding_success = download_embedding_model()
     
@@ -0,0 +1,132 @@
+"""语义回答缓存模块
+
+按查询向量的相似度匹配重复 / 近似重复的问题，直接复用之前生成的回答。
+缓存条目同时绑定检索到的片段 ID 集合：文档内容变化后片段 ID 随之变化，
+旧回答自然失效。
+
+回答还可能依赖对话历史，条目因此同时绑定对话上下文（context_key）：没有历史的提问
+在所有会话间共享，带历史的提问只在同一会话、同样的历史下命中。
+"""
+
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+from langchain_core.messages import BaseMessage
+
+
+def doc_key(doc_ids: Iterable[str]) -> Tuple[str, ...]:
+    """检索结果的片段集合标识（与顺序无关）"""
+    return tuple(sorted(doc_ids))
+
+
+def context_key(session_id: str, history: Sequence[BaseMessage]) -> str:
+    """进入提示词的对话上下文标识；没有历史时为空字符串（与会话无关）"""
+    if not history:
+        return ""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(session_id.encode("utf-8"))
+    for message in history:
+        digest.update(b"\0")
+        digest.update(message.type.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(str(message.content).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _normalize(vector: List[float]) -> List[float]:
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [x / norm for x in vector]
+
+
+@dataclass
+class CachedAnswer:
+    """缓存条目"""
+    query: str
+    vector: List[float]
+    doc_key: Tuple[str, ...]
+    answer: str
+    created: float
+    context: str = ""
+
+
+class SemanticAnswerCache:
+    """基于向量相似度的回答缓存（TTL + LRU 容量上限）"""
+
+    def __init__(self, threshold: float = 0.95, ttl: float = 3600, max_entries: int = 1000):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        self._entries: "OrderedDict[int, CachedAnswer]" = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def lookup(
+        self, query_vector: List[float], doc_ids: Iterable[str], context: str = ""
+    ) -> Optional[CachedAnswer]:
+        """查找相似问题的回答；检索片段集合与对话上下文（context_key）必须完全一致"""
+        key = doc_key(doc_ids)
+        vector = _normalize(query_vector)
+        now = time.time()
+
+        with self._lock:
+            best_id, best_score = None, self.threshold
+            for entry_id, entry in list(self._entries.items()):
+                if now - entry.created > self.ttl:
+                    del self._entries[entry_id]
+                    continue
+                if entry.doc_key != key or entry.context != context:
+                    continue
+                score = sum(a * b for a, b in zip(vector, entry.vector, strict=True))
+                if score >= best_score:
+                    best_id, best_score = entry_id, score
+
+            if best_id is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._entries.move_to_end(best_id)
+            return self._entries[best_id]
+
+    def store(
+        self,
+        query: str,
+        query_vector: List[float],
+        doc_ids: Iterable[str],
+        answer: str,
+        context: str = "",
+    ):
+        with self._lock:
+            self._entries[self._next_id] = CachedAnswer(
+                query=query,
+                vector=_normalize(query_vector),
+                doc_key=doc_key(doc_ids),
+                answer=answer,
+                created=time.time(),
+                context=context,
+            )
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """返回命中统计"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self._entries),
+        }
@@ -0,0 +1,316 @@
+"""批量入库模块
+
+将整个目录树中的文档并行入库，三个阶段之间通过有界队列衔接：
+
+1. 解析：进程池并行执行 PDF/DOCX/MD/TXT 提取与分段（每个文件产出一个列式的 ChunkBatch）
+2. 向量化：把片段攒成批次调用 embedding 模型
+3. 写入：按大批次写入 Chroma，并更新入库清单
+
+用法：
+    python src/main.py ingest [目录] [--workers N]
+"""
+
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+from chunk_batch import ChunkBatch
+from config import Config
+from ingest_manifest import file_sha256
+
+SUPPORTED_SUFFIXES = {".pdf", ".docx", ".md", ".txt"}
+
+# 队列结束标记
+_DONE = object()
+
+
+def iter_files(root: Path) -> Iterator[Path]:
+    """递归遍历目录下所有支持的文档"""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            path = Path(dirpath) / filename
+            if path.suffix.lower() in SUPPORTED_SUFFIXES:
+                yield path
+
+
+# ================================
+# 阶段 1：子进程解析
+# ================================
+_worker_processor = None
+
+# 传给子进程的解析相关配置（spawn 的子进程重新导入 Config，运行时的修改不会自动带过去）
+_WORKER_SETTINGS = (
+    "CHUNK_SIZE", "CHUNK_OVERLAP", "TEXT_SPLITTER", "CHUNK_TOKENS", "CHUNK_OVERLAP_TOKENS",
+    "EMBEDDING_BACKEND", "EXTRACTION_CACHE_ENABLED", "EXTRACTION_CACHE_DIR",
+    "EXTRACTION_CACHE_MAX_MB", "EXTRACTION_CACHE_MAX_AGE_DAYS",
+)
+
+
+def _init_worker(settings: Optional[dict] = None):
+    global _worker_processor
+    from document_processor import DocumentProcessor
+
+    for name, value in (settings or {}).items():
+        setattr(Config, name, value)
+
+    _worker_processor = DocumentProcessor()
+
+
+def _extract_file(path: str, known_hash: Optional[str]) -> "ExtractedFile":
+    """在子进程中计算哈希、提取并分段；内容未变化时直接返回"""
+    try:
+        file_hash = file_sha256(Path(path))
+        if file_hash == known_hash:
+            return ExtractedFile(path=path, file_hash=file_hash, skipped=True)
+
+        # 列式批次：文件级元数据只传一份，减少跨进程序列化开销
+        chunks = _worker_processor.load_batch(path, file_hash=file_hash)
+        return ExtractedFile(path=path, file_hash=file_hash, chunks=chunks)
+    except Exception as e:
+        return ExtractedFile(path=path, error=str(e))
+
+
+@dataclass
+class ExtractedFile:
+    """单个文件的解析结果"""
+    path: str
+    file_hash: Optional[str] = None
+    chunks: Optional[ChunkBatch] = None
+    skipped: bool = False
+    error: Optional[str] = None
+
+
+@dataclass
+class WriteBatch:
+    """向量化完成、等待写入的批次"""
+    ids: List[str] = field(default_factory=list)
+    texts: List[str] = field(default_factory=list)
+    metadatas: List[dict] = field(default_factory=list)
+    embeddings: List[List[float]] = field(default_factory=list)
+    delete_ids: List[str] = field(default_factory=list)
+    kept: List[Tuple[str, dict]] = field(default_factory=list)
+    # 本批次写入后即可登记到清单的文件：(来源, 全部片段 ID, 文件哈希)
+    manifest_updates: List[Tuple[str, List[str], str]] = field(default_factory=list)
+    # 本批次的片段统计，写入并登记清单成功后才计入总数
+    added: int = 0
+    removed: int = 0
+    unchanged: int = 0
+
+
+# ================================
+# 批量入库器
+# ================================
+class BulkIngestor:
+    """目录级批量入库流水线"""
+
+    def __init__(
+        self,
+        vector_store,
+        workers: Optional[int] = None,
+        embed_batch_size: Optional[int] = None,
+        write_batch_size: Optional[int] = None,
+        queue_size: Optional[int] = None,
+    ):
+        self.vector_store = vector_store
+        self.workers = workers or Config.INGEST_WORKERS or os.cpu_count() or 1
+        self.embed_batch_size = embed_batch_size or Config.EMBED_BATCH_SIZE
+        self.write_batch_size = write_batch_size or Config.WRITE_BATCH_SIZE
+        self.queue_size = queue_size or Config.INGEST_QUEUE_SIZE
+
+        self._errors: List[Tuple[str, str]] = []
+        self._stats = {}
+
+    def ingest_directory(self, root=None) -> dict:
+        """入库目录下的所有文档，返回统计信息"""
+        root = Path(root or Config.UPLOAD_DIR)
+        if not root.is_dir():
+            raise NotADirectoryError(f"目录不存在: {root}")
+
+        self._errors = []
+        self._stats = {
+            "files": 0, "skipped": 0, "failed": 0,
+            "added": 0, "removed": 0, "unchanged": 0,
+        }
+        started = time.perf_counter()
+
+        extracted_queue: "queue.Queue" = queue.Queue(maxsize=self.queue_size)
+        write_queue: "queue.Queue" = queue.Queue(maxsize=self.queue_size)
+
+        embed_thread = threading.Thread(
+            target=self._embed_stage, args=(extracted_queue, write_queue), daemon=True
+        )
+        write_thread = threading.Thread(target=self._write_stage, args=(write_queue,), daemon=True)
+        embed_thread.start()
+        write_thread.start()
+
+        try:
+            self._extract_stage(root, extracted_queue)
+        finally:
+            extracted_queue.put(_DONE)
+            embed_thread.join()
+            write_thread.join()
+            self.vector_store.manifest.save()
+
+        self._stats["failed"] = len(self._errors)
+        self._stats["errors"] = list(self._errors)
+        self._stats["seconds"] = round(time.perf_counter() - started, 2)
+        print(
+            f"✓ 批量入库完成：{self._stats['files']} 个文件（跳过 {self._stats['skipped']}，"
+            f"失败 {self._stats['failed']}），新增片段 {self._stats['added']}，"
+            f"删除 {self._stats['removed']}，耗时 {self._stats['seconds']}s"
+        )
+        return self._stats
+
+    def _extract_stage(self, root: Path, out: "queue.Queue"):
+        """阶段 1：进程池解析，在途任务数有上限"""
+        manifest = self.vector_store.manifest
+        max_pending = self.workers * 2
+        pending = set()
+
+        # spawn 避免 fork 已加载 torch/sqlite 的父进程
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=context, initializer=_init_worker,
+            initargs=({name: getattr(Config, name) for name in _WORKER_SETTINGS},),
+        ) as executor:
+            for path in iter_files(root):
+                source = str(path.resolve())
+                pending.add(executor.submit(_extract_file, source, manifest.file_hash(source)))
+                if len(pending) >= max_pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        out.put(future.result())
+
+            for future in pending:
+                out.put(future.result())
+
+    def _embed_stage(self, inp: "queue.Queue", out: "queue.Queue"):
+        """阶段 2：对新增片段攒批向量化
+
+        单个文件的处理失败只记为该文件的错误；本阶段意外退出时继续消费输入队列直到结束标记，
+        避免解析阶段阻塞在有界队列上。
+        """
+        batch = WriteBatch()
+        try:
+            while True:
+                item = inp.get()
+                if item is _DONE:
+                    break
+                self._stats["files"] += 1
+
+                if item.error:
+                    self._errors.append((item.path, item.error))
+                    print(f"✗ 解析失败: {item.path}: {item.error}")
+                    continue
+                if item.skipped:
+                    self._stats["skipped"] += 1
+                    continue
+
+                try:
+                    self._add_to_batch(item, batch)
+                except Exception as e:
+                    self._errors.append((item.path, f"处理失败: {e}"))
+                    print(f"✗ 处理失败: {item.path}: {e}")
+                    continue
+
+                if len(batch.ids) >= self.write_batch_size:
+                    self._flush(batch, out)
+                    batch = WriteBatch()
+
+            if batch.ids or batch.delete_ids or batch.kept or batch.manifest_updates:
+                self._flush(batch, out)
+        except Exception as e:
+            self._errors.append(("", f"向量化阶段异常退出: {e}"))
+            print(f"✗ 向量化阶段异常退出: {e}")
+            self._drain(inp)
+        finally:
+            out.put(_DONE)
+
+    def _add_to_batch(self, item: ExtractedFile, batch: WriteBatch):
+        """把一个文件的片段加入写入批次（先完整生成，出错时批次不受影响）"""
+        chunks = item.chunks
+        ids, new_ids, removed_ids = self.vector_store.plan_upsert(item.path, chunks.texts)
+        added, kept = [], []
+        # 逐片段的元数据字典只为进入本写入批次的片段生成
+        for index, doc_id in enumerate(ids):
+            if doc_id in new_ids:
+                added.append((doc_id, chunks.texts[index], chunks.chunk_metadata(index)))
+            else:
+                kept.append((doc_id, chunks.chunk_metadata(index)))
+
+        for doc_id, text, metadata in added:
+            batch.ids.append(doc_id)
+            batch.texts.append(text)
+            batch.metadatas.append(metadata)
+        batch.kept.extend(kept)
+        batch.delete_ids.extend(removed_ids)
+        batch.manifest_updates.append((item.path, ids, item.file_hash))
+
+        batch.added += len(new_ids)
+        batch.removed += len(removed_ids)
+        batch.unchanged += len(ids) - len(new_ids)
+
+    @staticmethod
+    def _drain(inp: "queue.Queue"):
+        """丢弃输入直到结束标记，让上游阶段能够正常结束"""
+        while inp.get() is not _DONE:
+            pass
+
+    def _flush(self, batch: WriteBatch, out: "queue.Queue"):
+        """向量化整个批次后交给写入阶段；失败时记录错误并继续消费上游"""
+        try:
+            for start in range(0, len(batch.texts), self.embed_batch_size):
+                batch.embeddings.extend(
+                    self.vector_store.embed_documents(
+                        batch.texts[start:start + self.embed_batch_size]
+                    )
+                )
+        except Exception as e:
+            for source, _, _ in batch.manifest_updates:
+                self._errors.append((source, f"向量化失败: {e}"))
+            print(f"✗ 批次向量化失败: {e}")
+            return
+        out.put(batch)
+
+    def _write_stage(self, inp: "queue.Queue"):
+        """阶段 3：大批量写入向量库，写入成功后再登记清单（单个批次失败只记为对应文件的错误）"""
+        manifest = self.vector_store.manifest
+        while True:
+            batch = inp.get()
+            if batch is _DONE:
+                break
+            try:
+                self.vector_store.write_chunks(
+                    ids=batch.ids,
+                    texts=batch.texts,
+                    metadatas=batch.metadatas,
+                    embeddings=batch.embeddings,
+                    delete_ids=batch.delete_ids,
+                    kept=batch.kept,
+                )
+                for source, ids, file_hash in batch.manifest_updates:
+                    manifest.update(source, ids, file_hash=file_hash)
+                manifest.save()
+            except Exception as e:
+                # 出错时也继续消费队列，上游阶段不会阻塞
+                for source, _, _ in batch.manifest_updates:
+                    self._errors.append((source, f"写入失败: {e}"))
+                print(f"✗ 批次写入失败: {e}")
+                continue
+
+            self._stats["added"] += batch.added
+            self._stats["removed"] += batch.removed
+            self._stats["unchanged"] += batch.unchanged
+            print(f"  已写入 {len(batch.ids)} 个片段（累计文件 {self._stats['files']}）")
+
+
+def ingest_directory(vector_store, root=None, **kwargs) -> dict:
+    """批量入库目录的便捷函数"""
+    return BulkIngestor(vector_store, **kwargs).ingest_directory(root)
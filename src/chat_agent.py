@@ -8,17 +8,30 @@
 - 更可维护、可扩展
 """
 
-from typing import TypedDict, Annotated, Sequence, List
+import asyncio
+from contextlib import asynccontextmanager
+from typing import TypedDict, Annotated, AsyncIterator, Dict, Iterator, Optional, Sequence, List
 from operator import add
 
-from langchain_ollama import ChatOllama
+from langchain_core.documents import Document
 from langchain_core.messages import HumanMessage, AIMessage, BaseMessage
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import StateGraph, END
 
 from config import Config
 from vector_store import VectorStore
-
+from answer_cache import SemanticAnswerCache, context_key
+from context_packer import ContextPacker, estimate_tokens
+from metrics import metrics
+from llm_pool import LLMBusyError, OllamaPool
+from query_condenser import QueryCondenser
+from reranker import CrossEncoderReranker
+from search_filters import SearchFilter
+from session_store import SessionStore, create_session_store
+
+# 未指定会话时使用的默认会话 ID（命令行单用户模式）
+DEFAULT_SESSION = "default"
 
 # ================================
 # Agent 状态结构
@@ -28,6 +41,15 @@ class AgentState(TypedDict):
     messages: Annotated[Sequence[BaseMessage], add]
     context: str
     query: str
+    search_query: str
+    session_id: str
+    history: List[BaseMessage]
+    filters: Optional[SearchFilter]
+    docs: List[Document]
+    doc_ids: List[str]
+    query_vector: List[float]
+    cached: bool
+    history_size: Optional[int]
 
 
 # ================================
@@ -40,21 +62,69 @@ class ChatAgent:
     功能：
     - 向量检索上下文
     - 使用 Ollama 模型生成回答
-    - 支持对话历史
+    - 支持按会话隔离的对话历史（有界的会话存储，可持久化到 SQLite）
+    - 同步 / 异步两套调用路径（achat 可在单进程内并发服务多个会话）
+    - 语义回答缓存（命中时跳过生成）
+    - 检索前把依赖上文的追问改写为独立问题（CONDENSE_ENABLED）
+    - 可选的交叉编码器重排序（RERANK_ENABLED）
+    - 检索可限定租户与文档范围（filters，见 search_filters.SearchFilter）
     - 可扩展的 LangGraph 工作流
     """
 
     def __init__(self, vector_store: VectorStore):
         self.vector_store = vector_store
-        self.chat_history: List[BaseMessage] = []
+        # 会话 ID -> 对话历史（每个会话只保留最近几条，空闲会话被淘汰）；
+        # 各会话共享同一个 embedding 模型与向量库
+        self.sessions: SessionStore = create_session_store(
+            Config.SESSION_STORE,
+            max_messages=Config.SESSION_MAX_MESSAGES,
+            max_sessions=Config.SESSION_MAX_SESSIONS,
+            idle_ttl=Config.SESSION_IDLE_TTL,
+            path=Config.SESSION_DB_PATH,
+        )
+        # 会话 ID -> （锁, 使用中的请求数），没有请求时删除
+        self._session_locks: Dict[str, list] = {}
+
+        # 语义回答缓存：相似问题 + 相同检索片段时跳过生成
+        self.answer_cache: Optional[SemanticAnswerCache] = None
+        if Config.ANSWER_CACHE_ENABLED:
+            self.answer_cache = SemanticAnswerCache(
+                threshold=Config.ANSWER_CACHE_THRESHOLD,
+                ttl=Config.ANSWER_CACHE_TTL,
+                max_entries=Config.ANSWER_CACHE_MAX_ENTRIES,
+            )
+
+        # 交叉编码器重排序（可选）：检索多取候选，重排后只保留前几个片段
+        self.reranker: Optional[CrossEncoderReranker] = None
+        if Config.RERANK_ENABLED:
+            self.reranker = CrossEncoderReranker(
+                batch_size=Config.RERANK_BATCH_SIZE,
+                cache_max_entries=Config.RERANK_CACHE_MAX_ENTRIES,
+            )
 
-        # 初始化 LLM（Ollama）
-        self.llm = ChatOllama(
-            base_url=Config.OLLAMA_BASE_URL,
+        # 初始化 LLM（Ollama）：多个实例间按负载分配，满载时有界排队，排不上立即返回繁忙
+        self.llm = OllamaPool(
+            Config.OLLAMA_BASE_URLS,
+            max_concurrency=Config.OLLAMA_MAX_CONCURRENCY,
+            queue_size=Config.LLM_QUEUE_SIZE,
+            queue_timeout=Config.LLM_QUEUE_TIMEOUT,
+            failure_cooldown=Config.OLLAMA_FAILURE_COOLDOWN,
             model=Config.OLLAMA_MODEL,
             temperature=Config.LLM_TEMPERATURE,
+            num_ctx=Config.LLM_NUM_CTX,
+            num_predict=Config.LLM_MAX_TOKENS,
         )
 
+        # 追问改写：只有依赖上文的追问才额外调用一次 LLM，改写结果缓存
+        self.condenser: Optional[QueryCondenser] = None
+        if Config.CONDENSE_ENABLED:
+            self.condenser = QueryCondenser(
+                self.llm,
+                history_messages=Config.CONDENSE_HISTORY_MESSAGES,
+                min_query_chars=Config.CONDENSE_MIN_QUERY_CHARS,
+                cache_max_entries=Config.CONDENSE_CACHE_MAX_ENTRIES,
+            )
+
         # Prompt 模板
         self.prompt = ChatPromptTemplate.from_messages([
             (
@@ -75,66 +145,265 @@ class ChatAgent:
             ("human", "{query}")
         ])
 
+        # 上下文打包：按 token 预算选择检索片段与对话历史（预算默认为上下文窗口减去回答预留）
+        self.context_packer = ContextPacker(
+            budget=Config.CONTEXT_TOKEN_BUDGET or max(Config.LLM_NUM_CTX - Config.LLM_MAX_TOKENS, 256),
+            overhead_tokens=estimate_tokens(self.prompt.format(context="", history=[], query="")),
+            chunk_overlap=Config.CHUNK_OVERLAP,
+            history_share=Config.CONTEXT_HISTORY_SHARE,
+            max_history_messages=Config.HISTORY_MAX_MESSAGES,
+        )
+
         # 构建工作流
         self.graph = self._build_graph()
 
+    # ================================
+    # 会话状态
+    # ================================
+    @property
+    def chat_history(self) -> List[BaseMessage]:
+        """默认会话的对话历史（兼容单用户用法）"""
+        return self.get_history(DEFAULT_SESSION)
+
+    @chat_history.setter
+    def chat_history(self, messages: List[BaseMessage]):
+        self.sessions.clear(DEFAULT_SESSION)
+        self.sessions.append(DEFAULT_SESSION, messages)
+
+    def get_history(self, session_id: str = DEFAULT_SESSION) -> List[BaseMessage]:
+        """会话最近的历史（只加载提示词最多使用的条数）"""
+        return self.sessions.load(session_id, Config.HISTORY_MAX_MESSAGES)
+
+    @asynccontextmanager
+    async def _session_lock(self, session_id: str):
+        """同一会话的多轮请求串行执行，避免历史交错"""
+        entry = self._session_locks.setdefault(session_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._session_locks[session_id]
+
     # ================================
     # LangGraph 构建
     # ================================
     def _build_graph(self) -> StateGraph:
         workflow = StateGraph(AgentState)
 
-        workflow.add_node("retrieve", self._retrieve_context)
-        workflow.add_node("generate", self._generate_response)
+        # 每个节点同时提供同步与异步实现：invoke 走同步，ainvoke 走异步
+        if self.condenser is not None:
+            workflow.add_node("condense", RunnableLambda(self._condense, afunc=self._acondense))
+        workflow.add_node(
+            "retrieve", RunnableLambda(self._retrieve_context, afunc=self._aretrieve_context)
+        )
+        if self.reranker is not None:
+            workflow.add_node("rerank", RunnableLambda(self._rerank, afunc=self._arerank))
+        workflow.add_node(
+            "check_cache", RunnableLambda(self._check_answer_cache, afunc=self._acheck_answer_cache)
+        )
+        workflow.add_node(
+            "generate", RunnableLambda(self._generate_response, afunc=self._agenerate_response)
+        )
 
-        workflow.set_entry_point("retrieve")
-        workflow.add_edge("retrieve", "generate")
+        if self.condenser is not None:
+            workflow.set_entry_point("condense")
+            workflow.add_edge("condense", "retrieve")
+        else:
+            workflow.set_entry_point("retrieve")
+        if self.reranker is not None:
+            workflow.add_edge("retrieve", "rerank")
+            workflow.add_edge("rerank", "check_cache")
+        else:
+            workflow.add_edge("retrieve", "check_cache")
+        # 命中回答缓存时直接结束，完全跳过 generate
+        workflow.add_conditional_edges(
+            "check_cache",
+            lambda state: "hit" if state.get("cached") else "miss",
+            {"hit": END, "miss": "generate"},
+        )
         workflow.add_edge("generate", END)
 
         return workflow.compile()
 
+    # ================================
+    # Step 0：追问改写
+    # ================================
+    @metrics.timed("condense")
+    def _condense(self, state: AgentState) -> AgentState:
+        """把依赖上文的追问改写为独立问题，只用于检索（提示词中仍是原问题）"""
+        search_query = self.condenser.condense(state["query"], state["history"])
+        return self._apply_condensed(state, search_query)
+
+    @metrics.timed("condense")
+    async def _acondense(self, state: AgentState) -> AgentState:
+        search_query = await self.condenser.acondense(state["query"], state["history"])
+        return self._apply_condensed(state, search_query)
+
+    def _apply_condensed(self, state: AgentState, search_query: str) -> AgentState:
+        state["search_query"] = search_query
+        if search_query != state["query"]:
+            metrics.annotate(search_query=search_query)
+        return state
+
     # ================================
     # Step 1：向量检索
     # ================================
+    @metrics.timed("retrieve")
     def _retrieve_context(self, state: AgentState) -> AgentState:
-        query = state["query"]
+        try:
+            docs = self.vector_store.similarity_search(
+                state["search_query"], k=self._retrieval_k(), filters=state.get("filters")
+            )
+        except Exception as e:
+            state["context"] = f"检索失败：{e}"
+            return state
+
+        return self._after_retrieve(state, docs)
 
+    @metrics.timed("retrieve")
+    async def _aretrieve_context(self, state: AgentState) -> AgentState:
+        """异步检索：查询编码可被微批合并，向量检索在线程池中执行"""
         try:
-            docs = self.vector_store.similarity_search(query)
+            docs = await self.vector_store.asimilarity_search(
+                state["search_query"], k=self._retrieval_k(), filters=state.get("filters")
+            )
         except Exception as e:
             state["context"] = f"检索失败：{e}"
             return state
 
-        if not docs:
-            state["context"] = "没有找到相关文档。"
+        return self._after_retrieve(state, docs)
+
+    def _retrieval_k(self) -> Optional[int]:
+        """开启重排序时多取候选，由 rerank 节点筛选"""
+        return Config.RERANK_CANDIDATES if self.reranker is not None else None
+
+    def _after_retrieve(self, state: AgentState, docs: List[Document]) -> AgentState:
+        state["docs"] = docs
+        # 开启重排序时，上下文在 rerank 节点筛选后再组装
+        if self.reranker is not None:
             return state
+        return self._apply_docs(state, docs)
 
-        # 格式化上下文
-        context_parts = []
-        for idx, doc in enumerate(docs, start=1):
-            source = doc.metadata.get("source", "未知")
-            context_parts.append(
-                f"[文档片段 {idx} - 来源: {source}]\n{doc.page_content}\n"
+    # ================================
+    # Step 1.5：交叉编码器重排序（可选）
+    # ================================
+    @metrics.timed("rerank")
+    def _rerank(self, state: AgentState) -> AgentState:
+        if state["context"]:
+            # 检索失败，保留错误信息
+            return state
+        try:
+            docs = self.reranker.rerank(
+                state["search_query"], state["docs"], Config.RERANK_TOP_N
             )
+        except Exception as e:
+            # 重排序不可用时退回向量检索的排序
+            docs = state["docs"][:Config.RERANK_TOP_N]
+            metrics.annotate(rerank_error=str(e))
+        return self._apply_reranked(state, docs)
+
+    @metrics.timed("rerank")
+    async def _arerank(self, state: AgentState) -> AgentState:
+        if state["context"]:
+            return state
+        try:
+            docs = await self.reranker.arerank(
+                state["search_query"], state["docs"], Config.RERANK_TOP_N
+            )
+        except Exception as e:
+            docs = state["docs"][:Config.RERANK_TOP_N]
+            metrics.annotate(rerank_error=str(e))
+        return self._apply_reranked(state, docs)
+
+    def _apply_reranked(self, state: AgentState, docs: List[Document]) -> AgentState:
+        metrics.annotate(rerank_candidates=len(state["docs"]), rerank_kept=len(docs))
+        state["docs"] = docs
+        return self._apply_docs(state, docs)
+
+    def _apply_docs(self, state: AgentState, docs: List[Document]) -> AgentState:
+        state["doc_ids"] = [doc.id for doc in docs if doc.id]
+
+        # 在 token 预算内格式化上下文，并确定保留的历史条数
+        packed = self.context_packer.pack(state["query"], docs, state["history"])
+        state["context"] = packed.context
+        state["history_size"] = len(packed.history)
+        metrics.annotate(
+            packed_tokens=packed.tokens,
+            dropped_docs=packed.dropped_docs,
+            dropped_messages=packed.dropped_messages,
+        )
+        return state
+
+    # ================================
+    # Step 2：语义回答缓存
+    # ================================
+    @metrics.timed("check_cache")
+    def _check_answer_cache(self, state: AgentState) -> AgentState:
+        state["cached"] = False
+        if self.answer_cache is None or not state.get("doc_ids"):
+            return state
+        try:
+            vector = self.vector_store.embed_query(state["search_query"])
+        except Exception:
+            return state
+        return self._apply_cached_answer(state, vector)
 
-        state["context"] = "\n".join(context_parts)
+    @metrics.timed("check_cache")
+    async def _acheck_answer_cache(self, state: AgentState) -> AgentState:
+        state["cached"] = False
+        if self.answer_cache is None or not state.get("doc_ids"):
+            return state
+        try:
+            vector = await self.vector_store.aembed_query(state["search_query"])
+        except Exception:
+            return state
+        return self._apply_cached_answer(state, vector)
+
+    def _answer_context(self, state: AgentState) -> str:
+        """回答所依赖的对话上下文：进入提示词的历史（按打包结果截取）与会话 ID"""
+        history = state["history"]
+        keep = state.get("history_size")
+        if keep is not None:
+            history = history[-keep:] if keep else []
+        return context_key(state["session_id"], history)
+
+    def _apply_cached_answer(self, state: AgentState, vector: List[float]) -> AgentState:
+        state["query_vector"] = vector
+        hit = self.answer_cache.lookup(vector, state["doc_ids"], self._answer_context(state))
+        if hit is not None:
+            state["cached"] = True
+            state["messages"] = [
+                HumanMessage(content=state["query"]),
+                AIMessage(content=hit.answer)
+            ]
         return state
 
+    def _store_answer(self, state: AgentState, answer: str):
+        """生成成功后写入回答缓存"""
+        if self.answer_cache is not None and state.get("query_vector"):
+            self.answer_cache.store(
+                state["search_query"], state["query_vector"], state["doc_ids"], answer,
+                context=self._answer_context(state),
+            )
+
     # ================================
-    # Step 2：模型生成回答
+    # Step 3：模型生成回答
     # ================================
+    @metrics.timed("generate")
     def _generate_response(self, state: AgentState) -> AgentState:
-        # 限制历史长度（避免上下文过大）
-        history_messages = self.chat_history[-6:]
-
-        formatted_messages = self.prompt.format_messages(
-            context=state["context"],
-            history=history_messages,
-            query=state["query"]
-        )
+        formatted_messages = self._build_messages(state)
         # 调用 LLM
         try:
+            meter = metrics.generation()
             ai_msg = self.llm.invoke(formatted_messages)
+            meter.finish(ai_msg)
+            self._store_answer(state, ai_msg.content)
+        except LLMBusyError:
+            # 繁忙交给调用方处理（HTTP 服务返回 503），不写入对话历史
+            raise
         except Exception as e:
             ai_msg = AIMessage(content=f"生成回答失败：{e}")
 
@@ -146,29 +415,205 @@ class ChatAgent:
 
         return state
 
+    @metrics.timed("generate")
+    async def _agenerate_response(self, state: AgentState) -> AgentState:
+        formatted_messages = self._build_messages(state)
+        try:
+            meter = metrics.generation()
+            ai_msg = await self.llm.ainvoke(formatted_messages)
+            meter.finish(ai_msg)
+            self._store_answer(state, ai_msg.content)
+        except LLMBusyError:
+            raise
+        except Exception as e:
+            ai_msg = AIMessage(content=f"生成回答失败：{e}")
+
+        state["messages"] = [
+            HumanMessage(content=state["query"]),
+            ai_msg
+        ]
+
+        return state
+
+    @metrics.timed("prompt")
+    def _build_messages(self, state: AgentState) -> List[BaseMessage]:
+        """组装发送给 LLM 的消息（系统提示 + 上下文 + 历史 + 问题）"""
+        history = state["history"]
+        # 历史条数由上下文打包决定；检索失败时只按预算截取历史
+        keep = state.get("history_size")
+        if keep is None:
+            keep = len(self.context_packer.pack(state["query"], [], history).history)
+        history_messages = history[-keep:] if keep else []
+
+        return self.prompt.format_messages(
+            context=state["context"],
+            history=history_messages,
+            query=state["query"]
+        )
+
     # ================================
     # 外部接口
     # ================================
-    def chat(self, query: str) -> dict:
-        """对外的聊天接口。"""
-        initial_state: AgentState = {
+    def chat(
+        self,
+        query: str,
+        session_id: str = DEFAULT_SESSION,
+        filters: Optional[SearchFilter] = None,
+    ) -> dict:
+        """对外的聊天接口。filters 限定检索的租户与文档范围。"""
+        with metrics.trace("chat", session_id=session_id):
+            result = self.graph.invoke(self._initial_state(query, session_id, filters))
+            return self._record_result(result)
+
+    async def achat(
+        self,
+        query: str,
+        session_id: str = DEFAULT_SESSION,
+        filters: Optional[SearchFilter] = None,
+    ) -> dict:
+        """异步聊天接口：单个进程可并发处理多个会话。"""
+        async with self._session_lock(session_id):
+            with metrics.trace("chat", session_id=session_id):
+                result = await self.graph.ainvoke(
+                    self._initial_state(query, session_id, filters)
+                )
+                return self._record_result(result)
+
+    def chat_stream(
+        self,
+        query: str,
+        session_id: str = DEFAULT_SESSION,
+        filters: Optional[SearchFilter] = None,
+    ) -> Iterator[dict]:
+        """流式聊天接口：先完成检索，再逐个产出模型生成的 token。
+
+        产出事件：
+        - {"type": "context", "context": ...}：检索完成
+        - {"type": "token", "content": ...}：新生成的文本片段
+        - {"type": "end", "query": ..., "answer": ..., "context": ...}：生成结束，历史已更新
+
+        所有 LLM 后端繁忙时抛出 LLMBusyError（本轮不写入历史）。
+        """
+        with metrics.trace("chat", session_id=session_id, stream=True):
+            state = self._initial_state(query, session_id, filters)
+            if self.condenser is not None:
+                state = self._condense(state)
+            state = self._retrieve_context(state)
+            if self.reranker is not None:
+                state = self._rerank(state)
+            state = self._check_answer_cache(state)
+            yield {"type": "context", "context": state["context"]}
+
+            if state["cached"]:
+                answer = state["messages"][-1].content
+                yield {"type": "token", "content": answer}
+                yield {"type": "end", **self._finish_turn(state, answer)}
+                return
+
+            parts: List[str] = []
+            try:
+                meter = metrics.generation()
+                for chunk in self.llm.stream(self._build_messages(state)):
+                    meter.on_chunk(chunk)
+                    if chunk.content:
+                        parts.append(chunk.content)
+                        yield {"type": "token", "content": chunk.content}
+                meter.finish()
+                self._store_answer(state, "".join(parts))
+            except LLMBusyError:
+                raise
+            except Exception as e:
+                error = f"生成回答失败：{e}"
+                parts.append(error)
+                yield {"type": "token", "content": error}
+
+            yield {"type": "end", **self._finish_turn(state, "".join(parts))}
+
+    async def achat_stream(
+        self,
+        query: str,
+        session_id: str = DEFAULT_SESSION,
+        filters: Optional[SearchFilter] = None,
+    ) -> AsyncIterator[dict]:
+        """chat_stream 的异步版本（检索在线程池中执行，不阻塞事件循环）"""
+        async with self._session_lock(session_id):
+            with metrics.trace("chat", session_id=session_id, stream=True):
+                state = self._initial_state(query, session_id, filters)
+                if self.condenser is not None:
+                    state = await self._acondense(state)
+                state = await self._aretrieve_context(state)
+                if self.reranker is not None:
+                    state = await self._arerank(state)
+                state = await self._acheck_answer_cache(state)
+                yield {"type": "context", "context": state["context"]}
+
+                if state["cached"]:
+                    answer = state["messages"][-1].content
+                    yield {"type": "token", "content": answer}
+                    yield {"type": "end", **self._finish_turn(state, answer)}
+                    return
+
+                parts: List[str] = []
+                try:
+                    meter = metrics.generation()
+                    async for chunk in self.llm.astream(self._build_messages(state)):
+                        meter.on_chunk(chunk)
+                        if chunk.content:
+                            parts.append(chunk.content)
+                            yield {"type": "token", "content": chunk.content}
+                    meter.finish()
+                    self._store_answer(state, "".join(parts))
+                except LLMBusyError:
+                    raise
+                except Exception as e:
+                    error = f"生成回答失败：{e}"
+                    parts.append(error)
+                    yield {"type": "token", "content": error}
+
+                yield {"type": "end", **self._finish_turn(state, "".join(parts))}
+
+    def _initial_state(
+        self,
+        query: str,
+        session_id: str = DEFAULT_SESSION,
+        filters: Optional[SearchFilter] = None,
+    ) -> AgentState:
+        return {
             "messages": [],
             "context": "",
-            "query": query
+            "query": query,
+            "search_query": query,
+            "session_id": session_id,
+            "history": self.get_history(session_id),
+            "filters": filters,
+            "docs": [],
+            "doc_ids": [],
+            "query_vector": [],
+            "cached": False,
+            "history_size": None
         }
 
-        result = self.graph.invoke(initial_state)
+    def _record_result(self, result: AgentState) -> dict:
+        """把一轮问答写入所属会话的历史"""
+        self.sessions.append(result["session_id"], result["messages"])
 
-        # 更新历史
-        self.chat_history.extend(result["messages"])
+        cached = result.get("cached", False)
+        metrics.inc("rag_chat_turns_total", cached=str(cached).lower())
+        metrics.annotate(cached=cached, retrieved=len(result.get("doc_ids") or []))
 
         return {
-            "query": query,
+            "query": result["query"],
             "answer": result["messages"][-1].content,
-            "context": result["context"]
+            "context": result["context"],
+            "cached": cached
         }
 
-    def clear_history(self):
+    def _finish_turn(self, state: AgentState, answer: str) -> dict:
+        """流式生成结束后记录历史，返回与 chat() 相同结构的结果"""
+        state["messages"] = [HumanMessage(content=state["query"]), AIMessage(content=answer)]
+        return self._record_result(state)
+
+    def clear_history(self, session_id: str = DEFAULT_SESSION):
         """清空对话历史。"""
-        self.chat_history = []
+        self.sessions.clear(session_id)
         print("✓ 对话历史已清空")
@@ -0,0 +1,72 @@
+"""列式片段批次
+
+入库路径上一个来源文件的全部片段，按列存储：
+
+- texts：片段文本
+- starts：片段在提取出的全文中的起始字符偏移（array，紧凑且不被 GC 跟踪），
+  写入元数据时与 LangChain 分段器的 add_start_index 一样记为 start_index
+- metadata：文件级元数据（source / source_path / doc_type / modified_at），所有片段共享一份
+- columns：逐片段的附加元数据列（如 PDF 的 page / page_end，DOCX / Markdown 的 section_path）；
+  整数列存为 array，字符串列存为 list（同一章节的片段共享同一个字符串对象）
+
+解析进程产出 ChunkBatch，经向量化直接写入向量库；逐片段的元数据字典只在写入时按批次生成，
+LangChain Document 只在对外接口（DocumentProcessor.load_document、检索结果）处构造。
+相比每个片段一个 Document + 元数据字典，大批量入库时的对象数、内存占用与 GC 压力都小得多，
+跨进程传递时序列化的数据量也更小。
+"""
+
+from array import array
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Union
+
+from langchain_core.documents import Document
+
+from ingest_manifest import source_key
+
+
+@dataclass
+class ChunkBatch:
+    """一个来源文件的片段（列式）"""
+
+    metadata: dict
+    texts: List[str] = field(default_factory=list)
+    starts: array = field(default_factory=lambda: array("q"))
+    columns: Dict[str, Union[array, List[str]]] = field(default_factory=dict)
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    @property
+    def source(self) -> str:
+        """来源文件的唯一标识（与入库清单一致）"""
+        return source_key(self.metadata)
+
+    def append(self, text: str, start: int, **values: Union[int, str]):
+        """追加一个片段；values 为附加元数据列（整数或字符串）"""
+        self.texts.append(text)
+        self.starts.append(start)
+        for name, value in values.items():
+            column = self.columns.get(name)
+            if column is None:
+                column = self.columns[name] = array("q") if isinstance(value, int) else []
+            column.append(value)
+
+    def chunk_metadata(self, index: int) -> dict:
+        """第 index 个片段的完整元数据（写入向量库时按需生成）"""
+        metadata = {
+            **self.metadata,
+            "chunk_id": index,
+            "total_chunks": len(self.texts),
+            "start_index": self.starts[index],
+        }
+        for name, values in self.columns.items():
+            metadata[name] = values[index]
+        return metadata
+
+    def iter_documents(self) -> Iterator[Document]:
+        for index, text in enumerate(self.texts):
+            yield Document(page_content=text, metadata=self.chunk_metadata(index))
+
+    def to_documents(self) -> List[Document]:
+        """转换为 LangChain Document 列表（仅用于对外接口）"""
+        return list(self.iter_documents())
@@ -0,0 +1,243 @@
+"""集合版本管理与快照模块
+
+同一个逻辑集合（Config.COLLECTION_NAME）对应若干物理集合（版本），
+由指针文件 ``<VECTOR_DB_DIR>/<COLLECTION_NAME>.versions.json`` 记录当前生效的版本：
+
+- 重建（每日刷新、clear）先写入新版本，完成后原子替换指针文件切换，检索不中断
+- 被替换的版本标记为 retired，保留最近 COLLECTION_KEEP_VERSIONS 个用于回滚，
+  其余在退役超过 COLLECTION_RETIRE_GRACE 秒后（其他进程已切换到新版本）才删除
+- 构建中的版本由构建进程定期刷新 updated_at；构建进程被杀后超过 COLLECTION_RETIRE_GRACE 秒
+  没有刷新的 building 版本同样会被删除
+- 没有指针文件时沿用旧数据：生效版本即 COLLECTION_NAME 本身
+
+快照把一个版本的片段（ID、内容、元数据、向量）与入库清单导出为单个 zip 文件，
+按页写入 JSON Lines 与 .npy（DEFLATE 压缩），导出 / 恢复时内存占用与页大小成正比。
+"""
+
+import io
+import json
+import os
+import threading
+import time
+import uuid
+import zipfile
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+
+SNAPSHOT_FORMAT = 1
+
+# 版本状态
+BUILDING = "building"
+ACTIVE = "active"
+RETIRED = "retired"
+
+
+class CollectionRegistry:
+    """逻辑集合 → 物理版本的持久化指针（JSON，原子替换）"""
+
+    def __init__(self, path: Path, base_name: str):
+        self.path = Path(path)
+        self.base_name = base_name
+        self._lock = threading.Lock()
+        # 指针文件的（inode, mtime, 大小）：每次原子替换都会换 inode，mtime 精度不够时也能发现变化
+        self._signature: Optional[tuple] = None
+        self._state = self._default_state()
+
+    def _default_state(self) -> dict:
+        return {
+            "active": self.base_name,
+            "versions": [{"name": self.base_name, "status": ACTIVE, "created_at": None}],
+        }
+
+    # ================================
+    # 读写
+    # ================================
+    def _reload_locked(self):
+        """指针文件被（本进程或其他进程）修改过时重新读取"""
+        try:
+            signature = self._stat_signature()
+        except FileNotFoundError:
+            self._signature = None
+            self._state = self._default_state()
+            return
+        if signature == self._signature:
+            return
+        try:
+            self._state = json.loads(self.path.read_text(encoding="utf-8"))
+            self._signature = signature
+        except (OSError, ValueError) as e:
+            print(f"⚠ 集合版本文件损坏，已忽略: {e}")
+
+    def _save_locked(self):
+        """原子写入：其他进程要么读到旧指针，要么读到新指针"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(f"{self.path.name}.{uuid.uuid4().hex[:8]}.tmp")
+        tmp_path.write_text(json.dumps(self._state, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp_path, self.path)
+        self._signature = self._stat_signature()
+
+    def _stat_signature(self) -> tuple:
+        stat = self.path.stat()
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def active(self) -> str:
+        """当前生效的物理集合名"""
+        with self._lock:
+            self._reload_locked()
+            return self._state["active"]
+
+    def versions(self) -> List[dict]:
+        with self._lock:
+            self._reload_locked()
+            return [dict(version) for version in self._state["versions"]]
+
+    def _find_locked(self, name: str) -> Optional[dict]:
+        for version in self._state["versions"]:
+            if version["name"] == name:
+                return version
+        return None
+
+    # ================================
+    # 版本操作
+    # ================================
+    def create(self) -> str:
+        """登记一个新的（构建中的）版本并返回物理集合名"""
+        name = f"{self.base_name}_v{time.strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:6]}"
+        with self._lock:
+            self._reload_locked()
+            self._state["versions"].append(
+                {"name": name, "status": BUILDING, "created_at": time.time()}
+            )
+            self._save_locked()
+        return name
+
+    def activate(self, name: str) -> Optional[str]:
+        """把 name 切换为生效版本，返回被替换的版本名"""
+        with self._lock:
+            self._reload_locked()
+            version = self._find_locked(name)
+            if version is None:
+                raise KeyError(f"集合版本不存在: {name}")
+            previous = self._state["active"]
+            if previous == name:
+                return None
+            old = self._find_locked(previous)
+            if old is not None:
+                old.update(status=RETIRED, retired_at=time.time())
+            version.update(status=ACTIVE, activated_at=time.time())
+            version.pop("retired_at", None)
+            self._state["active"] = name
+            self._save_locked()
+            return previous
+
+    def previous(self) -> Optional[str]:
+        """最近退役、仍可回滚的版本"""
+        retired = [v for v in self.versions() if v["status"] == RETIRED]
+        if not retired:
+            return None
+        return max(retired, key=lambda v: v.get("retired_at") or 0)["name"]
+
+    def touch(self, name: str):
+        """刷新构建中版本的 updated_at，表明构建进程仍在运行"""
+        with self._lock:
+            self._reload_locked()
+            version = self._find_locked(name)
+            if version is None or version["status"] != BUILDING:
+                return
+            version["updated_at"] = time.time()
+            self._save_locked()
+
+    def expired(self, keep: int, grace: float) -> List[str]:
+        """可以删除的版本：超出保留个数且退役已超过 grace 秒的退役版本，
+        以及超过 grace 秒没有刷新的构建中版本（构建进程已被杀死，没有清理）"""
+        versions = self.versions()
+        retired = sorted(
+            (v for v in versions if v["status"] == RETIRED),
+            key=lambda v: v.get("retired_at") or 0,
+            reverse=True,
+        )
+        now = time.time()
+        expired = [
+            v["name"] for v in retired[keep:]
+            if now - (v.get("retired_at") or 0) >= grace
+        ]
+        expired += [
+            v["name"] for v in versions
+            if v["status"] == BUILDING
+            and now - (v.get("updated_at") or v.get("created_at") or 0) >= grace
+        ]
+        return expired
+
+    def remove(self, name: str):
+        with self._lock:
+            self._reload_locked()
+            if name == self._state["active"]:
+                raise ValueError(f"不能删除生效中的集合版本: {name}")
+            self._state["versions"] = [
+                v for v in self._state["versions"] if v["name"] != name
+            ]
+            self._save_locked()
+
+
+# ================================
+# 快照
+# ================================
+def write_snapshot(
+    path: Path, info: dict, manifest: dict, pages: Iterator[Tuple[dict, np.ndarray]]
+) -> int:
+    """写入快照，pages 逐页给出（{ids, documents, metadatas}, 向量矩阵），返回片段数
+
+    先写临时文件再替换，中断时不会留下半截快照。
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.tmp")
+    count, page_count = 0, 0
+    with zipfile.ZipFile(tmp_path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for records, embeddings in pages:
+            with archive.open(f"chunks/{page_count:06d}.jsonl", "w", force_zip64=True) as f:
+                for doc_id, document, metadata in zip(
+                    records["ids"], records["documents"], records["metadatas"], strict=True
+                ):
+                    line = {"id": doc_id, "document": document, "metadata": metadata or {}}
+                    f.write((json.dumps(line, ensure_ascii=False) + "\n").encode("utf-8"))
+            buffer = io.BytesIO()
+            np.save(buffer, np.asarray(embeddings, dtype=np.float32))
+            archive.writestr(f"vectors/{page_count:06d}.npy", buffer.getvalue())
+            count += len(records["ids"])
+            page_count += 1
+
+        info = {**info, "format": SNAPSHOT_FORMAT, "count": count, "pages": page_count}
+        archive.writestr("info.json", json.dumps(info, ensure_ascii=False, indent=2))
+        archive.writestr("manifest.json", json.dumps(manifest, ensure_ascii=False))
+    os.replace(tmp_path, path)
+    return count
+
+
+def read_snapshot_info(path: Path) -> Tuple[dict, dict]:
+    """返回（快照信息, 入库清单）"""
+    with zipfile.ZipFile(path) as archive:
+        info = json.loads(archive.read("info.json"))
+        if info.get("format") != SNAPSHOT_FORMAT:
+            raise ValueError(f"不支持的快照格式: {info.get('format')}")
+        return info, json.loads(archive.read("manifest.json"))
+
+
+def iter_snapshot_pages(
+    path: Path,
+) -> Iterator[Tuple[List[str], List[str], List[dict], np.ndarray]]:
+    """逐页读取快照：（ID, 内容, 元数据, 向量矩阵）"""
+    with zipfile.ZipFile(path) as archive:
+        pages = json.loads(archive.read("info.json"))["pages"]
+        for page in range(pages):
+            ids, documents, metadatas = [], [], []
+            with archive.open(f"chunks/{page:06d}.jsonl") as f:
+                for line in f:
+                    record = json.loads(line)
+                    ids.append(record["id"])
+                    documents.append(record["document"])
+                    metadatas.append(record["metadata"])
+            embeddings = np.load(io.BytesIO(archive.read(f"vectors/{page:06d}.npy")))
+            yield ids, documents, metadatas, embeddings
@@ -14,23 +14,135 @@ class Config:
     BASE_DIR = Path(__file__).parent.parent
     DATA_DIR = BASE_DIR / "data"
     UPLOAD_DIR = DATA_DIR / "uploads"
+    # 各租户的上传目录：<TENANT_UPLOAD_DIR>/<tenant>（不放在 UPLOAD_DIR 下，避免被默认租户递归入库）
+    TENANT_UPLOAD_DIR = DATA_DIR / "tenants"
     VECTOR_DB_DIR = BASE_DIR / "chroma_db"
+    MANIFEST_DIR = BASE_DIR / "chroma_manifest"
+    LEXICAL_INDEX_DIR = BASE_DIR / "lexical_index"
     MODEL_DIR = BASE_DIR / "model"
+    CACHE_DIR = BASE_DIR / "cache"
     
     # Ollama 配置
     OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
     OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "deepseek-r1:7b")
+    # 多个 Ollama 实例（逗号分隔），按在途请求数最少分配；未设置时只用 OLLAMA_BASE_URL
+    OLLAMA_BASE_URLS = [
+        url.strip() for url in (os.getenv("OLLAMA_BASE_URLS") or OLLAMA_BASE_URL).split(",") if url.strip()
+    ]
+    OLLAMA_MAX_CONCURRENCY = int(os.getenv("OLLAMA_MAX_CONCURRENCY", "2"))  # 每个实例的并发上限
+    LLM_QUEUE_SIZE = int(os.getenv("LLM_QUEUE_SIZE", "16"))  # 全部满载时最多排队的请求数
+    LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "30"))  # 排队超时（秒），超时返回繁忙
+    OLLAMA_FAILURE_COOLDOWN = float(os.getenv("OLLAMA_FAILURE_COOLDOWN", "10"))  # 连接失败后暂停调度（秒）
     
     # LLM 参数
     LLM_TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", "0.7"))
     LLM_MAX_TOKENS = int(os.getenv("LLM_MAX_TOKENS", "2000"))
+    LLM_NUM_CTX = int(os.getenv("LLM_NUM_CTX", "8192"))  # 模型上下文窗口（token）
+    
+    # 上下文打包：提示词 token 预算（0 表示 LLM_NUM_CTX - LLM_MAX_TOKENS）
+    CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "0"))
+    CONTEXT_HISTORY_SHARE = float(os.getenv("CONTEXT_HISTORY_SHARE", "0.25"))
+    HISTORY_MAX_MESSAGES = int(os.getenv("HISTORY_MAX_MESSAGES", "6"))
+    
+    # 会话存储：memory（进程内 LRU）/ sqlite（持久化，多进程共用）
+    SESSION_STORE = os.getenv("SESSION_STORE", "memory")
+    SESSION_DB_PATH = DATA_DIR / "sessions.sqlite3"
+    # 每个会话保存的消息条数（写入时裁剪，默认与提示词使用的历史条数一致）
+    SESSION_MAX_MESSAGES = int(os.getenv("SESSION_MAX_MESSAGES", str(HISTORY_MAX_MESSAGES)))
+    SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", "10000"))  # memory 的会话数上限
+    SESSION_IDLE_TTL = float(os.getenv("SESSION_IDLE_TTL", "86400"))  # 空闲会话淘汰（秒，0 表示不淘汰）
     
     # 文档处理参数
     CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "1000"))
     CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "200"))
+    # 分段方式：chars（按字符数）/ tokens（按 embedding 模型的 token 数，在句子边界结束）
+    TEXT_SPLITTER = os.getenv("TEXT_SPLITTER", "chars")
+    CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "0"))  # 0 表示模型的最大序列长度
+    CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "0"))
+    
+    # 批量入库参数
+    INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "0"))  # 0 表示使用全部 CPU 核心
+    EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+    WRITE_BATCH_SIZE = int(os.getenv("WRITE_BATCH_SIZE", "1024"))
+    INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "8"))
+    
+    # 向量库参数
+    COLLECTION_NAME = os.getenv("COLLECTION_NAME", "rag_store")
+    # 向量索引后端：chroma（HNSW）/ numpy（进程内 flat / IVF，内存映射向量）
+    VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+    # 距离度量：l2 / cosine / ip（仅新建集合时生效）
+    VECTOR_SPACE = os.getenv("VECTOR_SPACE", "l2")
+    # Chroma HNSW 参数：M 与 ef_construction 仅新建集合时生效，ef_search 每次打开时应用
+    HNSW_M = int(os.getenv("HNSW_M", "16"))
+    HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "100"))
+    HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "100"))
+    # numpy 后端：向量精度（float32 / float16）、IVF 簇数（0 表示精确检索）与每次查询扫描的簇数
+    NUMPY_INDEX_DTYPE = os.getenv("NUMPY_INDEX_DTYPE", "float32")
+    NUMPY_IVF_NLIST = int(os.getenv("NUMPY_IVF_NLIST", "0"))
+    NUMPY_IVF_NPROBE = int(os.getenv("NUMPY_IVF_NPROBE", "8"))
+    # 集合版本：保留多少个已替换的旧版本用于回滚，旧版本退役多少秒后才删除（等待其他进程切换）
+    COLLECTION_KEEP_VERSIONS = int(os.getenv("COLLECTION_KEEP_VERSIONS", "1"))
+    COLLECTION_RETIRE_GRACE = float(os.getenv("COLLECTION_RETIRE_GRACE", "300"))
+    # 检查生效版本指针的最小间隔（秒），其他进程切换版本后在此时间内跟随
+    COLLECTION_POINTER_CHECK_INTERVAL = float(os.getenv("COLLECTION_POINTER_CHECK_INTERVAL", "1"))
     
     # 检索参数
     RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", "4"))
+    RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "vector")  # vector / hybrid
+    LEXICAL_INDEX_ENABLED = os.getenv("LEXICAL_INDEX_ENABLED", "true").lower() == "true"
+    HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+    HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", "60"))
+    
+    # 交叉编码器重排序：多取 RERANK_CANDIDATES 个候选，重排后只保留前 RERANK_TOP_N 个
+    RERANK_ENABLED = os.getenv("RERANK_ENABLED", "false").lower() == "true"
+    RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1")
+    RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "20"))
+    RERANK_TOP_N = int(os.getenv("RERANK_TOP_N", "3"))
+    RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "16"))
+    RERANK_MAX_LENGTH = int(os.getenv("RERANK_MAX_LENGTH", "512"))
+    RERANK_CACHE_MAX_ENTRIES = int(os.getenv("RERANK_CACHE_MAX_ENTRIES", "10000"))
+    
+    # 追问改写：检索前结合最近 CONDENSE_HISTORY_MESSAGES 条历史把追问改写为独立问题
+    # （不计标点短于 CONDENSE_MIN_QUERY_CHARS 个字或含指代词的问题才调用 LLM，改写结果缓存）
+    CONDENSE_ENABLED = os.getenv("CONDENSE_ENABLED", "true").lower() == "true"
+    CONDENSE_HISTORY_MESSAGES = int(os.getenv("CONDENSE_HISTORY_MESSAGES", "4"))
+    CONDENSE_MIN_QUERY_CHARS = int(os.getenv("CONDENSE_MIN_QUERY_CHARS", "4"))
+    CONDENSE_CACHE_MAX_ENTRIES = int(os.getenv("CONDENSE_CACHE_MAX_ENTRIES", "1000"))
+    
+    # Embedding 后端：huggingface（PyTorch fp32）/ onnx（ONNX Runtime，可选 int8 量化）
+    EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "huggingface")
+    ONNX_MODEL_DIR = MODEL_DIR / "paraphrase-multilingual-MiniLM-L12-v2-onnx"
+    ONNX_QUANTIZED = os.getenv("ONNX_QUANTIZED", "true").lower() == "true"
+    EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))  # 0 表示由运行时决定
+    
+    # 文本提取缓存：PDF / DOCX / Markdown 的提取结果按文件指纹压缩保存，重新分段时跳过解析
+    EXTRACTION_CACHE_ENABLED = os.getenv("EXTRACTION_CACHE_ENABLED", "true").lower() == "true"
+    EXTRACTION_CACHE_DIR = CACHE_DIR / "extracted"
+    EXTRACTION_CACHE_MAX_MB = int(os.getenv("EXTRACTION_CACHE_MAX_MB", "1024"))
+    EXTRACTION_CACHE_MAX_AGE_DAYS = float(os.getenv("EXTRACTION_CACHE_MAX_AGE_DAYS", "30"))
+    
+    # Embedding 缓存
+    EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+    EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "100000"))
+    
+    # 语义回答缓存
+    ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+    ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+    ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", "3600"))
+    ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+    
+    # HTTP 服务
+    SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
+    SERVER_PORT = int(os.getenv("SERVER_PORT", "8000"))
+    QUERY_BATCH_SIZE = int(os.getenv("QUERY_BATCH_SIZE", "32"))
+    QUERY_BATCH_WAIT_MS = float(os.getenv("QUERY_BATCH_WAIT_MS", "5"))
+    
+    # 启动：命令行启动后在后台线程中预热 embedding 模型与向量库
+    STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "true").lower() == "true"
+    
+    # 内置性能指标（GET /metrics、stats 命令）；METRICS_LOG_FILE 非空时每轮对话写一行 JSON
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    METRICS_LOG_FILE = os.getenv("METRICS_LOG_FILE", "")
     
     # LangSmith 配置
     LANGCHAIN_TRACING_V2 = os.getenv("LANGCHAIN_TRACING_V2", "false").lower() == "true"
@@ -43,7 +155,13 @@ class Config:
         cls.UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
         cls.VECTOR_DB_DIR.mkdir(parents=True, exist_ok=True)
         cls.MODEL_DIR.mkdir(parents=True, exist_ok=True)
+        cls.CACHE_DIR.mkdir(parents=True, exist_ok=True)
         
+    @classmethod
+    def upload_dir(cls, tenant=None) -> Path:
+        """租户的上传目录，tenant 为空时为默认的 UPLOAD_DIR"""
+        return cls.TENANT_UPLOAD_DIR / tenant if tenant else cls.UPLOAD_DIR
+
     @classmethod
     def setup_langsmith(cls):
         """设置 LangSmith 追踪"""
@@ -0,0 +1,236 @@
+"""上下文打包模块
+
+按 token 预算组装发送给 LLM 的提示词：系统提示与问题必选，
+检索片段按排名、对话历史按新旧依次填入预算，优先舍弃排名最低的片段与最早的历史；
+放不下的片段在句子边界截断。相邻片段之间由 CHUNK_OVERLAP 产生的重复文本会被去除。
+
+token 数按字符估算（CJK 字符约 1 token，其他字符约 4 个 1 token），
+也可传入模型自己的计数函数。
+"""
+
+import math
+import re
+from dataclasses import dataclass, field
+from typing import Callable, List, Sequence, Tuple
+
+from langchain_core.documents import Document
+from langchain_core.messages import BaseMessage
+
+_CJK_RE = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef]")
+# 截断时优先停在这些句末标点之后
+_SENTENCE_END_RE = re.compile(r"[。！？；.!?;\n]")
+# 每条消息的角色标记等固定开销
+_MESSAGE_OVERHEAD = 4
+# 放不下时，剩余预算至少有这么多 token 才截断填入，否则直接舍弃
+_MIN_TRUNCATED_TOKENS = 48
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算 token 数"""
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+def overlap_length(left: str, right: str, max_overlap: int, min_overlap: int = 20) -> int:
+    """left 的结尾与 right 的开头重合的最大长度（不足 min_overlap 时返回 0）"""
+    upper = min(len(left), len(right), max_overlap)
+    for size in range(upper, min_overlap - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+@dataclass
+class PackedContext:
+    """打包结果"""
+    context: str
+    history: List[BaseMessage]
+    doc_ids: List[str] = field(default_factory=list)
+    tokens: dict = field(default_factory=dict)
+    dropped_docs: int = 0
+    dropped_messages: int = 0
+    truncated: bool = False
+
+
+class ContextPacker:
+    """在 token 预算内组装检索片段与对话历史"""
+
+    def __init__(
+        self,
+        budget: int,
+        overhead_tokens: int = 0,
+        chunk_overlap: int = 200,
+        history_share: float = 0.25,
+        max_history_messages: int = 6,
+        token_counter: Callable[[str], int] = estimate_tokens,
+    ):
+        self.budget = budget
+        self.overhead_tokens = overhead_tokens
+        self.chunk_overlap = chunk_overlap
+        self.history_share = history_share
+        self.max_history_messages = max_history_messages
+        self.count = token_counter
+
+    def pack(
+        self, query: str, docs: Sequence[Document], history: Sequence[BaseMessage]
+    ) -> PackedContext:
+        """按预算选择片段与历史
+
+        - 系统提示（overhead_tokens）与问题始终保留
+        - 历史最多使用 history_share 的预算，按轮从新到旧保留
+        - 片段按检索排名填入剩余预算，最后一个放不下的片段截断
+        - 片段用不完的预算再分给更早的历史
+        """
+        query_tokens = self.count(query) + _MESSAGE_OVERHEAD
+        available = max(self.budget - self.overhead_tokens - query_tokens, 0)
+
+        history = list(history)[-self.max_history_messages:] if self.max_history_messages else []
+        turns = self._turns(history)
+
+        kept_turns, history_tokens = self._fit_turns(turns, int(available * self.history_share))
+        parts, doc_ids, context_tokens, dropped_docs, truncated = self._fit_docs(
+            docs, available - history_tokens
+        )
+        # 片段剩余的预算留给更早的历史
+        more_turns, more_tokens = self._fit_turns(
+            turns[:len(turns) - len(kept_turns)], available - history_tokens - context_tokens
+        )
+        kept_turns = more_turns + kept_turns
+        history_tokens += more_tokens
+
+        kept_history = [message for turn in kept_turns for message in turn]
+        dropped_messages = len(history) - len(kept_history)
+        return PackedContext(
+            context="\n".join(parts) if parts else "没有找到相关文档。",
+            history=kept_history,
+            doc_ids=doc_ids,
+            tokens={
+                "budget": self.budget,
+                "system": self.overhead_tokens,
+                "query": query_tokens,
+                "context": context_tokens,
+                "history": history_tokens,
+                "total": self.overhead_tokens + query_tokens + context_tokens + history_tokens,
+            },
+            dropped_docs=dropped_docs,
+            dropped_messages=dropped_messages,
+            truncated=truncated,
+        )
+
+    # ================================
+    # 对话历史
+    # ================================
+    @staticmethod
+    def _turns(history: List[BaseMessage]) -> List[List[BaseMessage]]:
+        """按轮分组（一问一答），保证不会只保留半轮"""
+        turns: List[List[BaseMessage]] = []
+        for message in history:
+            if message.type == "human" or not turns:
+                turns.append([message])
+            else:
+                turns[-1].append(message)
+        return turns
+
+    def _fit_turns(
+        self, turns: List[List[BaseMessage]], budget: int
+    ) -> Tuple[List[List[BaseMessage]], int]:
+        """从最近一轮开始，在预算内尽量多保留整轮历史"""
+        kept: List[List[BaseMessage]] = []
+        used = 0
+        for turn in reversed(turns):
+            cost = sum(self.count(str(m.content)) + _MESSAGE_OVERHEAD for m in turn)
+            if used + cost > budget:
+                break
+            kept.insert(0, turn)
+            used += cost
+        return kept, used
+
+    # ================================
+    # 检索片段
+    # ================================
+    def _fit_docs(self, docs: Sequence[Document], budget: int):
+        parts: List[str] = []
+        doc_ids: List[str] = []
+        used = dropped = 0
+        truncated = False
+
+        for doc, text in self._dedupe(docs):
+            part = self._format(len(parts) + 1, doc, text)
+            cost = self.count(part)
+            if used + cost <= budget:
+                parts.append(part)
+                used += cost
+            elif not truncated and budget - used >= _MIN_TRUNCATED_TOKENS:
+                # 只截断第一个放不下的片段，其余（排名更低的）直接舍弃
+                header_cost = self.count(self._format(len(parts) + 1, doc, ""))
+                text = self._truncate(text, budget - used - header_cost)
+                part = self._format(len(parts) + 1, doc, text)
+                parts.append(part)
+                used += self.count(part)
+                truncated = True
+            else:
+                dropped += 1
+                continue
+            if doc.id:
+                doc_ids.append(doc.id)
+
+        return parts, doc_ids, used, dropped, truncated
+
+    def _dedupe(self, docs: Sequence[Document]) -> List[Tuple[Document, str]]:
+        """去除完全重复 / 被包含的片段，以及同一来源相邻片段之间的重叠文本"""
+        kept: List[Tuple[Document, str]] = []
+        for doc in docs:
+            text = doc.page_content.strip()
+            source = doc.metadata.get("source_path") or doc.metadata.get("source")
+            duplicate = False
+            for other, other_text in kept:
+                other_source = other.metadata.get("source_path") or other.metadata.get("source")
+                if other_source != source:
+                    continue
+                if text in other_text:
+                    duplicate = True
+                    break
+                # 当前片段的开头与已选片段的结尾重叠（当前片段在后）
+                size = overlap_length(other_text, text, self.chunk_overlap)
+                if size:
+                    text = text[size:].lstrip()
+                # 当前片段的结尾与已选片段的开头重叠（当前片段在前）
+                size = overlap_length(text, other_text, self.chunk_overlap)
+                if size:
+                    text = text[:-size].rstrip()
+            if not duplicate and text:
+                kept.append((doc, text))
+        return kept
+
+    @staticmethod
+    def _format(idx: int, doc: Document, text: str) -> str:
+        source = doc.metadata.get("source", "未知")
+        # PDF 片段带页码、DOCX / Markdown 片段带章节路径，便于引用到具体位置
+        page = doc.metadata.get("page")
+        section = doc.metadata.get("section_path")
+        if page:
+            source = f"{source} 第 {page} 页"
+        elif section:
+            source = f"{source} · {section}"
+        return f"[文档片段 {idx} - 来源: {source}]\n{text}\n"
+
+    def _truncate(self, text: str, budget: int) -> str:
+        """截断到预算以内，尽量停在句末"""
+        if budget <= 0:
+            return ""
+        low, high = 0, len(text)
+        while low < high:
+            mid = (low + high + 1) // 2
+            if self.count(text[:mid]) + 1 <= budget:
+                low = mid
+            else:
+                high = mid - 1
+        cut = text[:low]
+        # 句末位于后 30% 时在句末截断
+        ends = [m.end() for m in _SENTENCE_END_RE.finditer(cut)]
+        if ends and ends[-1] >= len(cut) * 0.7:
+            cut = cut[:ends[-1]]
+        return cut.rstrip() + "…"
+
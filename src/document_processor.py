@@ -1,89 +1,279 @@
-"""文档处理模块"""
+"""文档处理模块
 
+各格式的解析库（pypdf / python-docx）在首次处理对应格式时才导入。
+
+PDF 以内存映射方式打开，逐页提取文本并增量分段，解析过程中只保留少数几页文本，
+片段元数据带有页码（page / page_end）。分段结果仍收集为整篇的 ChunkBatch 后再写入
+（upsert_batch 需要整篇的片段 ID 对比新旧版本），片段本身不逐批写入向量库。
+
+所有片段的元数据都带有文档类型（doc_type，不带点的小写扩展名）与文件修改时间
+（modified_at，Unix 时间戳），检索时可按这两个字段过滤（见 search_filters）。
+
+DOCX / Markdown 按文档结构提取（见 structured_text）：片段不跨越章节边界，
+同一上级章节下相邻的短章节合并为一个片段，元数据带有章节路径（section_path）。
+
+入库路径使用列式的 ChunkBatch（load_batch），load_document 只在对外接口处转换为 LangChain Document。
+
+PDF / DOCX / Markdown 的提取结果按文件指纹缓存（EXTRACTION_CACHE_ENABLED，见 extraction_cache），
+只调整分段参数后重新入库时跳过解析；TXT 直接读取，不经过缓存。
+"""
+
+import bisect
+import mmap
 from pathlib import Path
-from typing import List
-import pypdf
-from docx import Document
-import markdown
+from typing import Iterable, Iterator, List, Optional, Tuple
 
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document as LangChainDocument
 
+from chunk_batch import ChunkBatch
 from config import Config
+from extraction_cache import ExtractionCache
+from structured_text import SECTION_SEPARATOR, Section, docx_sections, markdown_sections
+from text_splitters import create_text_splitter
 
 
 class DocumentProcessor:
     """文档处理器，支持多种格式"""
+
+    # 各格式提取器的版本（参与提取缓存的键），提取逻辑变化时加一，使旧的缓存条目失效
+    EXTRACTOR_VERSIONS = {"pdf": 1, "docx": 3, "md": 2}
     
     def __init__(self):
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=Config.CHUNK_SIZE,
-            chunk_overlap=Config.CHUNK_OVERLAP,
-            length_function=len,
-        )
+        # 分段器（TEXT_SPLITTER=chars|tokens）及其长度函数与片段上限（字符数或 token 数）
+        self.text_splitter, self.chunk_length, self.chunk_size = create_text_splitter()
+        self.extraction_cache: Optional[ExtractionCache] = None
+        if Config.EXTRACTION_CACHE_ENABLED:
+            self.extraction_cache = ExtractionCache(
+                Config.EXTRACTION_CACHE_DIR,
+                max_bytes=Config.EXTRACTION_CACHE_MAX_MB * 1024 * 1024,
+                max_age=Config.EXTRACTION_CACHE_MAX_AGE_DAYS * 86400,
+            )
     
-    def load_document(self, file_path: str) -> List[LangChainDocument]:
-        """加载并处理文档"""
+    def load_document(
+        self, file_path: str, file_hash: Optional[str] = None
+    ) -> List[LangChainDocument]:
+        """加载并处理文档（已知文件的 SHA-256 时传入 file_hash，提取缓存不再重复计算）"""
+        return self.load_batch(file_path, file_hash).to_documents()
+
+    def load_batch(self, file_path: str, file_hash: Optional[str] = None) -> ChunkBatch:
+        """加载并分段，返回列式的片段批次（入库路径使用，不构造逐片段的 Document）"""
         path = Path(file_path)
         
         if not path.exists():
             raise FileNotFoundError(f"文件不存在: {file_path}")
         
-        # 根据文件类型提取文本
         suffix = path.suffix.lower()
         if suffix == ".pdf":
-            text = self._extract_pdf(path)
-        elif suffix == ".docx":
-            text = self._extract_docx(path)
-        elif suffix == ".md":
-            text = self._extract_markdown(path)
-        elif suffix == ".txt":
-            text = self._extract_txt(path)
-        else:
+            batch = ChunkBatch(metadata=self._file_metadata(path))
+            pages = self._cached_pdf_pages(path, file_hash)
+            for chunk, start, page, page_end in self._split_pages_at(pages):
+                batch.append(chunk, start, page=page, page_end=page_end)
+            return batch
+
+        # 按章节提取的格式
+        if suffix in (".docx", ".md"):
+            extract = self._extract_docx if suffix == ".docx" else self._extract_markdown
+            batch = ChunkBatch(metadata=self._file_metadata(path))
+            sections = self._cached_sections(path, extract, file_hash)
+            for chunk, start, section_path in self._split_sections(sections):
+                batch.append(chunk, start, section_path=section_path)
+            return batch
+
+        if suffix != ".txt":
             raise ValueError(f"不支持的文件格式: {suffix}")
+        text = self._extract_txt(path)
         
         # 分段
         chunks = self.text_splitter.split_text(text)
-        
-        # 创建文档对象
-        documents = [
-            LangChainDocument(
-                page_content=chunk,
-                metadata={
-                    "source": str(path.name),
-                    "chunk_id": i,
-                    "total_chunks": len(chunks)
-                }
-            )
-            for i, chunk in enumerate(chunks)
-        ]
-        
-        return documents
+        batch = ChunkBatch(metadata=self._file_metadata(path))
+        for chunk, start in zip(chunks, self._locate(text, chunks), strict=True):
+            batch.append(chunk, start)
+        return batch
+
+    @staticmethod
+    def _locate(text: str, chunks: List[str]) -> List[int]:
+        """片段在全文中的起始位置（按顺序查找，相邻片段可能重叠）"""
+        starts, search_from = [], 0
+        for chunk in chunks:
+            start = text.find(chunk, search_from)
+            if start < 0:
+                start = search_from
+            starts.append(start)
+            search_from = start + 1
+        return starts
+
+    @staticmethod
+    def _file_metadata(path: Path) -> dict:
+        """片段共有的文件级元数据"""
+        return {
+            "source": str(path.name),
+            "source_path": str(path.resolve()),
+            "doc_type": path.suffix.lower().lstrip("."),
+            "modified_at": int(path.stat().st_mtime),
+        }
     
-    def _extract_pdf(self, path: Path) -> str:
-        """提取 PDF 文本"""
-        text = []
+    def _cache_key(self, path: Path, file_hash: Optional[str]) -> str:
+        doc_type = path.suffix.lower().lstrip(".")
+        extractor = f"{doc_type}-v{self.EXTRACTOR_VERSIONS[doc_type]}"
+        return self.extraction_cache.key(path, extractor, file_hash)
+
+    def _cached_sections(
+        self, path: Path, extract, file_hash: Optional[str] = None
+    ) -> List[Section]:
+        """按章节提取的格式：命中缓存时直接返回章节，否则提取后写入缓存"""
+        if self.extraction_cache is None:
+            return extract(path)
+        key = self._cache_key(path, file_hash)
+        sections = self.extraction_cache.get(key)
+        if sections is not None:
+            return sections
+        sections = extract(path)
+        self.extraction_cache.put(key, sections)
+        return sections
+
+    def _cached_pdf_pages(
+        self, path: Path, file_hash: Optional[str] = None
+    ) -> Iterator[Tuple[int, str]]:
+        """逐页产出 PDF 文本：命中缓存时跳过 pypdf，否则边解析边写入缓存（完整读完才生效）"""
+        if self.extraction_cache is None:
+            yield from self._iter_pdf_pages(path)
+            return
+        key = self._cache_key(path, file_hash)
+        pages = self.extraction_cache.get(key)
+        if pages is not None:
+            yield from pages
+            return
+        with self.extraction_cache.writer(key) as writer:
+            for page_number, text in self._iter_pdf_pages(path):
+                writer.add(page_number, text)
+                yield page_number, text
+
+    def _iter_pdf_pages(self, path: Path) -> Iterator[Tuple[int, str]]:
+        """以内存映射方式打开 PDF，逐页产出（页码, 文本），页码从 1 开始"""
+        import pypdf
+
         with open(path, "rb") as file:
-            pdf_reader = pypdf.PdfReader(file)
-            for page in pdf_reader.pages:
-                text.append(page.extract_text())
-        return "\n\n".join(text)
+            # 空文件无法映射，交给 pypdf 报错
+            stream = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if path.stat().st_size else file
+            try:
+                pdf_reader = pypdf.PdfReader(stream)
+                for page_number, page in enumerate(pdf_reader.pages, start=1):
+                    yield page_number, page.extract_text() or ""
+            finally:
+                if stream is not file:
+                    stream.close()
+
+    def _split_pages_at(
+        self, pages: Iterable[Tuple[int, str]]
+    ) -> Iterator[Tuple[str, int, int, int]]:
+        """增量分段，产出（片段, 在全文中的起始偏移, 起始页, 结束页）
+
+        页之间以空行连接（与整篇拼接后再分段一致）。缓冲区累积到约两个片段上限（按分段器的长度函数计）后分段，
+        产出除最后一个之外的片段，最后一个片段留在缓冲区与后续页拼接，片段间的重叠保持不变。
+        """
+        buffer = ""
+        # 已丢弃的前缀长度（缓冲区起点在全文中的偏移）
+        consumed = 0
+        # 缓冲区内各页的起始偏移与页码
+        offsets: List[int] = []
+        page_numbers: List[int] = []
+        # 按分段器自身的单位（字符或 token）计，TEXT_SPLITTER=tokens 时 CHUNK_SIZE 不适用
+        flush_size = 2 * self.chunk_size
+
+        def page_at(position: int) -> int:
+            return page_numbers[bisect.bisect_right(offsets, position) - 1]
+
+        for page_number, text in pages:
+            if buffer:
+                buffer += "\n\n"
+            offsets.append(len(buffer))
+            page_numbers.append(page_number)
+            buffer += text
+            if self.chunk_length(buffer) < flush_size:
+                continue
+
+            chunks = self.text_splitter.split_text(buffer)
+            if len(chunks) < 2:
+                continue
+            starts = self._locate(buffer, chunks)
+            for chunk, start in zip(chunks[:-1], starts[:-1], strict=True):
+                yield chunk, consumed + start, page_at(start), page_at(start + len(chunk) - 1)
+
+            # 丢弃已产出的部分，页偏移随之平移
+            keep_from = starts[-1]
+            first_page = bisect.bisect_right(offsets, keep_from) - 1
+            offsets = [max(offset - keep_from, 0) for offset in offsets[first_page:]]
+            page_numbers = page_numbers[first_page:]
+            buffer = buffer[keep_from:]
+            consumed += keep_from
+
+        if buffer.strip():
+            chunks = self.text_splitter.split_text(buffer)
+            for chunk, start in zip(chunks, self._locate(buffer, chunks), strict=True):
+                yield chunk, consumed + start, page_at(start), page_at(start + len(chunk) - 1)
     
-    def _extract_docx(self, path: Path) -> str:
-        """提取 Word 文本"""
-        doc = Document(path)
-        return "\n\n".join([para.text for para in doc.paragraphs if para.text.strip()])
+    def _split_sections(self, sections: Iterable[Section]) -> Iterator[Tuple[str, int, str]]:
+        """按章节分段，产出（片段, 在全文中的起始偏移, 章节路径）
+
+        全文为各章节以空行连接。片段不跨越章节边界：超过片段上限（chunk_size）的章节在章节内分段
+        （片段间照常重叠）；相邻的短章节在同一上级章节下时合并为一个片段（不超过片段上限，
+        章节路径取公共部分），不再为跨章节的重叠额外生成片段。
+        """
+        chunk_size = self.chunk_size
+        separator_length = self.chunk_length("\n\n")
+        offset = 0
+        # 待合并的短章节：起始偏移、章节路径（拆分后）、文本与总长度
+        pending_start, pending_path, pending_texts, pending_length = 0, [], [], 0
+
+        def flush():
+            merged = "\n\n".join(pending_texts)
+            return merged, pending_start, SECTION_SEPARATOR.join(pending_path)
+
+        for section_path, text in sections:
+            start = offset
+            offset += len(text) + 2
+            path = section_path.split(SECTION_SEPARATOR) if section_path else []
+            length = self.chunk_length(text)
+
+            if pending_texts:
+                common = self._common_prefix(pending_path, path)
+                merged_length = pending_length + separator_length + length
+                if merged_length <= chunk_size and (common or not (pending_path or path)):
+                    pending_texts.append(text)
+                    pending_path, pending_length = common, merged_length
+                    continue
+                yield flush()
+                pending_texts = []
+
+            if length <= chunk_size:
+                pending_start, pending_path = start, path
+                pending_texts, pending_length = [text], length
+                continue
+            chunks = self.text_splitter.split_text(text)
+            for chunk, chunk_start in zip(chunks, self._locate(text, chunks), strict=True):
+                yield chunk, start + chunk_start, section_path
+
+        if pending_texts:
+            yield flush()
+
+    @staticmethod
+    def _common_prefix(first: List[str], second: List[str]) -> List[str]:
+        common = []
+        # 两条章节路径长度可以不同，只比较共同的部分
+        for a, b in zip(first, second, strict=False):
+            if a != b:
+                break
+            common.append(a)
+        return common
+
+    def _extract_docx(self, path: Path) -> List[Section]:
+        """按章节提取 Word 文本（含表格）"""
+        return docx_sections(path)
     
-    def _extract_markdown(self, path: Path) -> str:
-        """提取 Markdown 文本"""
+    def _extract_markdown(self, path: Path) -> List[Section]:
+        """按章节提取 Markdown 文本"""
         with open(path, "r", encoding="utf-8") as file:
-            md_text = file.read()
-        # 转换为纯文本（去除 Markdown 标记）
-        html = markdown.markdown(md_text)
-        # 简单去除 HTML 标签
-        import re
-        text = re.sub(r"<[^>]+>", "", html)
-        return text
+            return markdown_sections(file.read())
     
     def _extract_txt(self, path: Path) -> str:
         """提取 TXT 文本"""
@@ -0,0 +1,221 @@
+"""Embedding 后端模块
+
+通过 Config.EMBEDDING_BACKEND 选择：
+
+- huggingface：sentence-transformers + PyTorch（fp32，默认）
+- onnx：ONNX Runtime 推理导出的模型，可选 int8 动态量化版本，
+  不依赖 PyTorch，CPU 上编码速度更快
+
+ONNX 模型由 ``python scripts/download_model.py --onnx`` 导出。
+
+模型体积较大，VectorStore 通过 LazyEmbeddings 延迟到首次编码时才加载。
+
+TokenCounter 只加载模型的分词器（tokenizer.json），供按 token 分段（TEXT_SPLITTER=tokens）使用；
+embedding_max_seq_length 为模型的最大序列长度，超出部分在编码时被截断。
+"""
+
+import json
+import threading
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+from config import Config
+
+MODEL_NAME = "paraphrase-multilingual-MiniLM-L12-v2"
+HF_MODEL_ID = f"sentence-transformers/{MODEL_NAME}"
+# 模型的最大序列长度（含首尾两个特殊 token），本地模型目录中的 sentence_bert_config.json 优先
+MAX_SEQ_LENGTH = 128
+
+
+def resolve_model_path() -> str:
+    """优先使用本地模型，如果不存在则使用 HuggingFace 模型名"""
+    local_model_path = Config.MODEL_DIR / MODEL_NAME
+    if local_model_path.exists():
+        print(f"✓ 使用本地 Embedding 模型: {local_model_path}")
+        return str(local_model_path)
+
+    print(f"ℹ 本地模型不存在，将从 HuggingFace 下载: {HF_MODEL_ID}")
+    return HF_MODEL_ID
+
+
+def embedding_model_id(backend: str = None) -> str:
+    """模型标识（不加载模型），用于 embedding 缓存键，不同后端 / 精度的向量不会互相混用"""
+    backend = backend or Config.EMBEDDING_BACKEND
+    if backend == "onnx":
+        precision = "int8" if Config.ONNX_QUANTIZED else "fp32"
+        return f"{MODEL_NAME}|onnx-{precision}|normalized"
+    if backend == "huggingface":
+        return f"{MODEL_NAME}|normalized"
+    raise ValueError(f"不支持的 embedding 后端: {backend}")
+
+
+def create_embeddings(backend: str = None) -> Tuple[Embeddings, str]:
+    """按配置创建 embedding 后端，返回（Embeddings 实例, 模型标识）"""
+    backend = backend or Config.EMBEDDING_BACKEND
+    model_id = embedding_model_id(backend)
+
+    if backend == "onnx":
+        embeddings = OnnxEmbeddings(Config.ONNX_MODEL_DIR, quantized=Config.ONNX_QUANTIZED)
+        return embeddings, model_id
+
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    embeddings = HuggingFaceEmbeddings(
+        model_name=resolve_model_path(),
+        model_kwargs={"device": "cpu"},
+        encode_kwargs={"normalize_embeddings": True, "batch_size": Config.EMBED_BATCH_SIZE},
+    )
+    return embeddings, model_id
+
+
+def embedding_max_seq_length(backend: str = None) -> int:
+    """模型编码时的最大序列长度（不加载模型）"""
+    backend = backend or Config.EMBEDDING_BACKEND
+    if backend == "onnx":
+        return MAX_SEQ_LENGTH
+    config_file = Config.MODEL_DIR / MODEL_NAME / "sentence_bert_config.json"
+    try:
+        return int(json.loads(config_file.read_text(encoding="utf-8"))["max_seq_length"])
+    except (OSError, ValueError, KeyError):
+        return MAX_SEQ_LENGTH
+
+
+class TokenCounter:
+    """用 embedding 模型的分词器计数（不含特殊 token，分词器在首次计数时加载，线程安全）"""
+
+    def __init__(self, backend: str = None):
+        self.backend = backend or Config.EMBEDDING_BACKEND
+        self._tokenizer = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        try:
+            from tokenizers import Tokenizer
+        except ImportError as e:
+            raise ImportError("按 token 分段需要 tokenizers，请运行: uv sync") from e
+
+        if self.backend == "onnx":
+            tokenizer = Tokenizer.from_file(str(Config.ONNX_MODEL_DIR / "tokenizer.json"))
+        else:
+            local_file = Config.MODEL_DIR / MODEL_NAME / "tokenizer.json"
+            if local_file.exists():
+                tokenizer = Tokenizer.from_file(str(local_file))
+            else:
+                tokenizer = Tokenizer.from_pretrained(HF_MODEL_ID)
+        # 计数需要完整长度，关闭文件中可能带有的截断与填充设置
+        tokenizer.no_truncation()
+        tokenizer.no_padding()
+        return tokenizer
+
+    @property
+    def tokenizer(self):
+        if self._tokenizer is None:
+            with self._lock:
+                if self._tokenizer is None:
+                    self._tokenizer = self._load()
+        return self._tokenizer
+
+    def lengths(self, texts: List[str]) -> List[int]:
+        """每段文本的 token 数"""
+        if not texts:
+            return []
+        encodings = self.tokenizer.encode_batch(texts, add_special_tokens=False)
+        return [len(encoding.ids) for encoding in encodings]
+
+    def __call__(self, text: str) -> int:
+        return self.lengths([text])[0]
+
+
+class LazyEmbeddings(Embeddings):
+    """首次编码时才创建底层模型的代理（线程安全）"""
+
+    def __init__(self, factory: Callable[[], Embeddings]):
+        self._factory = factory
+        self._instance: Optional[Embeddings] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._instance is not None
+
+    def load(self) -> Embeddings:
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    self._instance = self._factory()
+        return self._instance
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.load().embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.load().embed_query(text)
+
+
+class OnnxEmbeddings(Embeddings):
+    """基于 ONNX Runtime 的句向量编码（mean pooling + L2 归一化）"""
+
+    def __init__(self, model_dir: Path, quantized: bool = True, max_length: int = MAX_SEQ_LENGTH):
+        try:
+            import onnxruntime as ort
+            from tokenizers import Tokenizer
+        except ImportError as e:
+            raise ImportError(
+                "ONNX 后端需要 onnxruntime 与 tokenizers，请运行: uv sync --extra onnx"
+            ) from e
+
+        model_dir = Path(model_dir)
+        model_file = model_dir / ("model_int8.onnx" if quantized else "model.onnx")
+        if not model_file.exists():
+            raise FileNotFoundError(
+                f"ONNX 模型不存在: {model_file}，请先运行 python scripts/download_model.py --onnx"
+            )
+
+        self.tokenizer = Tokenizer.from_file(str(model_dir / "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        # 使用模型自己的 padding token（XLM-R 系为 <pad>）
+        for pad_token in ("<pad>", "[PAD]"):
+            pad_id = self.tokenizer.token_to_id(pad_token)
+            if pad_id is not None:
+                self.tokenizer.enable_padding(pad_id=pad_id, pad_token=pad_token)
+                break
+        else:
+            self.tokenizer.enable_padding()
+
+        options = ort.SessionOptions()
+        if Config.EMBEDDING_THREADS:
+            options.intra_op_num_threads = Config.EMBEDDING_THREADS
+        self.session = ort.InferenceSession(
+            str(model_file), options, providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {item.name for item in self.session.get_inputs()}
+        print(f"✓ 使用 ONNX Embedding 模型: {model_file}")
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = []
+        for start in range(0, len(texts), Config.EMBED_BATCH_SIZE):
+            vectors.extend(self._encode(texts[start:start + Config.EMBED_BATCH_SIZE]))
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode([text])[0]
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        import numpy as np
+
+        if not texts:
+            return []
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self._input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+
+        token_embeddings = self.session.run(None, feeds)[0]
+        mask = attention_mask[..., None].astype(np.float32)
+        pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled.tolist()
@@ -0,0 +1,175 @@
+"""Embedding 缓存模块
+
+按（模型标识, 归一化文本哈希）缓存向量，持久化到本地 SQLite，
+超出容量后按最近最少使用（LRU）淘汰。
+"""
+
+import hashlib
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from pathlib import Path
+from typing import Dict, List
+
+from langchain_core.embeddings import Embeddings
+
+# SQLite 单条语句的参数个数上限较低，批量查询时分块
+_SQL_BATCH = 500
+
+
+def normalize_text(text: str) -> str:
+    """归一化文本（NFKC + 合并空白），仅用于计算缓存键"""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+class CachedEmbeddings(Embeddings):
+    """带持久化缓存的 Embeddings 包装器
+
+    同时拦截 ``embed_documents``（入库）与 ``embed_query``（检索），
+    只对未命中的文本调用底层模型。
+    """
+
+    def __init__(
+        self,
+        base: Embeddings,
+        model_id: str,
+        cache_path: Path,
+        max_entries: int = 100_000,
+    ):
+        self.base = base
+        self.model_id = model_id
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        cache_path = Path(cache_path)
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(cache_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY, vector BLOB NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_embeddings_accessed ON embeddings(accessed)"
+        )
+        self._conn.commit()
+        self._count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    # ================================
+    # Embeddings 接口
+    # ================================
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(texts, kind="doc", compute=self.base.embed_documents)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(
+            [text], kind="query", compute=lambda items: [self.base.embed_query(items[0])]
+        )[0]
+
+    # ================================
+    # 缓存逻辑
+    # ================================
+    def _key(self, text: str, kind: str) -> str:
+        digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+        return f"{self.model_id}|{kind}|{digest}"
+
+    def _embed(self, texts: List[str], kind: str, compute) -> List[List[float]]:
+        if not texts:
+            return []
+
+        keys = [self._key(text, kind) for text in texts]
+        found = self._lookup(keys)
+
+        # 同一批次内的重复文本只计算一次
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts, strict=True):
+            if key not in found and key not in missing:
+                missing[key] = text
+
+        hit_count = sum(1 for key in keys if key in found)
+        self.hits += hit_count
+        self.misses += len(texts) - hit_count
+
+        if missing:
+            vectors = compute(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors, strict=True))
+            self._store(computed)
+            found.update(computed)
+
+        return [list(found[key]) for key in keys]
+
+    def _lookup(self, keys: List[str]) -> Dict[str, List[float]]:
+        unique = list(dict.fromkeys(keys))
+        result: Dict[str, List[float]] = {}
+        with self._lock:
+            for start in range(0, len(unique), _SQL_BATCH):
+                batch = unique[start:start + _SQL_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    result[key] = vector.tolist()
+
+                hit_keys = [row[0] for row in rows]
+                if hit_keys:
+                    self._conn.execute(
+                        f"UPDATE embeddings SET accessed = ? "
+                        f"WHERE key IN ({','.join('?' * len(hit_keys))})",
+                        [time.time(), *hit_keys],
+                    )
+            self._conn.commit()
+        return result
+
+    def _store(self, vectors: Dict[str, List[float]]):
+        now = time.time()
+        rows = [(key, array("f", vector).tobytes(), now) for key, vector in vectors.items()]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, accessed) VALUES (?, ?, ?)",
+                rows,
+            )
+            self._count += len(rows)
+            if self._count > self.max_entries:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """淘汰最久未访问的条目（调用方持有锁）"""
+        self._count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        overflow = self._count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN ("
+                " SELECT key FROM embeddings ORDER BY accessed ASC LIMIT ?)",
+                (overflow,),
+            )
+            self._count -= overflow
+
+    # ================================
+    # 统计与维护
+    # ================================
+    def stats(self) -> dict:
+        """返回命中统计"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": self._count,
+            "max_entries": self.max_entries,
+        }
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+            self._count = 0
@@ -0,0 +1,206 @@
+"""文本提取结果缓存模块
+
+PDF / DOCX / Markdown 的文本提取（尤其是 pypdf）远比分段耗时。调整 CHUNK_SIZE / CHUNK_OVERLAP
+后重新分段、重建索引时，同一文件直接复用上次的提取结果，完全跳过解析：
+
+- 键：（绝对路径, 文件大小, 修改时间, 内容 SHA-256, 提取器版本）的哈希，任一变化都视为未命中；
+  提取逻辑变化时提高 DocumentProcessor.EXTRACTOR_VERSIONS 中对应格式的版本号即可让旧条目失效
+- 值：PDF 为按页的（页码, 文本），DOCX / Markdown 为按章节的（章节路径, 文本），
+  每项一行 JSON，整体 zlib 压缩；
+  每个条目一个文件，边提取边压缩写入临时文件，完成后原子替换，
+  批量入库的多个解析进程可以同时读写
+- 清理：prune() 先删除超过 max_age 秒未使用的条目，再按最近使用时间淘汰到 max_bytes 以内；
+  写入进程中途被杀时遗留的临时文件同样计入总大小，超过一小时（或 max_age）未更新即删除；
+  写入时顺带执行（每个进程最多每分钟一次）
+"""
+
+import hashlib
+import json
+import os
+import time
+import zlib
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple, Union
+
+from ingest_manifest import file_sha256
+
+# 提取结果的一项：PDF 为（页码, 文本），页码从 1 开始；DOCX / Markdown 为（章节路径, 文本）
+Page = Tuple[Union[int, str], str]
+
+_SUFFIX = ".jsonl.z"
+_TEMP_SUFFIX = ".tmp"
+# 临时文件超过该时间（秒）未更新，视为写入进程已退出后遗留
+_TEMP_MAX_AGE = 3600.0
+# 写入时顺带清理的最小间隔（秒）
+_PRUNE_INTERVAL = 60.0
+
+
+class _EntryWriter:
+    """增量写入一个缓存条目：正常结束时原子替换，出错或中途放弃时删除临时文件"""
+
+    def __init__(self, cache: "ExtractionCache", key: str):
+        self._cache = cache
+        self._final = cache.entry_path(key)
+        self._final.parent.mkdir(parents=True, exist_ok=True)
+        self._temp = self._final.with_name(f".{key}.{os.getpid()}{_TEMP_SUFFIX}")
+        self._file = open(self._temp, "wb")
+        self._compressor = zlib.compressobj(cache.level)
+
+    def add(self, page: Union[int, str], text: str):
+        line = json.dumps([page, text], ensure_ascii=False).encode("utf-8") + b"\n"
+        self._file.write(self._compressor.compress(line))
+
+    def __enter__(self) -> "_EntryWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self._file.write(self._compressor.flush())
+            self._file.close()
+            if exc_type is None:
+                os.replace(self._temp, self._final)
+                self._cache.writes += 1
+                self._cache.maybe_prune()
+        finally:
+            if self._temp.exists():
+                self._temp.unlink()
+        return False
+
+
+class ExtractionCache:
+    """按文件指纹缓存提取出的文本（跨进程安全，无需加锁）"""
+
+    def __init__(
+        self,
+        root: Path,
+        max_bytes: int = 1 << 30,
+        max_age: float = 30 * 86400,
+        level: int = 6,
+    ):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.level = level
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.pruned = 0
+        self._next_prune = 0.0
+
+    # ================================
+    # 读写
+    # ================================
+    @staticmethod
+    def key(path: Path, extractor: str, file_hash: Optional[str] = None) -> str:
+        """文件指纹：路径、大小、修改时间、内容哈希与提取器版本（file_hash 缺省时现算）"""
+        path = Path(path).resolve()
+        stat = path.stat()
+        file_hash = file_hash or file_sha256(path)
+        fingerprint = f"{path}\0{stat.st_size}\0{stat.st_mtime_ns}\0{file_hash}\0{extractor}"
+        return hashlib.blake2b(fingerprint.encode("utf-8"), digest_size=20).hexdigest()
+
+    def entry_path(self, key: str) -> Path:
+        # 按键的前两位分目录，避免单个目录下文件过多
+        return self.root / key[:2] / f"{key}{_SUFFIX}"
+
+    def get(self, key: str) -> Optional[List[Page]]:
+        """返回缓存的提取结果，未命中或条目损坏时返回 None"""
+        path = self.entry_path(key)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        try:
+            lines = zlib.decompress(data).decode("utf-8").splitlines()
+            pages = [tuple(json.loads(line)) for line in lines]
+        except (zlib.error, UnicodeDecodeError, ValueError):
+            path.unlink(missing_ok=True)
+            self.misses += 1
+            return None
+        # 修改时间记录最近使用，清理时按它淘汰
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return pages
+
+    def writer(self, key: str) -> _EntryWriter:
+        """逐项写入条目（with 语句正常结束时生效）"""
+        return _EntryWriter(self, key)
+
+    def put(self, key: str, pages: Iterable[Page]):
+        with self.writer(key) as writer:
+            for page, text in pages:
+                writer.add(page, text)
+
+    # ================================
+    # 清理
+    # ================================
+    def _entries(self, pattern: str = f"*/*{_SUFFIX}") -> List[Tuple[float, int, Path]]:
+        """所有条目的（最近使用时间, 大小, 路径）"""
+        entries = []
+        if not self.root.is_dir():
+            return entries
+        for path in self.root.glob(pattern):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def prune(self) -> int:
+        """删除过期条目与遗留的临时文件，并按最近使用时间淘汰到 max_bytes 以内，返回删除的文件数"""
+        now = time.time()
+        entries = sorted(self._entries())
+        temps = self._entries(f"*/.*{_TEMP_SUFFIX}")
+        deadline = now - self.max_age if self.max_age > 0 else None
+        temp_max_age = min(_TEMP_MAX_AGE, self.max_age) if self.max_age > 0 else _TEMP_MAX_AGE
+        temp_deadline = now - temp_max_age
+        # 仍在写入的临时文件计入总大小，但不删除（写入进程完成后会替换为正式条目）
+        total = sum(size for _, size, _ in entries) + sum(size for _, size, _ in temps)
+        removed = 0
+        for modified, size, path in temps:
+            if modified < temp_deadline:
+                path.unlink(missing_ok=True)
+                total -= size
+                removed += 1
+        for accessed, size, path in entries:
+            expired = deadline is not None and accessed < deadline
+            if not expired and (self.max_bytes <= 0 or total <= self.max_bytes):
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        self.pruned += removed
+        return removed
+
+    def maybe_prune(self):
+        now = time.monotonic()
+        if now < self._next_prune:
+            return
+        self._next_prune = now + _PRUNE_INTERVAL
+        self.prune()
+
+    def clear(self) -> int:
+        entries = self._entries()
+        for _, _, path in entries:
+            path.unlink(missing_ok=True)
+        return len(entries)
+
+    def stats(self) -> dict:
+        entries = self._entries()
+        total = self.hits + self.misses
+        return {
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "writes": self.writes,
+            "pruned": self.pruned,
+        }
@@ -0,0 +1,91 @@
+"""入库清单模块
+
+记录每个来源文件的内容哈希与其片段 ID，用于增量、去重的重新入库：
+片段 ID 由来源路径 + 片段内容确定性生成，重复上传同一文件不会产生重复条目。
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+
+def file_sha256(path: Path, block_size: int = 1 << 20) -> str:
+    """流式计算文件内容哈希"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def source_key(metadata: dict) -> str:
+    """片段所属来源文件的唯一标识（优先使用完整路径）"""
+    return metadata.get("source_path") or metadata.get("source", "")
+
+
+def make_chunk_ids(source: str, texts: Iterable[str]) -> List[str]:
+    """根据来源与片段内容生成确定性 ID
+
+    同一文件中内容相同的片段按出现次序区分，避免 ID 冲突。
+    """
+    seen: Dict[str, int] = {}
+    ids = []
+    for text in texts:
+        occurrence = seen.get(text, 0)
+        seen[text] = occurrence + 1
+        raw = f"{source}\x00{occurrence}\x00{text}".encode("utf-8")
+        ids.append(hashlib.sha256(raw).hexdigest()[:32])
+    return ids
+
+
+class IngestManifest:
+    """来源文件 → 片段 ID 的持久化清单（JSON）"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._sources: Dict[str, dict] = {}
+        if self.path.exists():
+            try:
+                self._sources = json.loads(self.path.read_text(encoding="utf-8"))
+            except (OSError, ValueError) as e:
+                print(f"⚠ 入库清单损坏，已忽略: {e}")
+
+    def file_hash(self, source: str) -> Optional[str]:
+        entry = self._sources.get(source)
+        return entry.get("file_hash") if entry else None
+
+    def chunk_ids(self, source: str) -> List[str]:
+        entry = self._sources.get(source)
+        return list(entry["chunk_ids"]) if entry else []
+
+    def sources(self) -> List[str]:
+        return list(self._sources)
+
+    def to_dict(self) -> Dict[str, dict]:
+        """来源 → {file_hash, chunk_ids}（副本，用于快照）"""
+        return {source: dict(entry) for source, entry in self._sources.items()}
+
+    def diff(self, source: str, ids: List[str]) -> Tuple[Set[str], Set[str]]:
+        """对比新旧片段，返回（新增 ID，已消失 ID）"""
+        previous = set(self.chunk_ids(source))
+        current = set(ids)
+        return current - previous, previous - current
+
+    def update(self, source: str, ids: List[str], file_hash: Optional[str] = None):
+        self._sources[source] = {"file_hash": file_hash, "chunk_ids": list(ids)}
+
+    def remove(self, source: str):
+        self._sources.pop(source, None)
+
+    def clear(self):
+        self._sources = {}
+        self.save()
+
+    def save(self):
+        """原子写入，避免中断时留下半截文件"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(self._sources, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,177 @@
+"""词法倒排索引模块
+
+为向量检索补充精确匹配能力（产品代码、专业术语等），
+持久化到本地 SQLite，随入库增量更新，按 BM25 打分。
+
+中文分词：安装了 jieba 时使用搜索引擎模式分词，否则退化为汉字二元组（bigram）。
+"""
+
+import math
+import re
+import sqlite3
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Iterable, List, Tuple
+
+try:
+    import jieba
+
+    jieba.setLogLevel(60)
+except ImportError:  # 可选依赖
+    jieba = None
+
+# 英文 / 数字词（保留产品代码中的连字符、下划线、小数点，如 AX-100、v2.1）
+_WORD_RE = re.compile(r"[a-z0-9]+(?:[-_.][a-z0-9]+)*")
+# 连续的 CJK 字符
+_CJK_RE = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+")
+
+_SQL_BATCH = 500
+
+
+def tokenize(text: str) -> List[str]:
+    """中英文混合分词"""
+    text = text.lower()
+    tokens = _WORD_RE.findall(text)
+    for run in _CJK_RE.findall(text):
+        if jieba is not None:
+            tokens.extend(word for word in jieba.lcut_for_search(run) if word.strip())
+        elif len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+class LexicalIndex:
+    """基于 SQLite 的持久化 BM25 倒排索引"""
+
+    def __init__(self, path: Path, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS docs (doc_id TEXT PRIMARY KEY, length INTEGER NOT NULL);
+            CREATE TABLE IF NOT EXISTS postings (
+                term TEXT NOT NULL, doc_id TEXT NOT NULL, tf INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_postings_term ON postings(term);
+            CREATE INDEX IF NOT EXISTS idx_postings_doc ON postings(doc_id);
+            CREATE TABLE IF NOT EXISTS stats (
+                id INTEGER PRIMARY KEY CHECK (id = 0),
+                doc_count INTEGER NOT NULL,
+                total_length INTEGER NOT NULL
+            );
+            INSERT OR IGNORE INTO stats (id, doc_count, total_length) VALUES (0, 0, 0);
+            """
+        )
+        self._conn.commit()
+
+    # ================================
+    # 写入
+    # ================================
+    def add(self, ids: List[str], texts: List[str]):
+        """添加（或覆盖）文档"""
+        if not ids:
+            return
+        docs = dict(zip(ids, texts, strict=True))
+        with self._lock:
+            self._delete_locked(list(docs))
+            doc_rows, posting_rows, total_length = [], [], 0
+            for doc_id, text in docs.items():
+                counts = Counter(tokenize(text))
+                length = sum(counts.values())
+                total_length += length
+                doc_rows.append((doc_id, length))
+                posting_rows.extend((term, doc_id, tf) for term, tf in counts.items())
+
+            self._conn.executemany("INSERT INTO docs (doc_id, length) VALUES (?, ?)", doc_rows)
+            self._conn.executemany(
+                "INSERT INTO postings (term, doc_id, tf) VALUES (?, ?, ?)", posting_rows
+            )
+            self._conn.execute(
+                "UPDATE stats SET doc_count = doc_count + ?, total_length = total_length + ?",
+                (len(doc_rows), total_length),
+            )
+            self._conn.commit()
+
+    def delete(self, ids: Iterable[str]):
+        ids = list(ids)
+        if not ids:
+            return
+        with self._lock:
+            self._delete_locked(ids)
+            self._conn.commit()
+
+    def _delete_locked(self, ids: List[str]):
+        for start in range(0, len(ids), _SQL_BATCH):
+            batch = ids[start:start + _SQL_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            count, length = self._conn.execute(
+                f"SELECT COUNT(*), COALESCE(SUM(length), 0) FROM docs "
+                f"WHERE doc_id IN ({placeholders})",
+                batch,
+            ).fetchone()
+            if not count:
+                continue
+            self._conn.execute(f"DELETE FROM docs WHERE doc_id IN ({placeholders})", batch)
+            self._conn.execute(f"DELETE FROM postings WHERE doc_id IN ({placeholders})", batch)
+            self._conn.execute(
+                "UPDATE stats SET doc_count = doc_count - ?, total_length = total_length - ?",
+                (count, length),
+            )
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM docs")
+            self._conn.execute("DELETE FROM postings")
+            self._conn.execute("UPDATE stats SET doc_count = 0, total_length = 0")
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # ================================
+    # 检索
+    # ================================
+    def count(self) -> int:
+        return self._conn.execute("SELECT doc_count FROM stats").fetchone()[0]
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[str, float]]:
+        """BM25 检索，返回 [(doc_id, score)]，按得分降序"""
+        terms = Counter(tokenize(query))
+        if not terms:
+            return []
+
+        with self._lock:
+            doc_count, total_length = self._conn.execute(
+                "SELECT doc_count, total_length FROM stats"
+            ).fetchone()
+            if not doc_count:
+                return []
+            avg_length = total_length / doc_count or 1.0
+
+            scores: Counter = Counter()
+            for term, query_tf in terms.items():
+                rows = self._conn.execute(
+                    "SELECT p.doc_id, p.tf, d.length FROM postings p "
+                    "JOIN docs d ON d.doc_id = p.doc_id WHERE p.term = ?",
+                    (term,),
+                ).fetchall()
+                if not rows:
+                    continue
+                df = len(rows)
+                idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+                for doc_id, tf, length in rows:
+                    norm = self.k1 * (1 - self.b + self.b * length / avg_length)
+                    scores[doc_id] += query_tf * idf * tf * (self.k1 + 1) / (tf + norm)
+
+        return scores.most_common(k)
@@ -0,0 +1,327 @@
+"""Ollama 连接池模块
+
+在一个或多个 Ollama 实例之间分发 LLM 请求：
+
+- 每个后端一个 ChatOllama 客户端，各自持有 httpx 连接池（keep-alive 复用连接）
+- 按在途请求数最少选择后端，并列时轮流
+- 每个后端限制并发数；全部满载时请求进入有界队列，有后端空闲时按先后顺序交接
+- 队列已满或排队超时立即抛出 LLMBusyError（HTTP 服务返回 503），而不是堆积到请求超时
+- 连接失败的后端暂停调度一段时间，未产出内容的请求转到其他后端重试
+
+提供与 ChatOllama 相同的 invoke / ainvoke / stream / astream 接口，直接作为 ChatAgent.llm 使用。
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Deque, Iterator, List, Optional, Sequence
+
+import httpx
+from langchain_ollama import ChatOllama
+
+from metrics import metrics
+
+
+class LLMBusyError(RuntimeError):
+    """所有后端都已满载，且排队已满或等待超时"""
+
+
+def is_connection_error(error: BaseException) -> bool:
+    """是否为连不上后端（可以换一个后端重试）的错误"""
+    return isinstance(error, (ConnectionError, httpx.ConnectError, httpx.ConnectTimeout))
+
+
+def create_ollama_client(base_url: str, max_concurrency: int, **llm_kwargs) -> ChatOllama:
+    """创建单个后端的客户端，连接池大小与并发上限一致"""
+    limits = httpx.Limits(
+        max_connections=max_concurrency, max_keepalive_connections=max_concurrency
+    )
+    return ChatOllama(base_url=base_url, client_kwargs={"limits": limits}, **llm_kwargs)
+
+
+@dataclass
+class Backend:
+    """一个 Ollama 实例及其调度状态"""
+    index: int
+    url: str
+    client: Any
+    max_concurrency: int
+    in_flight: int = 0
+    requests: int = 0
+    failures: int = 0
+    unavailable_until: float = 0.0
+
+    def available(self, now: float) -> bool:
+        return now >= self.unavailable_until
+
+
+class _Waiter:
+    """排队中的请求：后端空闲时由释放方直接把槽位交给它（同步请求用 Event，异步请求用 Future）"""
+
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.loop = loop
+        self.backend: Optional[Backend] = None
+        self.event = threading.Event()
+        self.future = loop.create_future() if loop is not None else None
+
+    def wake(self, backend: Backend) -> bool:
+        self.backend = backend
+        if self.loop is None:
+            self.event.set()
+            return True
+        try:
+            self.loop.call_soon_threadsafe(self._resolve)
+        except RuntimeError:
+            # 事件循环已关闭，等待方不存在了
+            self.backend = None
+            return False
+        return True
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class OllamaPool:
+    """多后端 Ollama 客户端（线程安全，同步 / 异步调用共用同一套槽位与队列）"""
+
+    def __init__(
+        self,
+        base_urls: Sequence[str],
+        max_concurrency: int = 2,
+        queue_size: int = 16,
+        queue_timeout: float = 30.0,
+        failure_cooldown: float = 10.0,
+        client_factory: Optional[Callable[[str], Any]] = None,
+        **llm_kwargs,
+    ):
+        if not base_urls:
+            raise ValueError("至少需要配置一个 Ollama 地址")
+        if client_factory is None:
+            def client_factory(url: str) -> ChatOllama:
+                return create_ollama_client(url, max_concurrency, **llm_kwargs)
+
+        self.backends: List[Backend] = [
+            Backend(index=idx, url=url, client=client_factory(url), max_concurrency=max_concurrency)
+            for idx, url in enumerate(base_urls)
+        ]
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.failure_cooldown = failure_cooldown
+
+        self._lock = threading.Lock()
+        self._waiters: Deque[_Waiter] = deque()
+        self._next = 0
+        self.queued = 0
+        self.rejected = 0
+
+    # ================================
+    # 对外接口（与 ChatOllama 一致）
+    # ================================
+    def invoke(self, messages, **kwargs):
+        for attempt in range(len(self.backends)):
+            backend = self._acquire()
+            try:
+                result = backend.client.invoke(messages, **kwargs)
+            except Exception as e:
+                self._release(backend, e)
+                if is_connection_error(e) and attempt + 1 < len(self.backends):
+                    continue
+                raise
+            self._release(backend)
+            return result
+
+    async def ainvoke(self, messages, **kwargs):
+        for attempt in range(len(self.backends)):
+            backend = await self._aacquire()
+            try:
+                result = await backend.client.ainvoke(messages, **kwargs)
+            except Exception as e:
+                self._release(backend, e)
+                if is_connection_error(e) and attempt + 1 < len(self.backends):
+                    continue
+                raise
+            self._release(backend)
+            return result
+
+    def stream(self, messages, **kwargs) -> Iterator:
+        for attempt in range(len(self.backends)):
+            backend = self._acquire()
+            started = False
+            error: Optional[BaseException] = None
+            try:
+                for chunk in backend.client.stream(messages, **kwargs):
+                    started = True
+                    yield chunk
+            except Exception as e:
+                error = e
+                # 已经输出过内容时不能换后端重来
+                if not started and is_connection_error(e) and attempt + 1 < len(self.backends):
+                    continue
+                raise
+            finally:
+                self._release(backend, error)
+            return
+
+    async def astream(self, messages, **kwargs) -> AsyncIterator:
+        for attempt in range(len(self.backends)):
+            backend = await self._aacquire()
+            started = False
+            error: Optional[BaseException] = None
+            try:
+                async for chunk in backend.client.astream(messages, **kwargs):
+                    started = True
+                    yield chunk
+            except Exception as e:
+                error = e
+                if not started and is_connection_error(e) and attempt + 1 < len(self.backends):
+                    continue
+                raise
+            finally:
+                self._release(backend, error)
+            return
+
+    def saturated(self) -> bool:
+        """所有后端满载且队列已满（新请求会被立即拒绝）"""
+        with self._lock:
+            return (
+                all(b.in_flight >= b.max_concurrency for b in self.backends)
+                and len(self._waiters) >= self.queue_size
+            )
+
+    def stats(self) -> dict:
+        """返回各后端负载与排队统计"""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "backends": [
+                    {
+                        "url": b.url,
+                        "in_flight": b.in_flight,
+                        "max_concurrency": b.max_concurrency,
+                        "requests": b.requests,
+                        "failures": b.failures,
+                        "available": b.available(now),
+                    }
+                    for b in self.backends
+                ],
+                "waiting": len(self._waiters),
+                "queue_size": self.queue_size,
+                "queued": self.queued,
+                "rejected": self.rejected,
+            }
+
+    # ================================
+    # 槽位分配
+    # ================================
+    def _pick_locked(self) -> Optional[Backend]:
+        """选择在途请求最少的空闲后端（调用方持有锁）"""
+        now = time.monotonic()
+        free = [b for b in self.backends if b.in_flight < b.max_concurrency]
+        candidates = [b for b in free if b.available(now)]
+        if not candidates and not any(b.available(now) for b in self.backends):
+            # 所有后端都在冷却期：仍然尝试（相当于探活），避免整个服务不可用
+            candidates = free
+        if not candidates:
+            return None
+
+        count = len(self.backends)
+        backend = min(
+            candidates, key=lambda b: (b.in_flight, (b.index - self._next) % count)
+        )
+        self._next = (backend.index + 1) % count
+        backend.in_flight += 1
+        backend.requests += 1
+        return backend
+
+    def _enqueue_locked(self, loop: Optional[asyncio.AbstractEventLoop] = None) -> _Waiter:
+        if len(self._waiters) >= self.queue_size:
+            self._reject()
+            raise LLMBusyError(
+                f"LLM 服务繁忙：{len(self.backends)} 个后端均已满载，排队请求已达上限 {self.queue_size}"
+            )
+        waiter = _Waiter(loop)
+        self._waiters.append(waiter)
+        self.queued += 1
+        return waiter
+
+    def _abandon(self, waiter: _Waiter) -> Backend:
+        """排队超时：若槽位恰好已交接则照常使用，否则退出队列并报繁忙"""
+        with self._lock:
+            if waiter.backend is not None:
+                return waiter.backend
+            self._waiters.remove(waiter)
+            self._reject()
+        raise LLMBusyError(f"LLM 服务繁忙：排队等待超过 {self.queue_timeout:g} 秒")
+
+    def _reject(self):
+        self.rejected += 1
+        metrics.inc("rag_llm_requests_total", backend="none", status="busy")
+
+    def _acquire(self) -> Backend:
+        started = time.perf_counter()
+        with self._lock:
+            backend = self._pick_locked()
+            waiter = self._enqueue_locked() if backend is None else None
+
+        if waiter is not None:
+            if waiter.event.wait(self.queue_timeout):
+                backend = waiter.backend
+            else:
+                backend = self._abandon(waiter)
+        metrics.record_stage("llm_queue", time.perf_counter() - started)
+        return backend
+
+    async def _aacquire(self) -> Backend:
+        started = time.perf_counter()
+        with self._lock:
+            backend = self._pick_locked()
+            waiter = (
+                self._enqueue_locked(asyncio.get_running_loop()) if backend is None else None
+            )
+
+        if waiter is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter.future), self.queue_timeout)
+                backend = waiter.backend
+            except asyncio.TimeoutError:
+                backend = self._abandon(waiter)
+            except asyncio.CancelledError:
+                with self._lock:
+                    handed = waiter.backend
+                    if handed is None:
+                        self._waiters.remove(waiter)
+                if handed is not None:
+                    self._release(handed)
+                raise
+        metrics.record_stage("llm_queue", time.perf_counter() - started)
+        return backend
+
+    def _release(self, backend: Backend, error: Optional[BaseException] = None):
+        """归还槽位，并把空出的槽位交给排在最前的等待者"""
+        if error is None:
+            status = "ok"
+        elif is_connection_error(error):
+            status = "unavailable"
+        else:
+            status = "error"
+        metrics.inc("rag_llm_requests_total", backend=backend.url, status=status)
+
+        with self._lock:
+            backend.in_flight -= 1
+            if status == "unavailable":
+                backend.failures += 1
+                backend.unavailable_until = time.monotonic() + self.failure_cooldown
+            elif status == "ok":
+                backend.unavailable_until = 0.0
+
+            while self._waiters:
+                next_backend = self._pick_locked()
+                if next_backend is None:
+                    break
+                waiter = self._waiters.popleft()
+                if not waiter.wake(next_backend):
+                    next_backend.in_flight -= 1
+                    next_backend.requests -= 1
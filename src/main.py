@@ -1,12 +1,120 @@
-"""主程序入口"""
+"""主程序入口
 
-import sys
-from pathlib import Path
+启动时只导入轻量模块：文档解析器、向量库（embedding 模型 + Chroma）与对话代理
+在首次使用时才初始化，并由后台线程提前预热（Config.STARTUP_WARMUP），
+help / clear / upload 等命令无需等待模型加载。
 
-from config import Config
-from document_processor import DocumentProcessor
-from vector_store import VectorStore
-from chat_agent import ChatAgent
+    python src/main.py --profile-startup   # 打印各模块导入与组件初始化耗时
+"""
+
+import time
+
+_PROCESS_STARTED = time.perf_counter()
+
+import sys  # noqa: E402
+import threading  # noqa: E402
+from pathlib import Path  # noqa: E402
+
+from config import Config  # noqa: E402
+from ingest_manifest import file_sha256  # noqa: E402
+from bulk_ingest import ingest_directory  # noqa: E402
+from metrics import metrics  # noqa: E402
+
+
+class Components:
+    """按需初始化的重量级组件（线程安全，可在后台线程中预热）"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._doc_processor = None
+        self._vector_store = None
+        self._chat_agent = None
+        # 当前租户（tenant 命令切换），上传、入库、集合版本命令与对话都只作用于该租户
+        self.tenant = None
+
+    @property
+    def doc_processor(self):
+        with self._lock:
+            if self._doc_processor is None:
+                from document_processor import DocumentProcessor
+
+                self._doc_processor = DocumentProcessor()
+            return self._doc_processor
+
+    @property
+    def vector_store(self):
+        with self._lock:
+            if self._vector_store is None:
+                from vector_store import VectorStore
+
+                self._vector_store = VectorStore()
+            return self._vector_store
+
+    @property
+    def tenant_store(self):
+        """当前租户的向量库"""
+        return self.vector_store.for_tenant(self.tenant)
+
+    @property
+    def chat_agent(self):
+        with self._lock:
+            if self._chat_agent is None:
+                from chat_agent import ChatAgent
+
+                self._chat_agent = ChatAgent(self.vector_store)
+            return self._chat_agent
+
+    def warm_up(self):
+        """加载 embedding 模型（及重排序模型）、打开向量库并创建对话代理"""
+        chat_agent = self.chat_agent
+        self.vector_store.warm_up()
+        if chat_agent.reranker is not None:
+            chat_agent.reranker.load()
+
+    def start_warm_up(self) -> threading.Thread:
+        """在后台线程中预热；失败时只提示，首次使用时会重新尝试"""
+        def run():
+            try:
+                self.warm_up()
+            except Exception as e:
+                print(f"\n⚠ 后台预热失败（首次使用时重试）: {e}")
+
+        thread = threading.Thread(target=run, name="warm-up", daemon=True)
+        thread.start()
+        return thread
+
+
+def profile_startup():
+    """逐项测量模块导入与组件初始化耗时"""
+    import importlib
+
+    startup = time.perf_counter() - _PROCESS_STARTED
+    timings = [("导入 main 及轻量模块", startup)]
+
+    def step(name, func):
+        started = time.perf_counter()
+        try:
+            func()
+        except Exception as e:
+            print(f"⚠ {name}失败: {e}")
+        timings.append((name, time.perf_counter() - started))
+
+    # 模块之间共享依赖，耗时为在前一步基础上的增量
+    for module in ("document_processor", "vector_store", "langchain_chroma", "chat_agent"):
+        step(f"导入 {module}", lambda module=module: importlib.import_module(module))
+
+    components = Components()
+    step("创建 DocumentProcessor", lambda: components.doc_processor)
+    step("创建 VectorStore（延迟加载）", lambda: components.vector_store)
+    step("打开向量库", lambda: components.vector_store.vectorstore)
+    step("加载 embedding 模型", components.vector_store.warm_up)
+    step("创建 ChatAgent", lambda: components.chat_agent)
+
+    print("\n启动耗时分析:")
+    for name, seconds in timings:
+        print(f"  {name:<28}{seconds * 1000:>10.1f} ms")
+    print(f"  {'合计':<28}{sum(s for _, s in timings) * 1000:>10.1f} ms")
+    print(f"\n命令提示符就绪耗时（不含解释器启动）: {startup * 1000:.1f} ms")
 
 
 def print_banner():
@@ -22,28 +130,181 @@ def print_help():
     """打印帮助信息"""
     print("\n可用命令:")
     print("  upload <文件路径>  - 上传并处理文档")
-    print("  clear             - 清空向量库")
+    print("  ingest [目录]      - 并行批量入库目录（默认当前租户的上传目录）")
+    print("  reindex [目录]     - 在新版本中重建索引，完成后切换（检索不中断）")
+    print("  clear             - 清空向量库（切换到空版本，可回滚）")
+    print("  rollback          - 切回上一个集合版本")
+    print("  versions          - 查看集合版本")
+    print("  snapshot <文件>    - 导出当前版本快照")
+    print("  restore <文件>     - 从快照恢复到新版本并切换")
+    print("  tenant [名称]      - 切换租户（不带名称时回到默认租户）")
     print("  history           - 清空对话历史")
+    print("  stats             - 显示缓存与各阶段耗时统计")
     print("  help              - 显示帮助")
     print("  exit/quit         - 退出程序")
     print("\n直接输入问题开始对话\n")
 
 
+def print_latency(snapshot: dict):
+    """打印各阶段耗时与生成速度"""
+    if not snapshot["stages_ms"]:
+        print("ℹ 暂无耗时统计")
+        return
+    print("\n阶段耗时（毫秒）:")
+    print(f"  {'阶段':<16}{'次数':>8}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for stage, summary in snapshot["stages_ms"].items():
+        print(
+            f"  {stage:<16}{summary['count']:>8}{summary['p50']:>10.1f}"
+            f"{summary['p95']:>10.1f}{summary['p99']:>10.1f}"
+        )
+    rate = snapshot["tokens_per_second"]
+    if rate:
+        print(f"生成速度: p50 {rate['p50']:.1f} token/秒（共 {rate['count']} 次生成）")
+
+
+def run_ingest(argv):
+    """非交互批量入库：python src/main.py ingest [目录] [--workers N] [--tenant 租户]"""
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="main.py ingest", description="批量入库目录下的文档")
+    parser.add_argument("root", nargs="?", default=None, help="文档目录（默认租户的上传目录）")
+    parser.add_argument("--workers", type=int, default=None, help="解析进程数")
+    parser.add_argument("--tenant", default=None, help="租户（默认不区分租户）")
+    args = parser.parse_args(argv)
+
+    from vector_store import VectorStore
+
+    try:
+        vector_store = VectorStore(tenant=args.tenant)
+    except ValueError as e:
+        print(f"✗ {e}")
+        sys.exit(1)
+    root = args.root or str(Config.upload_dir(vector_store.tenant))
+    ingest_directory(vector_store, root, workers=args.workers)
+
+
+def reindex(vector_store, root=None, workers=None) -> dict:
+    """在新的集合版本中全量入库目录，完成后切换为生效版本"""
+    root = root or str(Config.upload_dir(vector_store.tenant))
+    return vector_store.rebuild(lambda staging: ingest_directory(staging, root, workers=workers))
+
+
+def print_versions(vector_store):
+    active = vector_store.registry.active()
+    print("\n集合版本:")
+    for version in vector_store.registry.versions():
+        marker = "*" if version["name"] == active else " "
+        created = version.get("created_at")
+        created = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(created)) if created else "-"
+        print(f"  {marker} {version['name']:40s} {version['status']:8s} {created}")
+
+
+def run_collection_command(argv):
+    """非交互的集合版本命令（适合定时任务）：
+
+    python src/main.py reindex [目录] [--workers N]
+    python src/main.py snapshot <文件> | restore <文件> [--force] | rollback | versions
+
+    各命令都可加 --tenant 租户，只作用于该租户的集合。
+    """
+    import argparse
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--tenant", default=None, help="租户（默认不区分租户）")
+    parser = argparse.ArgumentParser(prog="main.py", description="集合版本与快照")
+    commands = parser.add_subparsers(dest="command", required=True)
+    reindex_parser = commands.add_parser(
+        "reindex", parents=[common], help="在新版本中重建索引并切换"
+    )
+    reindex_parser.add_argument("root", nargs="?", default=None, help="文档目录（默认租户的上传目录）")
+    reindex_parser.add_argument("--workers", type=int, default=None, help="解析进程数")
+    commands.add_parser("snapshot", parents=[common], help="导出当前版本快照").add_argument("path")
+    restore_parser = commands.add_parser(
+        "restore", parents=[common], help="从快照恢复到新版本并切换"
+    )
+    restore_parser.add_argument("path")
+    restore_parser.add_argument("--force", action="store_true", help="跳过 embedding 模型一致性检查")
+    commands.add_parser("rollback", parents=[common], help="切回上一个集合版本")
+    commands.add_parser("versions", parents=[common], help="查看集合版本")
+    args = parser.parse_args(argv)
+
+    from vector_store import VectorStore
+
+    try:
+        vector_store = VectorStore(tenant=args.tenant)
+        if args.command == "reindex":
+            reindex(vector_store, args.root, workers=args.workers)
+        elif args.command == "snapshot":
+            vector_store.snapshot(args.path)
+        elif args.command == "restore":
+            vector_store.restore(args.path, force=args.force)
+        elif args.command == "rollback":
+            print(f"✓ 已回滚到集合版本 {vector_store.rollback()}")
+        else:
+            print_versions(vector_store)
+    except ValueError as e:
+        print(f"✗ {e}")
+        sys.exit(1)
+
+
+COLLECTION_COMMANDS = ("reindex", "snapshot", "restore", "rollback", "versions")
+
+
+def run_cache_command(argv):
+    """文本提取缓存管理：python src/main.py extraction-cache [stats|prune|clear]"""
+    import argparse
+
+    from extraction_cache import ExtractionCache
+
+    parser = argparse.ArgumentParser(prog="main.py extraction-cache", description="文本提取缓存")
+    parser.add_argument("action", nargs="?", choices=["stats", "prune", "clear"], default="stats")
+    args = parser.parse_args(argv)
+
+    cache = ExtractionCache(
+        Config.EXTRACTION_CACHE_DIR,
+        max_bytes=Config.EXTRACTION_CACHE_MAX_MB * 1024 * 1024,
+        max_age=Config.EXTRACTION_CACHE_MAX_AGE_DAYS * 86400,
+    )
+    if args.action == "prune":
+        print(f"✓ 已清理 {cache.prune()} 个提取缓存条目")
+    elif args.action == "clear":
+        print(f"✓ 已删除 {cache.clear()} 个提取缓存条目")
+    stats = cache.stats()
+    print(
+        f"提取缓存: {stats['entries']} 个条目，{stats['bytes'] / 1024 / 1024:.1f} MB"
+        f" / {Config.EXTRACTION_CACHE_MAX_MB} MB（{Config.EXTRACTION_CACHE_DIR}）"
+    )
+
+
 def main():
     """主函数"""
     # 初始化配置
     Config.ensure_directories()
+
+    if len(sys.argv) > 1 and sys.argv[1] == "ingest":
+        run_ingest(sys.argv[2:])
+        return
+    if len(sys.argv) > 1 and sys.argv[1] in COLLECTION_COMMANDS:
+        run_collection_command(sys.argv[1:])
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == "extraction-cache":
+        run_cache_command(sys.argv[2:])
+        return
+
+    if "--profile-startup" in sys.argv:
+        profile_startup()
+        return
+
     Config.setup_langsmith()
     
     print_banner()
-    print("正在初始化系统...")
     
-    # 初始化组件
-    doc_processor = DocumentProcessor()
-    vector_store = VectorStore()
-    chat_agent = ChatAgent(vector_store)
+    # 重量级组件按需初始化，后台预热使首次提问无需等待模型加载
+    components = Components()
+    if Config.STARTUP_WARMUP:
+        components.start_warm_up()
     
-    print("✓ 系统初始化完成\n")
+    print(f"✓ 系统就绪（{(time.perf_counter() - _PROCESS_STARTED) * 1000:.0f} ms）\n")
     print_help()
     
     # 主循环
@@ -67,26 +328,129 @@ def main():
                 file_path = user_input[7:].strip()
                 try:
                     print(f"\n正在处理文档: {file_path}")
-                    documents = doc_processor.load_document(file_path)
-                    vector_store.add_documents(documents)
+                    path = Path(file_path)
+                    file_hash = file_sha256(path) if path.is_file() else None
+                    vector_store = components.tenant_store
+                    if file_hash and vector_store.is_up_to_date(str(path.resolve()), file_hash):
+                        print("ℹ 文档内容未变化，已跳过")
+                        continue
+                    batch = components.doc_processor.load_batch(file_path, file_hash=file_hash)
+                    vector_store.upsert_batch(batch, file_hash=file_hash)
                     print(f"✓ 文档已成功上传并向量化")
                 except Exception as e:
                     print(f"✗ 文档处理失败: {e}")
                 continue
             
+            elif user_input.lower() == "ingest" or user_input.lower().startswith("ingest "):
+                root = user_input[6:].strip() or str(Config.upload_dir(components.tenant))
+                try:
+                    print(f"\n正在批量入库目录: {root}")
+                    ingest_directory(components.tenant_store, root)
+                except Exception as e:
+                    print(f"✗ 批量入库失败: {e}")
+                continue
+            
+            elif user_input.lower() == "reindex" or user_input.lower().startswith("reindex "):
+                root = user_input[7:].strip() or str(Config.upload_dir(components.tenant))
+                try:
+                    print(f"\n正在新版本中重建索引: {root}")
+                    reindex(components.tenant_store, root)
+                except Exception as e:
+                    print(f"✗ 重建索引失败（当前版本不受影响）: {e}")
+                continue
+            
             elif user_input.lower() == "clear":
-                vector_store.clear()
+                components.tenant_store.clear()
+                continue
+            
+            elif user_input.lower() == "rollback":
+                try:
+                    print(f"✓ 已回滚到集合版本 {components.tenant_store.rollback()}")
+                except ValueError as e:
+                    print(f"✗ {e}")
+                continue
+            
+            elif user_input.lower() == "versions":
+                print_versions(components.tenant_store)
+                continue
+            
+            elif user_input.lower().startswith(("snapshot ", "restore ")):
+                command, _, path = user_input.partition(" ")
+                try:
+                    if command.lower() == "snapshot":
+                        components.tenant_store.snapshot(path.strip())
+                    else:
+                        components.tenant_store.restore(path.strip())
+                except Exception as e:
+                    print(f"✗ {command} 失败: {e}")
+                continue
+            
+            elif user_input.lower() == "tenant" or user_input.lower().startswith("tenant "):
+                from search_filters import validate_tenant
+
+                try:
+                    components.tenant = validate_tenant(user_input[6:].strip())
+                except ValueError as e:
+                    print(f"✗ {e}")
+                    continue
+                print(f"✓ 当前租户：{components.tenant or '默认'}")
                 continue
             
             elif user_input.lower() == "history":
-                chat_agent.clear_history()
+                components.chat_agent.clear_history()
+                continue
+            
+            elif user_input.lower() == "stats":
+                stats = components.vector_store.embedding_cache_stats()
+                if stats:
+                    print(
+                        f"\nEmbedding 缓存: 命中 {stats['hits']} / 未命中 {stats['misses']}"
+                        f"（命中率 {stats['hit_rate']:.1%}，条目 {stats['entries']}/{stats['max_entries']}）"
+                    )
+                else:
+                    print("\nℹ Embedding 缓存未启用")
+                answer_cache = components.chat_agent.answer_cache
+                if answer_cache is not None:
+                    stats = answer_cache.stats()
+                    print(
+                        f"回答缓存: 命中 {stats['hits']} / 未命中 {stats['misses']}"
+                        f"（命中率 {stats['hit_rate']:.1%}，条目 {stats['entries']}）"
+                    )
+                reranker = components.chat_agent.reranker
+                if reranker is not None:
+                    stats = reranker.stats()
+                    print(
+                        f"重排序分数缓存: 命中 {stats['hits']} / 未命中 {stats['misses']}"
+                        f"（命中率 {stats['hit_rate']:.1%}，条目 {stats['entries']}）"
+                    )
+                condenser = components.chat_agent.condenser
+                if condenser is not None:
+                    stats = condenser.stats()
+                    print(
+                        f"追问改写: 跳过 {stats['skipped']} / 缓存命中 {stats['hits']}"
+                        f" / 调用 LLM {stats['rewrites'] + stats['failures']}（失败 {stats['failures']}）"
+                    )
+                stats = components.chat_agent.sessions.stats()
+                print(f"会话存储（{stats['backend']}）: 会话 {stats['sessions']}，已淘汰 {stats['evicted']}")
+                print_latency(metrics.snapshot())
                 continue
             
-            # 处理对话
+            # 处理对话（流式输出，边生成边显示）
             print("\n思考中...")
-            result = chat_agent.chat(user_input)
+            result = {}
+            filters = None
+            if components.tenant:
+                from search_filters import SearchFilter
 
-            print(f"\n机器人: {result['answer']}")
+                filters = SearchFilter(tenant=components.tenant)
+            for event in components.chat_agent.chat_stream(user_input, filters=filters):
+                if event["type"] == "context":
+                    print("\n机器人: ", end="", flush=True)
+                elif event["type"] == "token":
+                    print(event["content"], end="", flush=True)
+                elif event["type"] == "end":
+                    result = event
+            print()
             
             # 显示引用的上下文（可选）
             if "--debug" in sys.argv:
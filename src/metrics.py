@@ -0,0 +1,339 @@
+"""内置性能指标模块
+
+记录 RAG 流程各阶段（检索、查询编码、向量检索、提示词组装、LLM 生成、入库等）的耗时直方图、
+token 数与生成速度，不依赖外部服务：
+
+- render_prometheus()：Prometheus 文本格式（HTTP 服务的 GET /metrics）
+- snapshot()：各阶段 p50/p95/p99 摘要（命令行 stats、GET /stats）
+- 每轮对话一行 JSON 日志（Config.METRICS_LOG_FILE，留空则不写）
+
+用法：
+    with metrics.stage("vector_search"):
+        ...
+
+    @metrics.timed("retrieve")
+    def _retrieve_context(self, state): ...
+"""
+
+import contextvars
+import functools
+import inspect
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+
+from config import Config
+
+# 耗时直方图桶（秒）
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# 生成速度直方图桶（token/秒）
+RATE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+_HELP = {
+    "rag_stage_seconds": ("histogram", "RAG 各阶段耗时（秒）"),
+    "rag_llm_tokens_total": ("counter", "LLM 处理的 token 数"),
+    "rag_llm_tokens_per_second": ("histogram", "LLM 生成速度（token/秒）"),
+    "rag_chat_turns_total": ("counter", "对话轮数"),
+    "rag_embedded_texts_total": ("counter", "计算 embedding 的文本数"),
+    "rag_llm_requests_total": ("counter", "LLM 请求数（按后端与结果：ok / error / unavailable / busy）"),
+}
+
+# 当前对话轮的阶段明细（写入 JSON 日志）
+_current_trace: contextvars.ContextVar[Optional[dict]] = contextvars.ContextVar(
+    "rag_metrics_trace", default=None
+)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """累计桶直方图，另保留最近样本用于计算分位数"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS, window: int = 2048):
+        self.buckets = tuple(buckets)
+        self.bucket_counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        self.recent.append(value)
+        for idx, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.bucket_counts[idx] += 1
+                break
+
+    def percentile(self, pct: float) -> float:
+        if not self.recent:
+            return 0.0
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+        }
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    items = key + extra
+    if not items:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in items) + "}"
+
+
+class MetricsRegistry:
+    """进程内指标注册表（线程安全）"""
+
+    def __init__(self, enabled: bool = True, log_file: str = ""):
+        self.enabled = enabled
+        self.log_file = Path(log_file) if log_file else None
+        self._histograms: Dict[Tuple[str, LabelKey], Histogram] = {}
+        self._counters: Dict[Tuple[str, LabelKey], float] = {}
+        self._lock = threading.Lock()
+
+    # ================================
+    # 记录
+    # ================================
+    def observe(self, name: str, value: float, buckets=LATENCY_BUCKETS, **labels):
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def record_stage(self, stage: str, seconds: float):
+        """记录一个阶段的耗时；处于对话轮中时同时计入该轮明细"""
+        self.observe("rag_stage_seconds", seconds, stage=stage)
+        trace = _current_trace.get()
+        if trace is not None:
+            stages = trace.setdefault("stages_ms", {})
+            stages[stage] = round(stages.get(stage, 0.0) + seconds * 1000, 3)
+
+    @contextmanager
+    def stage(self, stage: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_stage(stage, time.perf_counter() - started)
+
+    def timed(self, stage: str):
+        """计时装饰器，同时支持普通函数与协程函数"""
+        def decorator(func):
+            if inspect.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    with self.stage(stage):
+                        return await func(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.stage(stage):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def record_generation(
+        self, prompt_tokens: Optional[int], completion_tokens: Optional[int], seconds: float
+    ):
+        """记录一次 LLM 生成的 token 数与生成速度"""
+        if prompt_tokens:
+            self.inc("rag_llm_tokens_total", prompt_tokens, type="prompt")
+        if completion_tokens:
+            self.inc("rag_llm_tokens_total", completion_tokens, type="completion")
+            if seconds > 0:
+                self.observe(
+                    "rag_llm_tokens_per_second", completion_tokens / seconds, buckets=RATE_BUCKETS
+                )
+
+        trace = _current_trace.get()
+        if trace is not None:
+            trace["prompt_tokens"] = prompt_tokens
+            trace["completion_tokens"] = completion_tokens
+            if completion_tokens and seconds > 0:
+                trace["tokens_per_second"] = round(completion_tokens / seconds, 2)
+
+    def annotate(self, **fields):
+        """为当前对话轮的日志附加字段"""
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.update(fields)
+
+    @contextmanager
+    def trace(self, kind: str, **fields) -> Iterator[dict]:
+        """一轮对话的指标明细：结束时计入总耗时并写入 JSON 日志"""
+        record = {"event": kind, "timestamp": time.time(), **fields}
+        token = _current_trace.set(record)
+        started = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["total_ms"] = round((time.perf_counter() - started) * 1000, 3)
+            try:
+                _current_trace.reset(token)
+            except ValueError:
+                # 异步生成器可能在其他上下文中被关闭
+                pass
+            self.record_stage(kind, record["total_ms"] / 1000)
+            self._write_log(record)
+
+    def generation(self) -> "GenerationMeter":
+        """开始统计一次 LLM 调用"""
+        return GenerationMeter(self)
+
+    def _write_log(self, record: dict):
+        if not self.enabled or self.log_file is None:
+            return
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            self.log_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.log_file, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    # ================================
+    # 导出
+    # ================================
+    def render_prometheus(self) -> str:
+        """Prometheus 文本格式（0.0.4）"""
+        with self._lock:
+            histograms = dict(self._histograms)
+            counters = dict(self._counters)
+
+        lines = []
+        for name, (metric_type, help_text) in _HELP.items():
+            series = [
+                (labels, value) for (metric, labels), value in
+                (histograms if metric_type == "histogram" else counters).items()
+                if metric == name
+            ]
+            if not series:
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for labels, value in sorted(series, key=lambda item: item[0]):
+                if metric_type == "counter":
+                    lines.append(f"{name}{_format_labels(labels)} {value:g}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(value.buckets, value.bucket_counts, strict=True):
+                    cumulative += count
+                    lines.append(
+                        f"{name}_bucket{_format_labels(labels, (('le', f'{bound:g}'),))} {cumulative}"
+                    )
+                lines.append(
+                    f"{name}_bucket{_format_labels(labels, (('le', '+Inf'),))} {value.count}"
+                )
+                lines.append(f"{name}_sum{_format_labels(labels)} {value.sum:.6f}")
+                lines.append(f"{name}_count{_format_labels(labels)} {value.count}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict:
+        """各阶段耗时（毫秒）与 token 统计摘要"""
+        with self._lock:
+            stages = {
+                dict(labels)["stage"]: histogram.summary()
+                for (name, labels), histogram in self._histograms.items()
+                if name == "rag_stage_seconds"
+            }
+            rate = next(
+                (h.summary() for (name, _), h in self._histograms.items()
+                 if name == "rag_llm_tokens_per_second"),
+                None,
+            )
+            tokens = {
+                dict(labels)["type"]: value
+                for (name, labels), value in self._counters.items()
+                if name == "rag_llm_tokens_total"
+            }
+
+        def to_ms(summary: dict) -> dict:
+            return {
+                "count": summary["count"],
+                **{key: round(summary[key] * 1000, 3) for key in ("mean", "p50", "p95", "p99")},
+            }
+
+        return {
+            "stages_ms": {stage: to_ms(summary) for stage, summary in sorted(stages.items())},
+            "tokens": tokens,
+            "tokens_per_second": {key: round(value, 2) for key, value in rate.items()} if rate else {},
+        }
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+
+class GenerationMeter:
+    """统计一次 LLM 调用的耗时、首 token 延迟与 token 数（普通调用与流式调用通用）"""
+
+    def __init__(self, registry: MetricsRegistry):
+        self.registry = registry
+        self.started = time.perf_counter()
+        self.first_token_seen = False
+        self.chunks = 0
+        self.prompt_tokens: Optional[int] = None
+        self.completion_tokens: Optional[int] = None
+
+    def on_chunk(self, chunk):
+        if chunk.content:
+            if not self.first_token_seen:
+                self.first_token_seen = True
+                self.registry.record_stage("llm_first_token", time.perf_counter() - self.started)
+            self.chunks += 1
+        self._read_usage(chunk)
+
+    def finish(self, message=None):
+        seconds = time.perf_counter() - self.started
+        if message is not None:
+            self._read_usage(message)
+        self.registry.record_stage("llm", seconds)
+        # 模型未返回用量时，流式输出按片段数近似（Ollama 每个片段约一个 token）
+        completion = self.completion_tokens or (self.chunks or None)
+        self.registry.record_generation(self.prompt_tokens, completion, seconds)
+
+    def _read_usage(self, message):
+        prompt, completion = usage_tokens(message)
+        if prompt:
+            self.prompt_tokens = prompt
+        if completion:
+            self.completion_tokens = completion
+
+
+def usage_tokens(message) -> Tuple[Optional[int], Optional[int]]:
+    """从模型返回的消息中读取（输入 token 数，输出 token 数）"""
+    usage = getattr(message, "usage_metadata", None) or {}
+    metadata = getattr(message, "response_metadata", None) or {}
+    prompt = usage.get("input_tokens", metadata.get("prompt_eval_count"))
+    completion = usage.get("output_tokens", metadata.get("eval_count"))
+    return prompt, completion
+
+
+# 全局指标注册表
+metrics = MetricsRegistry(enabled=Config.METRICS_ENABLED, log_file=Config.METRICS_LOG_FILE)
@@ -0,0 +1,669 @@
+"""进程内向量索引（NumPy）
+
+Chroma（HNSW）之外的另一种向量索引后端（Config.VECTOR_BACKEND=numpy），实现 LangChain VectorStore 接口：
+
+- 向量保存在内存映射文件中（float32 或 float16），打开索引不需要把向量读入内存
+- 片段 ID、内容与元数据保存在 SQLite 中
+- 默认精确（flat）检索：分块矩阵乘法 + argpartition 取前 k 个
+- nlist > 0 时使用 IVF：k-means 把向量分成 nlist 个簇，查询只扫描最近的 nprobe 个簇；
+  写入后向量数达到 nlist * 39 时首次训练，之后规模翻倍时重新训练（训练在写入路径上完成，
+  检索只读取已有的聚类，不会因训练被阻塞）
+
+另外提供与 Chroma collection 相同的 upsert / delete / update / get / count 方法，
+VectorStore 的批量写入与词法索引重建对两种后端走同一套代码。
+
+检索与 get 支持 Chroma 风格的 where 元数据过滤（$eq / $ne / $gt / $gte / $lt / $lte / $in / $nin，
+$and / $or），先在 SQLite 中筛出行号（常用字段建有表达式索引，结果缓存到下次写入），
+再只对这些行做精确检索；命中的行较多时改为顺序扫描全部向量并屏蔽其余行。
+"""
+
+import json
+import re
+import sqlite3
+import threading
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore as LangChainVectorStore
+
+SPACES = ("l2", "cosine", "ip")
+# 每次矩阵乘法处理的行数：float16 向量按块转换为 float32 计算，块小一些转换结果能留在 CPU 缓存中
+_BLOCK_ROWS = 4096
+# IVF 训练：每个簇至少 39 个样本（与 FAISS 的下限一致），最多采样 256 个，迭代 10 轮
+_MIN_TRAIN_PER_LIST = 39
+_MAX_TRAIN_PER_LIST = 256
+_KMEANS_ITERATIONS = 10
+# 建有表达式索引的元数据字段（检索过滤条件常用的字段）
+_INDEXED_FIELDS = ("source", "doc_type", "modified_at")
+_FIELD_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+_COMPARISONS = {"$eq": "=", "$ne": "!=", "$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+# 缓存的过滤结果（where → 行号）个数；任何写入都会清空
+_FILTER_CACHE_SIZE = 64
+# 命中的行超过该比例时顺序扫描全部向量（比按行号随机读取更快）
+_DENSE_FILTER_RATIO = 0.25
+
+
+def where_to_sql(where: dict) -> Tuple[str, list]:
+    """Chroma 风格的 where 表达式 → SQL 条件与参数"""
+    if not isinstance(where, dict) or not where:
+        raise ValueError(f"无效的过滤条件: {where!r}")
+    clauses, params = [], []
+    for key, value in where.items():
+        if key in ("$and", "$or"):
+            if not isinstance(value, list) or not value:
+                raise ValueError(f"{key} 需要非空列表")
+            parts = [where_to_sql(item) for item in value]
+            joiner = " AND " if key == "$and" else " OR "
+            clauses.append("(" + joiner.join(sql for sql, _ in parts) + ")")
+            params += [param for _, part_params in parts for param in part_params]
+            continue
+        if not _FIELD_PATTERN.match(key):
+            raise ValueError(f"无效的元数据字段: {key!r}")
+        column = f"json_extract(metadata, '$.{key}')"
+        conditions = value if isinstance(value, dict) else {"$eq": value}
+        for op, operand in conditions.items():
+            if op in _COMPARISONS:
+                clauses.append(f"{column} {_COMPARISONS[op]} ?")
+                params.append(operand)
+            elif op in ("$in", "$nin"):
+                operand = list(operand)
+                if not operand:
+                    clauses.append("0" if op == "$in" else "1")
+                    continue
+                negate = "NOT " if op == "$nin" else ""
+                clauses.append(f"{column} {negate}IN ({','.join('?' * len(operand))})")
+                params += operand
+            else:
+                raise ValueError(f"不支持的过滤运算符: {op}")
+    return " AND ".join(clauses), params
+
+
+class _GrowableArray:
+    """按需扩容的内存映射数组（容量翻倍增长）"""
+
+    def __init__(self, path: Path, dtype, width: Optional[int] = None, fill=0):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.width = width
+        self.fill = fill
+        self.array: Optional[np.memmap] = None
+        if path.exists() and path.stat().st_size:
+            self._open(path.stat().st_size // self._row_bytes())
+
+    @property
+    def capacity(self) -> int:
+        return 0 if self.array is None else self.array.shape[0]
+
+    def _row_bytes(self) -> int:
+        return self.dtype.itemsize * (self.width or 1)
+
+    def _open(self, rows: int):
+        shape = (rows, self.width) if self.width else (rows,)
+        self.array = np.memmap(self.path, dtype=self.dtype, mode="r+", shape=shape)
+
+    def ensure(self, rows: int):
+        if rows <= self.capacity:
+            return
+        old = self.capacity
+        new = max(rows, old * 2, 1024)
+        # 先释放旧映射再扩展文件
+        self.close()
+        with open(self.path, "ab") as f:
+            f.truncate(new * self._row_bytes())
+        self._open(new)
+        if self.fill:
+            self.array[old:] = self.fill
+
+    def flush(self):
+        if self.array is not None:
+            self.array.flush()
+
+    def close(self):
+        self.flush()
+        self.array = None
+
+
+class NumpyVectorIndex(LangChainVectorStore):
+    """内存映射向量 + SQLite 元数据的进程内索引（线程安全）"""
+
+    def __init__(
+        self,
+        directory: Path,
+        embedding_function: Optional[Embeddings] = None,
+        space: str = "l2",
+        dtype: str = "float32",
+        nlist: int = 0,
+        nprobe: int = 8,
+    ):
+        if space not in SPACES:
+            raise ValueError(f"不支持的距离度量: {space}（可选 {', '.join(SPACES)}）")
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._embedding = embedding_function
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self._lock = threading.RLock()
+
+        self._db = sqlite3.connect(str(self.directory / "chunks.sqlite3"), check_same_thread=False)
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS chunks (
+                id TEXT PRIMARY KEY,
+                row INTEGER NOT NULL UNIQUE,
+                document TEXT,
+                metadata TEXT
+            );
+            CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value TEXT);
+            """
+            + "".join(
+                f"CREATE INDEX IF NOT EXISTS idx_meta_{field} "
+                f"ON chunks (json_extract(metadata, '$.{field}'));"
+                for field in _INDEXED_FIELDS
+            )
+        )
+        info = dict(self._db.execute("SELECT key, value FROM info"))
+        # 度量、精度与维度在索引创建时确定，之后以索引中记录的为准
+        self.space = info.get("space", space)
+        self.dtype = np.dtype(info.get("dtype", dtype))
+        self.dim: Optional[int] = int(info["dim"]) if "dim" in info else None
+        self._trained_size = int(info.get("trained_size", 0))
+
+        rows = np.array(
+            [row for (row,) in self._db.execute("SELECT row FROM chunks")], dtype=np.int64
+        )
+        self._size = int(rows.max()) + 1 if len(rows) else 0
+        self._live = np.zeros(self._size, dtype=bool)
+        self._live[rows] = True
+        self._count = len(rows)
+        self._free: List[int] = np.flatnonzero(~self._live).tolist()
+
+        self._vectors: Optional[_GrowableArray] = None
+        self._assign: Optional[_GrowableArray] = None
+        self._sq_norms: Optional[np.ndarray] = None
+        self.centroids: Optional[np.ndarray] = None
+        self._lists: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        self._filter_cache: Dict[str, np.ndarray] = {}
+        if self.dim is not None:
+            self._open_arrays()
+            # nlist 改变或旧索引没有聚类时，打开索引即训练
+            self._maybe_train()
+
+    # ================================
+    # 存储
+    # ================================
+    def _open_arrays(self):
+        self._vectors = _GrowableArray(self.directory / "vectors.bin", self.dtype, self.dim)
+        self._assign = _GrowableArray(self.directory / "assign.bin", np.int32, fill=-1)
+        self._live = np.resize(self._live, max(self._vectors.capacity, self._size))
+        self._live[self._size:] = False
+        if self.space == "l2":
+            # 预先计算各向量的平方范数：||v - q||² = ||v||² - 2 v·q + ||q||²
+            self._sq_norms = np.zeros(len(self._live), dtype=np.float32)
+            for start in range(0, self._size, _BLOCK_ROWS):
+                block = self._read_block(start)
+                self._sq_norms[start:start + len(block)] = np.einsum("ij,ij->i", block, block)
+        centroids_path = self.directory / "centroids.npy"
+        if self.nlist > 0 and centroids_path.exists():
+            centroids = np.load(centroids_path)
+            # nlist 改变后旧的聚类作废，重新训练
+            if len(centroids) == self.nlist:
+                self.centroids = centroids
+
+    def _read_block(self, start: int) -> np.ndarray:
+        """读取从 start 开始的一块向量（转换为 float32）"""
+        end = min(start + _BLOCK_ROWS, self._size)
+        return np.asarray(self._vectors.array[start:end], dtype=np.float32)
+
+    def _set_info(self, **values):
+        self._db.executemany(
+            "INSERT OR REPLACE INTO info (key, value) VALUES (?, ?)",
+            [(key, str(value)) for key, value in values.items()],
+        )
+
+    def _ensure_rows(self, rows: int):
+        self._vectors.ensure(rows)
+        self._assign.ensure(rows)
+        capacity = self._vectors.capacity
+        if len(self._live) < capacity:
+            self._live = np.concatenate([self._live, np.zeros(capacity - len(self._live), bool)])
+            if self._sq_norms is not None:
+                self._sq_norms = np.concatenate(
+                    [self._sq_norms, np.zeros(capacity - len(self._sq_norms), np.float32)]
+                )
+
+    def _allocate(self) -> int:
+        if self._free:
+            return self._free.pop()
+        self._size += 1
+        return self._size - 1
+
+    def _rows_for(self, ids: Sequence[str]) -> Dict[str, int]:
+        found: Dict[str, int] = {}
+        ids = list(ids)
+        for start in range(0, len(ids), 500):
+            batch = ids[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            found.update(self._db.execute(
+                f"SELECT id, row FROM chunks WHERE id IN ({placeholders})", batch
+            ))
+        return found
+
+    def _prepare(self, vectors: np.ndarray) -> np.ndarray:
+        if self.space == "cosine":
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors = vectors / np.where(norms == 0, 1.0, norms)
+        return vectors
+
+    # ================================
+    # 与 Chroma collection 相同的接口
+    # ================================
+    def count(self) -> int:
+        return self._count
+
+    def upsert(
+        self,
+        ids: Sequence[str],
+        embeddings: Sequence[Sequence[float]],
+        metadatas: Optional[Sequence[Optional[dict]]] = None,
+        documents: Optional[Sequence[str]] = None,
+    ):
+        """写入或覆盖片段（ID 已存在时原位覆盖）"""
+        if not ids:
+            return
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if vectors.ndim != 2 or len(vectors) != len(ids):
+            raise ValueError("向量数量与 ID 数量不一致")
+        metadatas = list(metadatas) if metadatas is not None else [None] * len(ids)
+        documents = list(documents) if documents is not None else [""] * len(ids)
+        if len(metadatas) != len(ids) or len(documents) != len(ids):
+            raise ValueError("元数据或内容数量与 ID 数量不一致")
+
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                self._set_info(dim=self.dim, dtype=self.dtype.name, space=self.space)
+                self._open_arrays()
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"向量维度不一致：索引为 {self.dim}，写入为 {vectors.shape[1]}")
+
+            existing = self._rows_for(ids)
+            assigned: Dict[str, int] = {}
+            for doc_id in ids:
+                if doc_id not in assigned:
+                    assigned[doc_id] = existing[doc_id] if doc_id in existing else self._allocate()
+            rows = np.array([assigned[doc_id] for doc_id in ids], dtype=np.int64)
+            self._ensure_rows(self._size)
+
+            vectors = self._prepare(vectors)
+            stored = vectors.astype(self.dtype)
+            self._vectors.array[rows] = stored
+            if self._sq_norms is not None:
+                stored = stored.astype(np.float32)
+                self._sq_norms[rows] = np.einsum("ij,ij->i", stored, stored)
+            if self.centroids is not None:
+                self._assign.array[rows] = self._nearest_centroids(vectors)
+            self._count += len(assigned) - len(existing)
+            self._live[rows] = True
+            self._lists = None
+            self._filter_cache.clear()
+
+            self._db.executemany(
+                "INSERT OR REPLACE INTO chunks (id, row, document, metadata) VALUES (?, ?, ?, ?)",
+                [
+                    (doc_id, int(row), document, json.dumps(metadata or {}, ensure_ascii=False))
+                    for doc_id, row, document, metadata in zip(
+                        ids, rows, documents, metadatas, strict=True
+                    )
+                ],
+            )
+            self._db.commit()
+            self._vectors.flush()
+            self._assign.flush()
+            self._maybe_train()
+
+    def update(self, ids: Sequence[str], metadatas: Sequence[dict]):
+        """只更新元数据"""
+        with self._lock:
+            self._filter_cache.clear()
+            self._db.executemany(
+                "UPDATE chunks SET metadata = ? WHERE id = ?",
+                [(json.dumps(metadata or {}, ensure_ascii=False), doc_id)
+                 for doc_id, metadata in zip(ids, metadatas, strict=True)],
+            )
+            self._db.commit()
+
+    def get(
+        self,
+        ids: Optional[Sequence[str]] = None,
+        include: Iterable[str] = ("documents", "metadatas"),
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        where: Optional[dict] = None,
+    ) -> dict:
+        """按 ID 或按写入位置分页读取片段（include 可含 embeddings，where 为元数据过滤条件）"""
+        include = set(include)
+        embeddings = None
+        # 与写入共用锁：SQLite 连接跨线程共用，向量文件扩容时会重新映射
+        with self._lock:
+            if ids is not None:
+                rows = self._rows_for(ids)
+                rows = [rows[doc_id] for doc_id in ids if doc_id in rows]
+                records = self._records(rows, where)
+            else:
+                condition, params = where_to_sql(where) if where else ("1", [])
+                records = self._db.execute(
+                    f"SELECT row, id, document, metadata FROM chunks WHERE {condition} "
+                    "ORDER BY row LIMIT ? OFFSET ?",
+                    (*params, limit if limit is not None else -1, offset or 0),
+                ).fetchall()
+            if "embeddings" in include:
+                rows = np.array([record[0] for record in records], dtype=np.int64)
+                embeddings = (
+                    np.asarray(self._vectors.array[rows], dtype=np.float32)
+                    if len(rows) else np.empty((0, self.dim or 0), dtype=np.float32)
+                )
+        return {
+            "ids": [record[1] for record in records],
+            "documents": [record[2] for record in records] if "documents" in include else None,
+            "metadatas": (
+                [json.loads(record[3]) for record in records] if "metadatas" in include else None
+            ),
+            "embeddings": embeddings,
+        }
+
+    def _records(self, rows: Sequence[int], where: Optional[dict] = None) -> List[tuple]:
+        """按给定行号的顺序取回（row, id, document, metadata），where 过滤掉不满足条件的行"""
+        by_row = {}
+        rows = [int(row) for row in rows]
+        condition, params = where_to_sql(where) if where else ("1", [])
+        with self._lock:
+            for start in range(0, len(rows), 500):
+                batch = rows[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                for record in self._db.execute(
+                    "SELECT row, id, document, metadata FROM chunks "
+                    f"WHERE row IN ({placeholders}) AND {condition}",
+                    (*batch, *params),
+                ):
+                    by_row[record[0]] = record
+        return [by_row[row] for row in rows if row in by_row]
+
+    def _filter_rows(self, where: dict) -> np.ndarray:
+        """满足元数据条件的行号（升序，缓存到下次写入）"""
+        key = json.dumps(where, sort_keys=True, ensure_ascii=False)
+        with self._lock:
+            rows = self._filter_cache.get(key)
+            if rows is None:
+                condition, params = where_to_sql(where)
+                rows = np.array(
+                    [row for (row,) in self._db.execute(
+                        f"SELECT row FROM chunks WHERE {condition}", params
+                    )],
+                    dtype=np.int64,
+                )
+                rows.sort()
+                if len(self._filter_cache) >= _FILTER_CACHE_SIZE:
+                    self._filter_cache.pop(next(iter(self._filter_cache)))
+                self._filter_cache[key] = rows
+            return rows
+
+    # ================================
+    # LangChain VectorStore 接口
+    # ================================
+    @property
+    def embeddings(self) -> Optional[Embeddings]:
+        return self._embedding
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        *,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        texts = list(texts)
+        ids = list(ids) if ids else [uuid.uuid4().hex for _ in texts]
+        self.upsert(ids, self._embedding.embed_documents(texts), metadatas, texts)
+        return ids
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if not ids:
+            return False
+        with self._lock:
+            rows = list(self._rows_for(ids).values())
+            if not rows:
+                return True
+            self._db.executemany("DELETE FROM chunks WHERE row = ?", [(row,) for row in rows])
+            self._db.commit()
+            self._live[rows] = False
+            if self._assign is not None:
+                self._assign.array[rows] = -1
+            self._free.extend(rows)
+            self._count -= len(rows)
+            self._lists = None
+            self._filter_cache.clear()
+        return True
+
+    def get_by_ids(self, ids: Sequence[str], /) -> List[Document]:
+        result = self.get(ids=ids)
+        return [
+            Document(id=doc_id, page_content=document, metadata=metadata)
+            for doc_id, document, metadata in zip(
+                result["ids"], result["documents"], result["metadatas"], strict=True
+            )
+        ]
+
+    def similarity_search(
+        self, query: str, k: int = 4, filter: Optional[dict] = None, **kwargs: Any
+    ) -> List[Document]:
+        return self.similarity_search_by_vector(self._embedding.embed_query(query), k, filter)
+
+    def similarity_search_with_score(
+        self, query: str, k: int = 4, filter: Optional[dict] = None, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(
+            self._embedding.embed_query(query), k, filter
+        )
+
+    def similarity_search_by_vector(
+        self, embedding: List[float], k: int = 4, filter: Optional[dict] = None, **kwargs: Any
+    ) -> List[Document]:
+        return [
+            doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k, filter)
+        ]
+
+    def similarity_search_by_vector_with_score(
+        self, embedding: List[float], k: int = 4, filter: Optional[dict] = None
+    ) -> List[Tuple[Document, float]]:
+        """返回（片段, 距离），距离越小越相似（与 Chroma 的定义一致）"""
+        hits = self.search(embedding, k, where=filter)
+        records = self._records([row for row, _ in hits])
+        distances = dict(hits)
+        return [
+            (Document(id=doc_id, page_content=document, metadata=json.loads(metadata)),
+             distances[row])
+            for row, doc_id, document, metadata in records
+        ]
+
+    def _select_relevance_score_fn(self):
+        return {
+            "l2": self._euclidean_relevance_score_fn,
+            "cosine": self._cosine_relevance_score_fn,
+            "ip": self._max_inner_product_relevance_score_fn,
+        }[self.space]
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        *,
+        ids: Optional[List[str]] = None,
+        directory: Optional[Path] = None,
+        **kwargs: Any,
+    ) -> "NumpyVectorIndex":
+        if directory is None:
+            raise ValueError("需要指定索引目录 directory")
+        index = cls(directory, embedding_function=embedding, **kwargs)
+        index.add_texts(texts, metadatas, ids=ids)
+        return index
+
+    # ================================
+    # 检索
+    # ================================
+    def search(
+        self, embedding: Sequence[float], k: int, where: Optional[dict] = None
+    ) -> List[Tuple[int, float]]:
+        """返回前 k 个（行号, 距离）
+
+        给出 where 时只对满足条件的行做精确检索（不走 IVF），开销与命中的行数成正比。
+        """
+        query = self._prepare(np.asarray(embedding, dtype=np.float32)[None, :])[0]
+        with self._lock:
+            if not self._count or k <= 0:
+                return []
+            if where:
+                matched = self._filter_rows(where)
+                if not len(matched):
+                    return []
+                if len(matched) > self._size * _DENSE_FILTER_RATIO:
+                    rows, scores = self._score(query, None)
+                    mask = np.ones(len(rows), dtype=bool)
+                    mask[matched] = False
+                    scores[mask] = -np.inf
+                else:
+                    rows, scores = self._score(query, matched)
+            else:
+                rows = self._probe(query) if self.centroids is not None else None
+                rows, scores = self._score(query, rows)
+
+        k = min(k, len(scores))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        top = top[np.isfinite(scores[top])]
+
+        if self.space == "l2":
+            distances = float(query @ query) - scores[top]
+        else:
+            distances = 1.0 - scores[top]
+        return [
+            (int(row), float(distance))
+            for row, distance in zip(rows[top], distances, strict=True)
+        ]
+
+    def _score(
+        self, query: np.ndarray, rows: Optional[np.ndarray]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """计算相似度分数（越大越相似）；rows 为 None 时扫描全部向量"""
+        if rows is None:
+            rows = np.arange(self._size)
+            dots = np.empty(self._size, dtype=np.float32)
+            for start in range(0, self._size, _BLOCK_ROWS):
+                block = self._read_block(start)
+                dots[start:start + len(block)] = block @ query
+        else:
+            dots = np.empty(len(rows), dtype=np.float32)
+            for start in range(0, len(rows), _BLOCK_ROWS):
+                batch = rows[start:start + _BLOCK_ROWS]
+                dots[start:start + len(batch)] = (
+                    np.asarray(self._vectors.array[batch], dtype=np.float32) @ query
+                )
+
+        scores = 2 * dots - self._sq_norms[rows] if self.space == "l2" else dots
+        scores[~self._live[rows]] = -np.inf
+        return rows, scores
+
+    # ================================
+    # IVF
+    # ================================
+    def _maybe_train(self):
+        """向量数达到训练下限时训练，之后规模翻倍时重新训练（在写入路径上调用）"""
+        if self.nlist <= 0 or self._count < self.nlist * _MIN_TRAIN_PER_LIST:
+            return
+        if self.centroids is None or self._count >= 2 * self._trained_size:
+            self.train()
+
+    def train(self, seed: int = 0):
+        """k-means 聚类并把所有向量分配到最近的簇"""
+        with self._lock:
+            rng = np.random.default_rng(seed)
+            live_rows = np.flatnonzero(self._live[:self._size])
+            size = min(len(live_rows), self.nlist * _MAX_TRAIN_PER_LIST)
+            sample = np.sort(rng.choice(live_rows, size=size, replace=False))
+            data = np.asarray(self._vectors.array[sample], dtype=np.float32)
+
+            centroids = data[rng.choice(len(data), size=self.nlist, replace=False)].copy()
+            for _ in range(_KMEANS_ITERATIONS):
+                labels = self._nearest(data, centroids)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, labels, data)
+                counts = np.bincount(labels, minlength=self.nlist)
+                nonempty = counts > 0
+                # 空簇保留原中心
+                centroids[nonempty] = sums[nonempty] / counts[nonempty, None]
+                if self.space != "l2":
+                    centroids = self._prepare(centroids)
+
+            self.centroids = centroids
+            for start in range(0, self._size, _BLOCK_ROWS):
+                block = self._read_block(start)
+                self._assign.array[start:start + len(block)] = self._nearest(block, centroids)
+            self._assign.array[np.flatnonzero(~self._live[:self._size])] = -1
+            self._assign.flush()
+            np.save(self.directory / "centroids.npy", centroids)
+            self._trained_size = self._count
+            self._set_info(trained_size=self._trained_size)
+            self._db.commit()
+            self._lists = None
+
+    def _nearest(self, data: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        dots = data @ centroids.T
+        if self.space == "l2":
+            dots = 2 * dots - np.einsum("ij,ij->i", centroids, centroids)
+        return np.argmax(dots, axis=1).astype(np.int32)
+
+    def _nearest_centroids(self, vectors: np.ndarray) -> np.ndarray:
+        return self._nearest(vectors, self.centroids)
+
+    def _probe(self, query: np.ndarray) -> np.ndarray:
+        """最近的 nprobe 个簇中的全部行号"""
+        if self._lists is None:
+            assign = np.asarray(self._assign.array[:self._size])
+            order = np.argsort(assign, kind="stable")
+            bounds = np.searchsorted(assign[order], np.arange(self.nlist + 1))
+            self._lists = (order, bounds)
+        order, bounds = self._lists
+
+        scores = self.centroids @ query
+        if self.space == "l2":
+            scores = 2 * scores - np.einsum("ij,ij->i", self.centroids, self.centroids)
+        nprobe = min(self.nprobe, self.nlist)
+        probes = np.argpartition(-scores, nprobe - 1)[:nprobe]
+        rows = np.concatenate([order[bounds[c]:bounds[c + 1]] for c in probes])
+        # 按行号排序，顺序读取内存映射文件
+        return np.sort(rows)
+
+    def stats(self) -> dict:
+        return {
+            "count": self._count,
+            "dim": self.dim,
+            "dtype": self.dtype.name,
+            "space": self.space,
+            "nlist": self.nlist if self.centroids is not None else 0,
+            "nprobe": self.nprobe,
+        }
+
+    def close(self):
+        with self._lock:
+            if self._vectors is not None:
+                self._vectors.close()
+                self._assign.close()
+            self._db.close()
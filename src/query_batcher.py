@@ -0,0 +1,81 @@
+"""查询向量微批处理模块
+
+并发请求的查询向量在一个很短的时间窗口内攒成一批，
+通过一次 ``embed_documents`` 前向计算完成，降低 CPU 上的编码开销。
+"""
+
+import asyncio
+from typing import List, Optional, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+
+class EmbeddingBatcher:
+    """异步微批处理器
+
+    - 攒满 max_batch_size 条立即计算
+    - 否则最多等待 max_wait_ms 毫秒后计算
+    """
+
+    def __init__(self, embeddings: Embeddings, max_batch_size: int = 32, max_wait_ms: float = 5.0):
+        self.embeddings = embeddings
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: set = set()
+        self.batches = 0
+        self.queries = 0
+
+    async def embed(self, text: str) -> List[float]:
+        """提交一条查询，等待所在批次完成后返回向量"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._dispatch()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._dispatch)
+
+        return await future
+
+    def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+
+        batch, self._pending = self._pending, []
+        task = asyncio.get_running_loop().create_task(self._run(batch))
+        # 保留引用，避免任务在完成前被回收
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[str, asyncio.Future]]):
+        texts = [text for text, _ in batch]
+        try:
+            vectors = await asyncio.to_thread(self.embeddings.embed_documents, texts)
+            # 向量数与查询数不一致时整批报错，不让任何请求拿到错位的向量或一直等待
+            results = list(zip(batch, vectors, strict=True))
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.queries += len(batch)
+        for (_, future), vector in results:
+            if not future.done():
+                future.set_result(vector)
+
+    def stats(self) -> dict:
+        """返回批处理统计"""
+        return {
+            "batches": self.batches,
+            "queries": self.queries,
+            "avg_batch_size": self.queries / self.batches if self.batches else 0.0,
+        }
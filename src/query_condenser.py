@@ -0,0 +1,232 @@
+"""追问改写模块
+
+多轮对话中的追问常省略主语或用代词指代上文（"它多久执行一次？"、"那 XK-302 呢？"），
+直接拿去检索会召回与上文无关的片段。ChatAgent 在检索前的 condense 节点中，
+用 LLM 结合最近几条对话历史把追问改写为独立的问题：
+
+- 启发式门控：没有历史，或问题本身完整（不是只有几个字、不含指代词与省略句式）时直接使用原问题，
+  不额外调用 LLM（首轮与大部分自包含的问题都走这条路径）；中文没有词边界，
+  指代词只在问题开头或独立成词（前后是标点 / 空白）时计入，并排除"其它"等复合词
+- 改写结果按（最近历史, 问题）缓存在进程内 LRU 中，重复的追问不再调用 LLM
+- 改写失败（LLM 繁忙 / 出错）或结果异常（空 / 过长）时退回原问题
+
+改写后的问题只用于检索、重排序与回答缓存；提示词与对话历史中仍是用户的原始问题。
+"""
+
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Sequence
+
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+
+# 指代上文的词（在问题开头或独立成词时视为追问）
+_ZH_REFERENCES = (
+    "它", "他们", "她们", "这个", "那个", "这些", "那些", "这种", "那种", "这款", "那款",
+    "这项", "那项", "上述", "上面", "前面", "刚才", "之前说", "同样",
+)
+# 含指代词但不指代上文的复合词
+_ZH_COMPOUNDS = ("其它", "其他")
+# 承接上文的开头（"那……"、"还有……"）；"和" / "跟" 常是词首（和平区、跟踪），不计入
+_ZH_PREFIXES = ("那", "还有", "另外", "此外", "以及", "而且")
+
+
+def _zh_reference_pattern() -> "re.Pattern[str]":
+    """指代词出现在开头，或前后紧邻标点 / 空白（\\w 包含汉字，即不与其它汉字连成一个词）"""
+    alternatives = []
+    for word in _ZH_REFERENCES:
+        excluded = "".join(
+            f"(?<!{re.escape(compound[:-len(word)])})"
+            for compound in _ZH_COMPOUNDS
+            if compound.endswith(word) and compound != word
+        )
+        alternatives.append(f"{excluded}{re.escape(word)}")
+    words = "|".join(alternatives)
+    return re.compile(rf"(?<!\w)(?:{words})|(?:{words})(?!\w)")
+
+
+_ZH_REFERENCE = _zh_reference_pattern()
+# this / that 常作限定词或引导从句（"the error that appears"），只在开头或结尾时视为指代
+_EN_REFERENCES = re.compile(
+    r"\b(it|its|they|them|their|these|those|he|she|his|her)\b"
+    r"|^(this|that)\b|\b(this|that)\W*$",
+    re.IGNORECASE,
+)
+_EN_PREFIXES = re.compile(r"^(and|also|what about|how about|then|so)\b", re.IGNORECASE)
+# 以"呢"结尾的省略问句（"缺点呢？"）
+_ELLIPSIS = re.compile(r"呢[?？]?$")
+# 统计问题长度时不计标点与空白
+_NON_WORD = re.compile(r"[\W_]+")
+# 推理模型（deepseek-r1 等）输出的思考过程
+_THINK = re.compile(r"<think>.*?(</think>|$)", re.DOTALL)
+# 模型可能在改写结果前加上的标签
+_LABEL = re.compile(r"^(独立问题|改写后的问题|问题|standalone question)\s*[:：]\s*", re.IGNORECASE)
+
+_SYSTEM_PROMPT = """你负责改写多轮对话中的追问。
+根据对话历史，把用户的最后一个问题改写为不依赖上下文、可以单独检索的完整问题：
+1. 用历史中的具体名称替换代词和省略的主语，保留型号、数字与专有名词
+2. 只输出改写后的问题，不要回答问题，不要解释
+3. 如果问题已经完整，原样输出"""
+
+
+def needs_condense(query: str, history: Sequence[BaseMessage], min_query_chars: int = 4) -> bool:
+    """判断问题是否需要结合历史改写（不调用 LLM 的廉价检查）
+
+    min_query_chars 不计标点与空白，只拦截"默认值？"这类只有几个字的省略问句。
+    """
+    if not history:
+        return False
+    text = query.strip()
+    if not text:
+        return False
+    if len(_NON_WORD.sub("", text)) < min_query_chars:
+        return True
+    if _ZH_REFERENCE.search(text):
+        return True
+    if text.startswith(_ZH_PREFIXES) or _EN_PREFIXES.match(text):
+        return True
+    return bool(_ELLIPSIS.search(text) or _EN_REFERENCES.search(text))
+
+
+def _cache_key(query: str, history: Sequence[BaseMessage]) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    for message in history:
+        digest.update(message.type.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(str(message.content).encode("utf-8"))
+        digest.update(b"\0")
+    digest.update(query.strip().encode("utf-8"))
+    return digest.hexdigest()
+
+
+class QueryCondenser:
+    """带门控与 LRU 缓存的追问改写器（线程安全）
+
+    llm 需提供 ``invoke(messages)`` / ``ainvoke(messages)``（OllamaPool 或 LangChain 聊天模型）。
+    """
+
+    def __init__(
+        self,
+        llm,
+        history_messages: int = 4,
+        min_query_chars: int = 4,
+        cache_max_entries: int = 1000,
+        max_history_chars: int = 300,
+    ):
+        self.llm = llm
+        self.history_messages = history_messages
+        self.min_query_chars = min_query_chars
+        self.cache_max_entries = cache_max_entries
+        self.max_history_chars = max_history_chars
+
+        self._rewrites: "OrderedDict[str, str]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.skipped = 0
+        self.hits = 0
+        self.rewrites = 0
+        self.failures = 0
+
+    # ================================
+    # 改写
+    # ================================
+    def condense(self, query: str, history: Sequence[BaseMessage]) -> str:
+        """返回用于检索的独立问题（不需要改写时原样返回）"""
+        recent, key = self._prepare(query, history)
+        if key is None:
+            return query
+        cached = self._lookup(key)
+        if cached is not None:
+            return cached
+        try:
+            reply = self.llm.invoke(self._build_messages(query, recent))
+        except Exception:
+            self.failures += 1
+            return query
+        return self._finish(key, query, reply)
+
+    async def acondense(self, query: str, history: Sequence[BaseMessage]) -> str:
+        """condense 的异步版本"""
+        recent, key = self._prepare(query, history)
+        if key is None:
+            return query
+        cached = self._lookup(key)
+        if cached is not None:
+            return cached
+        try:
+            reply = await self.llm.ainvoke(self._build_messages(query, recent))
+        except Exception:
+            self.failures += 1
+            return query
+        return self._finish(key, query, reply)
+
+    def _prepare(self, query: str, history: Sequence[BaseMessage]):
+        """门控检查；需要改写时返回（参与改写的历史, 缓存键）"""
+        recent = list(history[-self.history_messages:]) if self.history_messages > 0 else []
+        if not needs_condense(query, recent, self.min_query_chars):
+            self.skipped += 1
+            return recent, None
+        return recent, _cache_key(query, recent)
+
+    def _build_messages(self, query: str, history: Sequence[BaseMessage]) -> List[BaseMessage]:
+        lines = []
+        for message in history:
+            role = "用户" if isinstance(message, HumanMessage) else "助手"
+            content = " ".join(str(message.content).split())
+            if len(content) > self.max_history_chars:
+                content = content[:self.max_history_chars] + "…"
+            lines.append(f"{role}：{content}")
+        prompt = "对话历史：\n" + "\n".join(lines) + f"\n\n追问：{query.strip()}\n\n独立问题："
+        return [SystemMessage(content=_SYSTEM_PROMPT), HumanMessage(content=prompt)]
+
+    def _finish(self, key: str, query: str, reply) -> str:
+        rewritten = self._clean(str(getattr(reply, "content", reply)), query)
+        if rewritten is None:
+            self.failures += 1
+            return query
+        self.rewrites += 1
+        self._store(key, rewritten)
+        return rewritten
+
+    def _clean(self, text: str, query: str) -> Optional[str]:
+        """去掉思考过程与标签，只取第一行；结果为空或明显不是问题时返回 None"""
+        text = _THINK.sub("", text).strip()
+        line = next((line.strip() for line in text.splitlines() if line.strip()), "")
+        line = _LABEL.sub("", line).strip().strip("\"'“”「」")
+        if not line or len(line) > max(len(query) * 4, 200):
+            return None
+        return line
+
+    # ================================
+    # 改写缓存
+    # ================================
+    def _lookup(self, key: str) -> Optional[str]:
+        with self._cache_lock:
+            cached = self._rewrites.get(key)
+            if cached is not None:
+                self._rewrites.move_to_end(key)
+                self.hits += 1
+            return cached
+
+    def _store(self, key: str, rewritten: str):
+        with self._cache_lock:
+            self._rewrites[key] = rewritten
+            self._rewrites.move_to_end(key)
+            while len(self._rewrites) > self.cache_max_entries:
+                self._rewrites.popitem(last=False)
+
+    def clear_cache(self):
+        with self._cache_lock:
+            self._rewrites.clear()
+
+    def stats(self) -> dict:
+        """返回门控跳过、缓存命中与 LLM 改写次数"""
+        total = self.skipped + self.hits + self.rewrites + self.failures
+        return {
+            "skipped": self.skipped,
+            "hits": self.hits,
+            "rewrites": self.rewrites,
+            "failures": self.failures,
+            "llm_call_rate": (self.rewrites + self.failures) / total if total else 0.0,
+            "entries": len(self._rewrites),
+        }
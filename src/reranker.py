@@ -0,0 +1,170 @@
+"""交叉编码器重排序模块
+
+双编码器（MiniLM）向量检索的排序较粗，只能靠调大 RETRIEVAL_K 兜底，
+结果是大量边缘片段进入提示词、拉长 LLM 的预填充时间。
+
+开启 RERANK_ENABLED 后，ChatAgent 先从向量库多取 RERANK_CANDIDATES 个候选，
+再用小型交叉编码器对（问题, 片段）逐对打分，只保留前 RERANK_TOP_N 个：
+
+- 模型首次打分时才加载（sentence-transformers 的 CrossEncoder）
+- 未命中缓存的片段按 RERANK_BATCH_SIZE 分批计算
+- （问题, 片段内容）的分数缓存在进程内 LRU 中，重复问题与热门片段不再重复计算
+
+模型由 ``python scripts/download_model.py --rerank`` 下载到 model/ 目录。
+"""
+
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+from langchain_core.documents import Document
+
+from config import Config
+
+
+def resolve_rerank_model_path(model_name: str = None) -> str:
+    """优先使用 model/ 下的本地模型，如果不存在则使用 HuggingFace 模型名"""
+    model_name = model_name or Config.RERANK_MODEL
+    local_model_path = Config.MODEL_DIR / Path(model_name).name
+    if local_model_path.exists():
+        print(f"✓ 使用本地重排序模型: {local_model_path}")
+        return str(local_model_path)
+
+    print(f"ℹ 本地重排序模型不存在，将从 HuggingFace 下载: {model_name}")
+    return model_name
+
+
+def create_cross_encoder(model_name: str = None):
+    """创建 CrossEncoder（CPU 推理）"""
+    from sentence_transformers import CrossEncoder
+
+    return CrossEncoder(
+        resolve_rerank_model_path(model_name), max_length=Config.RERANK_MAX_LENGTH, device="cpu"
+    )
+
+
+def _score_key(query: str, text: str) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(query.strip().encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(text.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class CrossEncoderReranker:
+    """带分数缓存的批量重排序器（线程安全）
+
+    model_factory 返回的对象需提供 ``predict(pairs, batch_size=...)``，
+    与 sentence-transformers 的 CrossEncoder 接口一致。
+    """
+
+    def __init__(
+        self,
+        model_factory: Optional[Callable[[], object]] = None,
+        batch_size: int = 16,
+        cache_max_entries: int = 10000,
+    ):
+        self._factory = model_factory or create_cross_encoder
+        self._model = None
+        self._load_lock = threading.Lock()
+        self.batch_size = batch_size
+        self.cache_max_entries = cache_max_entries
+
+        self._scores: "OrderedDict[str, float]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.batches = 0
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    def load(self):
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    self._model = self._factory()
+        return self._model
+
+    # ================================
+    # 打分
+    # ================================
+    def score(self, query: str, texts: Sequence[str]) -> List[float]:
+        """返回每个片段与问题的相关性分数（越大越相关）"""
+        keys = [_score_key(query, text) for text in texts]
+        scores: Dict[int, float] = {}
+        missing: List[int] = []
+
+        with self._cache_lock:
+            for idx, key in enumerate(keys):
+                cached = self._scores.get(key)
+                if cached is None:
+                    missing.append(idx)
+                else:
+                    self._scores.move_to_end(key)
+                    scores[idx] = cached
+            self.hits += len(scores)
+            self.misses += len(missing)
+
+        if missing:
+            model = self.load()
+            for start in range(0, len(missing), self.batch_size):
+                batch = missing[start:start + self.batch_size]
+                pairs = [(query, texts[idx]) for idx in batch]
+                values = model.predict(pairs, batch_size=self.batch_size, show_progress_bar=False)
+                self.batches += 1
+                for idx, value in zip(batch, values, strict=True):
+                    scores[idx] = float(value)
+            self._store({keys[idx]: scores[idx] for idx in missing})
+
+        return [scores[idx] for idx in range(len(texts))]
+
+    def rerank(self, query: str, docs: Sequence[Document], top_n: int) -> List[Document]:
+        """按交叉编码器分数重新排序，只保留前 top_n 个（分数写入 metadata["rerank_score"]）"""
+        if not docs:
+            return []
+        scores = self.score(query, [doc.page_content for doc in docs])
+        pairs = zip(docs, scores, strict=True)
+        ranked = sorted(pairs, key=lambda item: item[1], reverse=True)[:top_n]
+        return [
+            Document(
+                id=doc.id,
+                page_content=doc.page_content,
+                metadata={**doc.metadata, "rerank_score": round(value, 6)},
+            )
+            for doc, value in ranked
+        ]
+
+    async def arerank(self, query: str, docs: Sequence[Document], top_n: int) -> List[Document]:
+        """异步重排序（模型推理在线程池中执行）"""
+        return await asyncio.to_thread(self.rerank, query, docs, top_n)
+
+    # ================================
+    # 分数缓存
+    # ================================
+    def _store(self, entries: Dict[str, float]):
+        with self._cache_lock:
+            for key, value in entries.items():
+                self._scores[key] = value
+                self._scores.move_to_end(key)
+            while len(self._scores) > self.cache_max_entries:
+                self._scores.popitem(last=False)
+
+    def clear_cache(self):
+        with self._cache_lock:
+            self._scores.clear()
+
+    def stats(self) -> dict:
+        """返回分数缓存命中率与批次统计"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self._scores),
+            "batches": self.batches,
+        }
@@ -0,0 +1,119 @@
+"""检索过滤条件
+
+SearchFilter 描述一次检索的范围：
+
+- tenant：租户，选择检索哪个集合（每个租户一个独立集合，检索开销只与该租户的数据量有关）
+- source / doc_type：来源文件名、文档类型（可给多个）
+- date_from / date_to：文件修改日期范围（含两端，只给日期时 date_to 包含当天）
+
+元数据条件转换为 Chroma 的 where 表达式，在索引内过滤：Chroma 先按元数据筛选再做向量检索，
+numpy 后端只对命中的行打分。片段元数据由 DocumentProcessor 写入（doc_type、modified_at）。
+"""
+
+import re
+from dataclasses import asdict, dataclass
+from datetime import date, datetime, time, timedelta
+from typing import Optional, Sequence, Tuple, Union
+
+# 租户名会成为集合名的一部分（Chroma 集合名只允许字母、数字、_ 与 -）
+TENANT_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]{0,62}$")
+
+DateLike = Union[date, datetime, str, int, float]
+
+
+def validate_tenant(tenant: Optional[str]) -> Optional[str]:
+    """校验租户名，空字符串视为默认租户"""
+    if not tenant:
+        return None
+    if not TENANT_PATTERN.match(tenant):
+        raise ValueError(f"租户名只能包含字母、数字、_ 与 -（最长 63 个字符）: {tenant!r}")
+    return tenant
+
+
+def to_timestamp(value: DateLike, end_of_day: bool = False) -> float:
+    """日期 / 时间 / ISO 字符串 / 时间戳 → Unix 时间戳（本地时区）
+
+    end_of_day=True 且只给出日期时，返回当天结束的时刻（用于包含当天的上界）。
+    """
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            if "T" in value or " " in value.strip():
+                value = datetime.fromisoformat(value)
+            else:
+                value = date.fromisoformat(value)
+        except ValueError as e:
+            raise ValueError(f"无法解析日期: {value!r}") from e
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if end_of_day:
+        return datetime.combine(value + timedelta(days=1), time()).timestamp() - 1e-3
+    return datetime.combine(value, time()).timestamp()
+
+
+def _as_tuple(value: Union[str, Sequence[str], None]) -> Tuple[str, ...]:
+    if value is None:
+        return ()
+    if isinstance(value, str):
+        return (value,)
+    return tuple(value)
+
+
+@dataclass(frozen=True)
+class SearchFilter:
+    """一次检索的租户与元数据条件"""
+
+    tenant: Optional[str] = None
+    source: Union[str, Sequence[str], None] = None
+    doc_type: Union[str, Sequence[str], None] = None
+    date_from: Optional[DateLike] = None
+    date_to: Optional[DateLike] = None
+
+    def __post_init__(self):
+        object.__setattr__(self, "tenant", validate_tenant(self.tenant))
+        object.__setattr__(self, "source", _as_tuple(self.source))
+        # 文档类型统一为不带点的小写扩展名（pdf / docx / md / txt）
+        object.__setattr__(
+            self, "doc_type", tuple(t.lower().lstrip(".") for t in _as_tuple(self.doc_type))
+        )
+        # 提前解析日期，格式错误在构造时报错
+        self.date_range()
+
+    @classmethod
+    def from_dict(cls, data: Optional[dict]) -> Optional["SearchFilter"]:
+        """从请求参数构造，全部为空时返回 None"""
+        if not data:
+            return None
+        search_filter = cls(
+            **{key: value for key, value in data.items() if value not in (None, "")}
+        )
+        return None if search_filter.is_empty() else search_filter
+
+    def is_empty(self) -> bool:
+        return not (self.tenant or self.where())
+
+    def date_range(self) -> Tuple[Optional[float], Optional[float]]:
+        start = to_timestamp(self.date_from) if self.date_from is not None else None
+        end = to_timestamp(self.date_to, end_of_day=True) if self.date_to is not None else None
+        return start, end
+
+    def where(self) -> Optional[dict]:
+        """元数据条件的 Chroma where 表达式，没有条件时返回 None"""
+        conditions = []
+        if self.source:
+            conditions.append({"source": {"$in": list(self.source)}})
+        if self.doc_type:
+            conditions.append({"doc_type": {"$in": list(self.doc_type)}})
+        start, end = self.date_range()
+        if start is not None:
+            conditions.append({"modified_at": {"$gte": start}})
+        if end is not None:
+            conditions.append({"modified_at": {"$lte": end}})
+
+        if not conditions:
+            return None
+        return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+    def to_dict(self) -> dict:
+        return {key: value for key, value in asdict(self).items() if value not in (None, ())}
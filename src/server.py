@@ -0,0 +1,309 @@
+"""HTTP 服务入口（ASGI）
+
+在现有 ChatAgent / VectorStore 之上提供 HTTP 接口：
+
+- POST /chat          普通对话
+- POST /chat/stream   流式对话（NDJSON，每行一个事件）
+- POST /upload        上传并增量入库文档（?tenant= 指定租户）
+- POST /reindex       后台在新集合版本中重建上传目录的索引，完成后切换（检索不中断）
+- GET  /search        向量检索（可按租户、来源、文档类型、日期过滤）
+- GET  /stats         缓存、批处理与各阶段耗时统计
+- GET  /metrics       Prometheus 格式指标
+- GET  /health        健康检查
+
+并发查询的向量编码由 EmbeddingBatcher 合并为批量计算。
+/chat 与 /chat/stream 的 filters 字段、/search 的查询参数限定检索范围（见 search_filters）。
+LLM 后端全部满载且排队已满（或排队超时）时返回 503 + Retry-After；
+重建索引进行中时 /upload 同样立即返回 503 + Retry-After，不在锁上等待重建完成。
+
+启动：
+    python src/server.py
+    # 或
+    uvicorn server:app --app-dir src --host 0.0.0.0 --port 8000
+"""
+
+import asyncio
+import json
+import os
+import shutil
+import uuid
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import List, Optional
+
+from fastapi import FastAPI, File, HTTPException, Query, Request, UploadFile
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+
+from bulk_ingest import SUPPORTED_SUFFIXES, ingest_directory
+from chat_agent import ChatAgent
+from config import Config
+from document_processor import DocumentProcessor
+from ingest_manifest import file_sha256
+from llm_pool import LLMBusyError
+from metrics import metrics
+from query_batcher import EmbeddingBatcher
+from search_filters import SearchFilter, validate_tenant
+from vector_store import VectorStore
+
+
+class FilterRequest(BaseModel):
+    tenant: Optional[str] = None
+    source: Optional[List[str]] = None
+    doc_type: Optional[List[str]] = None
+    date_from: Optional[str] = None
+    date_to: Optional[str] = None
+
+
+class ChatRequest(BaseModel):
+    query: str
+    session_id: Optional[str] = None
+    filters: Optional[FilterRequest] = None
+
+
+def parse_filters(values: Optional[dict]) -> Optional[SearchFilter]:
+    """请求中的过滤条件 → SearchFilter，格式错误返回 400"""
+    try:
+        return SearchFilter.from_dict(values)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+
+def parse_tenant(tenant: Optional[str]) -> Optional[str]:
+    try:
+        return validate_tenant(tenant)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """启动时初始化共享组件（所有会话共用同一个模型与向量库）"""
+    Config.ensure_directories()
+    Config.setup_langsmith()
+
+    vector_store = VectorStore()
+    vector_store.query_batcher = EmbeddingBatcher(
+        vector_store.embeddings,
+        max_batch_size=Config.QUERY_BATCH_SIZE,
+        max_wait_ms=Config.QUERY_BATCH_WAIT_MS,
+    )
+
+    # 服务启动时预热，避免首个请求承担模型加载耗时
+    await asyncio.to_thread(vector_store.warm_up)
+
+    app.state.vector_store = vector_store
+    app.state.chat_agent = ChatAgent(vector_store)
+    if app.state.chat_agent.reranker is not None:
+        await asyncio.to_thread(app.state.chat_agent.reranker.load)
+    app.state.doc_processor = DocumentProcessor()
+    # 入库会修改清单，串行执行
+    app.state.ingest_lock = asyncio.Lock()
+    app.state.reindex_task = None
+    print("✓ 服务初始化完成")
+    yield
+
+
+app = FastAPI(title="聊天机器人 RAG 服务", lifespan=lifespan)
+
+# 客户端收到 503 后稍后重试
+BUSY_RETRY_AFTER = "1"
+
+
+@app.exception_handler(LLMBusyError)
+async def llm_busy_handler(request: Request, exc: LLMBusyError):
+    return JSONResponse(
+        status_code=503, content={"detail": str(exc)}, headers={"Retry-After": BUSY_RETRY_AFTER}
+    )
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
+
+
+@app.post("/chat")
+async def chat(request: ChatRequest):
+    session_id = request.session_id or uuid.uuid4().hex
+    filters = parse_filters(request.filters.model_dump() if request.filters else None)
+    result = await app.state.chat_agent.achat(
+        request.query, session_id=session_id, filters=filters
+    )
+    return {**result, "session_id": session_id}
+
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    session_id = request.session_id or uuid.uuid4().hex
+    filters = parse_filters(request.filters.model_dump() if request.filters else None)
+    # 流式响应发出后无法再改状态码，明显排不上时提前返回 503
+    if app.state.chat_agent.llm.saturated():
+        raise LLMBusyError("LLM 服务繁忙：所有后端均已满载且排队已满")
+
+    async def events():
+        try:
+            async for event in app.state.chat_agent.achat_stream(
+                request.query, session_id=session_id, filters=filters
+            ):
+                if event["type"] == "end":
+                    event = {**event, "session_id": session_id}
+                yield json.dumps(event, ensure_ascii=False) + "\n"
+        except LLMBusyError as e:
+            yield json.dumps({"type": "error", "error": "busy", "detail": str(e)}, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
+@app.post("/upload")
+async def upload(file: UploadFile = File(...), tenant: Optional[str] = None):
+    filename = Path(file.filename or "").name
+    if not filename:
+        raise HTTPException(status_code=400, detail="缺少文件名")
+    if Path(filename).suffix.lower() not in SUPPORTED_SUFFIXES:
+        raise HTTPException(status_code=400, detail=f"不支持的文件格式: {Path(filename).suffix}")
+    tenant = parse_tenant(tenant)
+    _check_not_reindexing()
+
+    upload_dir = Config.upload_dir(tenant)
+    upload_dir.mkdir(parents=True, exist_ok=True)
+    path = upload_dir / filename
+    # 先写入临时文件（后缀不在支持的格式中，重建索引不会读到），持锁后再原子替换到上传目录
+    temp_path = upload_dir / f".{filename}.{uuid.uuid4().hex}.part"
+    try:
+        await asyncio.to_thread(_save_upload, file.file, temp_path)
+        # 检查与加锁之间没有 await：锁按先来先得，此后创建的重建任务会排在本次上传之后
+        _check_not_reindexing()
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+
+    vector_store = app.state.vector_store.for_tenant(tenant)
+    async with app.state.ingest_lock:
+        try:
+            await asyncio.to_thread(os.replace, temp_path, path)
+            file_hash = await asyncio.to_thread(file_sha256, path)
+            if vector_store.is_up_to_date(str(path.resolve()), file_hash):
+                return {"filename": filename, "skipped": True}
+            batch = await asyncio.to_thread(
+                app.state.doc_processor.load_batch, str(path), file_hash
+            )
+            stats = await asyncio.to_thread(vector_store.upsert_batch, batch, file_hash)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e)) from e
+        finally:
+            temp_path.unlink(missing_ok=True)
+
+    return {"filename": filename, "skipped": False, **stats}
+
+
+def _reindex_running() -> bool:
+    task = app.state.reindex_task
+    return task is not None and not task.done()
+
+
+def _check_not_reindexing():
+    """重建索引可能持续很久，期间的上传直接返回 503，而不是占着连接等待锁"""
+    if _reindex_running():
+        raise HTTPException(
+            status_code=503,
+            detail="重建索引正在进行中，请稍后重试",
+            headers={"Retry-After": BUSY_RETRY_AFTER},
+        )
+
+
+def _save_upload(source, target: Path):
+    with open(target, "wb") as out:
+        shutil.copyfileobj(source, out, 1 << 20)
+
+
+@app.post("/reindex", status_code=202)
+async def reindex(tenant: Optional[str] = None):
+    if _reindex_running():
+        raise HTTPException(status_code=409, detail="重建索引正在进行中")
+
+    tenant = parse_tenant(tenant)
+    vector_store = app.state.vector_store.for_tenant(tenant)
+    root = Config.upload_dir(tenant)
+
+    async def run():
+        # 持锁重建：等待进行中的上传完成；重建期间新的上传返回 503（见 _check_not_reindexing）
+        async with app.state.ingest_lock:
+            try:
+                await asyncio.to_thread(
+                    vector_store.rebuild,
+                    lambda staging: ingest_directory(staging, root),
+                )
+            except Exception as e:
+                print(f"✗ 重建索引失败（当前版本不受影响）: {e}")
+
+    app.state.reindex_task = asyncio.create_task(run())
+    return {"status": "started", "tenant": tenant, "active": vector_store.collection_name}
+
+
+@app.get("/search")
+async def search(
+    q: str,
+    k: Optional[int] = None,
+    tenant: Optional[str] = None,
+    source: Optional[List[str]] = Query(None),
+    doc_type: Optional[List[str]] = Query(None),
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+):
+    filters = parse_filters({
+        "tenant": tenant, "source": source, "doc_type": doc_type,
+        "date_from": date_from, "date_to": date_to,
+    })
+    docs = await app.state.vector_store.asimilarity_search(q, k=k, filters=filters)
+    return {
+        "query": q,
+        "results": [
+            {"content": doc.page_content, "metadata": doc.metadata}
+            for doc in docs
+        ],
+    }
+
+
+@app.get("/stats")
+async def stats():
+    vector_store = app.state.vector_store
+    answer_cache = app.state.chat_agent.answer_cache
+    reranker = app.state.chat_agent.reranker
+    condenser = app.state.chat_agent.condenser
+    extraction_cache = app.state.doc_processor.extraction_cache
+    return {
+        "index": vector_store.index_stats(),
+        "collections": {
+            "active": vector_store.collection_name,
+            "reindexing": _reindex_running(),
+            "versions": vector_store.registry.versions(),
+        },
+        "embedding_cache": vector_store.embedding_cache_stats(),
+        "extraction_cache": (
+            await asyncio.to_thread(extraction_cache.stats) if extraction_cache else {}
+        ),
+        "query_batcher": vector_store.query_batcher.stats(),
+        "answer_cache": answer_cache.stats() if answer_cache else {},
+        "rerank": reranker.stats() if reranker else {},
+        "condense": condenser.stats() if condenser else {},
+        "sessions": app.state.chat_agent.sessions.stats(),
+        "llm": app.state.chat_agent.llm.stats(),
+        "latency": metrics.snapshot(),
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    return PlainTextResponse(
+        metrics.render_prometheus(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+def main():
+    import uvicorn
+
+    uvicorn.run(app, host=Config.SERVER_HOST, port=Config.SERVER_PORT)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+"""会话存储模块
+
+按会话 ID 保存对话历史，替代 ChatAgent 中无上限增长的内存字典：
+
+- 每条消息只保存（角色, 内容），写入时裁剪到每个会话最多 max_messages 条
+- 读取时只加载提示词需要的最近几条（HISTORY_MAX_MESSAGES）
+- 超过 idle_ttl 秒未活动的会话被淘汰（写入时顺带检查，最多每分钟一次）；
+  memory 的读写都算活动，sqlite 只有写入算活动
+
+两种实现，由 Config.SESSION_STORE 选择：
+
+- memory：进程内 LRU，会话数超过 max_sessions 时淘汰最久未使用的会话，重启后丢失
+- sqlite：持久化到本地 SQLite（WAL），多个 worker 进程可共用，重启后保留
+"""
+
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from pathlib import Path
+from typing import Deque, List, Optional, Sequence, Tuple
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+
+# 紧凑的消息记录：（角色, 内容），角色 h = 用户，a = 助手
+Record = Tuple[str, str]
+
+# 空闲会话检查的最小间隔（秒）
+_SWEEP_INTERVAL = 60.0
+
+
+def to_record(message: BaseMessage) -> Record:
+    return ("h" if isinstance(message, HumanMessage) else "a", str(message.content))
+
+
+def from_record(record: Record) -> BaseMessage:
+    role, content = record
+    return HumanMessage(content=content) if role == "h" else AIMessage(content=content)
+
+
+class SessionStore(ABC):
+    """会话历史存储接口（线程安全）"""
+
+    backend = "base"
+
+    def __init__(self, max_messages: int, idle_ttl: float):
+        self.max_messages = max(max_messages, 1)
+        self.idle_ttl = idle_ttl
+        self.evicted = 0
+        self._next_sweep = 0.0
+
+    @abstractmethod
+    def load(self, session_id: str, limit: Optional[int] = None) -> List[BaseMessage]:
+        """会话最近的 limit 条消息（按时间顺序），limit 为空时返回保存的全部消息"""
+
+    @abstractmethod
+    def append(self, session_id: str, messages: Sequence[BaseMessage]):
+        """追加消息并裁剪到 max_messages 条"""
+
+    @abstractmethod
+    def clear(self, session_id: str):
+        """删除会话"""
+
+    @abstractmethod
+    def evict_idle(self) -> int:
+        """淘汰空闲超过 idle_ttl 的会话，返回淘汰数"""
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """当前保存的会话数"""
+
+    def close(self):
+        """释放底层资源（默认无需释放）"""
+        return None
+
+    def _maybe_sweep(self):
+        """写入时顺带淘汰空闲会话（限制频率）"""
+        if self.idle_ttl <= 0:
+            return
+        now = time.monotonic()
+        if now < self._next_sweep:
+            return
+        self._next_sweep = now + _SWEEP_INTERVAL
+        self.evict_idle()
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.backend,
+            "sessions": len(self),
+            "max_messages": self.max_messages,
+            "evicted": self.evicted,
+        }
+
+
+class InMemorySessionStore(SessionStore):
+    """进程内 LRU 会话存储"""
+
+    backend = "memory"
+
+    def __init__(self, max_messages: int = 6, max_sessions: int = 10000, idle_ttl: float = 0):
+        super().__init__(max_messages, idle_ttl)
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        # 会话 ID → （消息记录, 最后活动时间），按最近使用排序；读写都刷新时间，
+        # 顺序与时间一致，evict_idle 可以从最旧的一端检查到第一个活跃会话为止
+        self._sessions: "OrderedDict[str, Tuple[Deque[Record], float]]" = OrderedDict()
+
+    def load(self, session_id: str, limit: Optional[int] = None) -> List[BaseMessage]:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return []
+            self._sessions[session_id] = (entry[0], time.time())
+            self._sessions.move_to_end(session_id)
+            records = list(entry[0])
+        if limit is not None:
+            records = records[-limit:] if limit > 0 else []
+        return [from_record(record) for record in records]
+
+    def append(self, session_id: str, messages: Sequence[BaseMessage]):
+        with self._lock:
+            entry = self._sessions.pop(session_id, None)
+            records = entry[0] if entry else deque(maxlen=self.max_messages)
+            records.extend(to_record(message) for message in messages)
+            self._sessions[session_id] = (records, time.time())
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evicted += 1
+        self._maybe_sweep()
+
+    def clear(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def evict_idle(self) -> int:
+        if self.idle_ttl <= 0:
+            return 0
+        deadline = time.time() - self.idle_ttl
+        with self._lock:
+            # 按最近使用排序，从最旧的一端检查
+            idle = []
+            for session_id, (_, last_active) in self._sessions.items():
+                if last_active >= deadline:
+                    break
+                idle.append(session_id)
+            for session_id in idle:
+                del self._sessions[session_id]
+            self.evicted += len(idle)
+        return len(idle)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+class SqliteSessionStore(SessionStore):
+    """SQLite 持久化会话存储"""
+
+    backend = "sqlite"
+
+    def __init__(self, path: Path, max_messages: int = 6, idle_ttl: float = 0):
+        super().__init__(max_messages, idle_ttl)
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY, updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_sessions_updated ON sessions(updated_at);
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_messages_session ON messages(session_id, id);
+            """
+        )
+        self._conn.commit()
+
+    def load(self, session_id: str, limit: Optional[int] = None) -> List[BaseMessage]:
+        limit = self.max_messages if limit is None else min(limit, self.max_messages)
+        if limit <= 0:
+            return []
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT role, content FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT ?",
+                (session_id, limit),
+            ).fetchall()
+        return [from_record(row) for row in reversed(rows)]
+
+    def append(self, session_id: str, messages: Sequence[BaseMessage]):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO messages (session_id, role, content) VALUES (?, ?, ?)",
+                [(session_id, *to_record(message)) for message in messages],
+            )
+            # 只保留最近 max_messages 条
+            self._conn.execute(
+                """
+                DELETE FROM messages WHERE session_id = ? AND id <= (
+                    SELECT id FROM messages WHERE session_id = ?
+                    ORDER BY id DESC LIMIT 1 OFFSET ?
+                )
+                """,
+                (session_id, session_id, self.max_messages),
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, updated_at) VALUES (?, ?)",
+                (session_id, time.time()),
+            )
+            self._conn.commit()
+        self._maybe_sweep()
+
+    def clear(self, session_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            self._conn.commit()
+
+    def evict_idle(self) -> int:
+        if self.idle_ttl <= 0:
+            return 0
+        deadline = time.time() - self.idle_ttl
+        with self._lock:
+            self._conn.execute(
+                """
+                DELETE FROM messages WHERE session_id IN (
+                    SELECT session_id FROM sessions WHERE updated_at < ?
+                )
+                """,
+                (deadline,),
+            )
+            count = self._conn.execute(
+                "DELETE FROM sessions WHERE updated_at < ?", (deadline,)
+            ).rowcount
+            self._conn.commit()
+        self.evicted += count
+        return count
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def create_session_store(
+    backend: str,
+    max_messages: int,
+    max_sessions: int = 10000,
+    idle_ttl: float = 0,
+    path: Optional[Path] = None,
+) -> SessionStore:
+    """按名称创建会话存储（memory / sqlite）"""
+    if backend == "memory":
+        return InMemorySessionStore(max_messages, max_sessions=max_sessions, idle_ttl=idle_ttl)
+    if backend == "sqlite":
+        if path is None:
+            raise ValueError("sqlite 会话存储需要指定数据库路径")
+        return SqliteSessionStore(path, max_messages, idle_ttl=idle_ttl)
+    raise ValueError(f"不支持的会话存储: {backend}（可选 memory / sqlite）")
@@ -0,0 +1,269 @@
+"""结构化文本提取模块
+
+直接遍历 Markdown / DOCX 的文档结构提取纯文本，不经过 HTML 渲染：
+
+- 标题：维护标题栈，每个标题开始一个新章节，章节路径为各级标题以 " > " 连接
+  （如 "部署指南 > 网关 > 限流"），标题本身作为章节正文的第一行保留
+- 列表：统一为 "- 内容"（有序列表保留序号），嵌套层级以缩进表示
+- 表格：每行一段，单元格以 " | " 分隔，去掉 Markdown 的分隔行与 DOCX 合并单元格的重复内容
+- 代码块：原样保留，块内的 # 与 | 不会被误认为标题或表格
+- Markdown 行内标记（强调、行内代码、链接、图片、HTML 标签）只保留文字
+
+提取结果为按文档顺序的（章节路径, 章节文本）序列，DocumentProcessor 据此按章节边界分段，
+并把章节路径写入片段元数据（section_path）。
+"""
+
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+# （章节路径, 章节文本）；第一个标题之前的内容章节路径为空字符串
+Section = Tuple[str, str]
+
+SECTION_SEPARATOR = " > "
+
+# ================================
+# Markdown
+# ================================
+_ATX_HEADING = re.compile(r"^ {0,3}(#{1,6})(?:[ \t]+(.*?))?(?:[ \t]+#+)?[ \t]*$")
+_SETEXT_UNDERLINE = re.compile(r"^ {0,3}(=+|-+)[ \t]*$")
+_FENCE = re.compile(r"^ {0,3}(`{3,}|~{3,})")
+_THEMATIC_BREAK = re.compile(r"^ {0,3}([-*_])(?:[ \t]*\1){2,}[ \t]*$")
+_LIST_ITEM = re.compile(r"^([ \t]*)([-*+]|\d{1,9}[.)])[ \t]+(.*)$")
+_BLOCKQUOTE = re.compile(r"^ {0,3}>[ \t]?")
+_TABLE_DELIMITER = re.compile(r"^[ \t]*\|?[ \t]*:?-+:?[ \t]*(\|[ \t]*:?-+:?[ \t]*)*\|?[ \t]*$")
+_LINK_DEFINITION = re.compile(r"^ {0,3}\[[^\]]+\]:[ \t]*\S+")
+_TABLE_CELL_SPLIT = re.compile(r"(?<!\\)\|")
+
+_INLINE_RULES = [
+    (re.compile(r"!\[([^\]]*)\]\([^)]*\)"), r"\1"),          # 图片：保留替代文字
+    (re.compile(r"\[([^\]]+)\]\([^)]*\)"), r"\1"),           # 行内链接
+    (re.compile(r"\[([^\]]+)\]\[[^\]]*\]"), r"\1"),          # 引用式链接
+    (re.compile(r"(`+)(.+?)\1"), r"\2"),                     # 行内代码
+    (re.compile(r"(\*\*|__)(?=\S)(.+?)(?<=\S)\1"), r"\2"),   # 粗体
+    (re.compile(r"(?<![\w*])\*(?=\S)(.+?)(?<=\S)\*"), r"\1"),  # 斜体
+    (re.compile(r"(?<!\w)_(?=\S)(.+?)(?<=\S)_(?!\w)"), r"\1"),  # 斜体（避开 snake_case）
+    (re.compile(r"~~(.+?)~~"), r"\1"),                       # 删除线
+    (re.compile(r"<[^>\n]+>"), ""),                          # HTML 标签
+    (re.compile(r"\\([\\`*_{}\[\]()#+\-.!|>~])"), r"\1"),     # 转义字符
+]
+
+
+def _inline(text: str) -> str:
+    """去掉行内标记，只保留文字"""
+    for pattern, replacement in _INLINE_RULES:
+        text = pattern.sub(replacement, text)
+    return text.strip()
+
+
+def _table_row(line: str) -> str:
+    cells = _TABLE_CELL_SPLIT.split(line.strip().strip("|"))
+    return " | ".join(_inline(cell) for cell in cells)
+
+
+class _SectionBuilder:
+    """按标题栈累积章节"""
+
+    def __init__(self):
+        self.sections: List[Section] = []
+        self._headings: List[Tuple[int, str]] = []
+        self._lines: List[str] = []
+
+    def heading(self, level: int, title: str):
+        self.flush()
+        while self._headings and self._headings[-1][0] >= level:
+            self._headings.pop()
+        if title:
+            self._headings.append((level, title))
+            self._lines.append(title)
+
+    def line(self, text: str):
+        self._lines.append(text)
+
+    def pop_line(self) -> str:
+        return self._lines.pop()
+
+    def flush(self):
+        text = re.sub(r"\n{3,}", "\n\n", "\n".join(self._lines)).strip()
+        self._lines = []
+        if text:
+            path = SECTION_SEPARATOR.join(title for _, title in self._headings)
+            self.sections.append((path, text))
+
+
+def markdown_sections(text: str) -> List[Section]:
+    """单遍扫描 Markdown 文本，返回按章节的纯文本"""
+    lines = text.splitlines()
+    builder = _SectionBuilder()
+    fence: Optional[str] = None
+    in_table = False
+    # 上一行是否为普通段落文字（Setext 标题的下划线只跟在段落后面）
+    after_paragraph = False
+    start = 0
+
+    # 跳过 YAML front matter
+    if lines and lines[0].strip() == "---":
+        for index in range(1, len(lines)):
+            if lines[index].strip() in ("---", "..."):
+                start = index + 1
+                break
+
+    for index in range(start, len(lines)):
+        line = lines[index]
+        if fence is not None:
+            if line.strip().startswith(fence):
+                fence = None
+                builder.line("")
+            else:
+                builder.line(line.rstrip())
+            continue
+
+        line = _BLOCKQUOTE.sub("", line)
+        match = _FENCE.match(line)
+        if match:
+            fence = match.group(1)
+            builder.line("")
+            after_paragraph = in_table = False
+            continue
+
+        if not line.strip():
+            builder.line("")
+            after_paragraph = in_table = False
+            continue
+
+        match = _SETEXT_UNDERLINE.match(line)
+        if match and after_paragraph:
+            builder.heading(1 if match.group(1)[0] == "=" else 2, builder.pop_line())
+            after_paragraph = False
+            continue
+
+        match = _ATX_HEADING.match(line)
+        if match:
+            builder.heading(len(match.group(1)), _inline(match.group(2) or ""))
+            after_paragraph = in_table = False
+            continue
+
+        if _THEMATIC_BREAK.match(line) or _LINK_DEFINITION.match(line):
+            builder.line("")
+            after_paragraph = False
+            continue
+
+        if not in_table and "|" in line and index + 1 < len(lines):
+            following = lines[index + 1]
+            in_table = "|" in following and bool(_TABLE_DELIMITER.match(following))
+        if in_table:
+            if not _TABLE_DELIMITER.match(line):
+                builder.line(_table_row(line))
+            after_paragraph = False
+            continue
+
+        match = _LIST_ITEM.match(line)
+        if match:
+            indent, marker, content = match.groups()
+            marker = "-" if marker in "-*+" else marker
+            depth = len(indent.expandtabs(4)) // 2
+            builder.line(f"{'  ' * depth}{marker} {_inline(content)}")
+            after_paragraph = False
+            continue
+
+        builder.line(_inline(line))
+        after_paragraph = True
+
+    builder.flush()
+    return builder.sections
+
+
+# ================================
+# DOCX
+# ================================
+_HEADING_STYLE = re.compile(r"^(?:heading|标题)\s*(\d)$", re.IGNORECASE)
+
+
+def _docx_heading_level(paragraph, style: str) -> Optional[int]:
+    """段落的标题级别（Title 样式视为 0 级），非标题返回 None；style 为小写的样式名
+
+    大纲级别 w:outlineLvl 的 0-8 对应 1-9 级标题，9 表示正文。
+    """
+    if style == "title":
+        return 0
+    match = _HEADING_STYLE.match(style)
+    if match:
+        return int(match.group(1))
+    p_pr = paragraph._p.pPr
+    outline = p_pr.find(_qn("w:outlineLvl")) if p_pr is not None else None
+    if outline is not None:
+        value = outline.get(_qn("w:val"))
+        if value is not None and value.isdigit() and int(value) <= 8:
+            return int(value) + 1
+    return None
+
+
+def _docx_is_list_item(paragraph, style: str) -> bool:
+    p_pr = paragraph._p.pPr
+    return style.startswith("list") or (p_pr is not None and p_pr.numPr is not None)
+
+
+def _docx_table_rows(table) -> List[str]:
+    """表格的每一行（合并单元格只保留一次）"""
+    rows = []
+    for row in table.rows:
+        cells, previous = [], None
+        for cell in row.cells:
+            if cell._tc is previous:
+                continue
+            previous = cell._tc
+            cells.append(" ".join(p.text.strip() for p in cell.paragraphs if p.text.strip()))
+        if any(cells):
+            rows.append(" | ".join(cells))
+    return rows
+
+
+def _qn(tag: str) -> str:
+    from docx.oxml.ns import qn
+
+    return qn(tag)
+
+
+def docx_sections(path: Path) -> List[Section]:
+    """按文档顺序遍历 Word 的段落与表格，返回按章节的纯文本"""
+    from docx import Document
+    from docx.table import Table
+
+    doc = Document(str(path))
+    styles = doc.styles.element
+    # 样式 ID -> 小写的样式名，每个 ID 只查找一次（paragraph.style 每次都会遍历整个样式表）
+    style_names: Dict[str, str] = {}
+
+    def style_name(paragraph) -> str:
+        style_id = paragraph._p.style
+        if not style_id:
+            return ""
+        if style_id not in style_names:
+            style = styles.get_by_id(style_id)
+            style_names[style_id] = (style.name_val or "").lower() if style is not None else ""
+        return style_names[style_id]
+
+    builder = _SectionBuilder()
+    for block in doc.iter_inner_content():
+        if isinstance(block, Table):
+            builder.line("")
+            for row in _docx_table_rows(block):
+                builder.line(row)
+            builder.line("")
+            continue
+
+        text = block.text.strip()
+        if not text:
+            continue
+        style = style_name(block)
+        level = _docx_heading_level(block, style)
+        if level is not None:
+            builder.heading(level, text)
+        elif _docx_is_list_item(block, style):
+            builder.line(f"- {text}")
+        else:
+            builder.line("")
+            builder.line(text)
+
+    builder.flush()
+    return builder.sections
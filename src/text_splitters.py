@@ -0,0 +1,164 @@
+"""分段器模块
+
+通过 Config.TEXT_SPLITTER 选择：
+
+- chars：RecursiveCharacterTextSplitter，按字符数分段（CHUNK_SIZE / CHUNK_OVERLAP），默认
+- tokens：SentenceTokenSplitter，按 embedding 模型分词器的 token 数分段，
+  片段上限为 CHUNK_TOKENS 且不超过模型的最大序列长度（超出部分编码时会被截断、不参与检索），
+  片段在句子边界结束（中文句末标点、英文句点后的空白、换行），重叠以整句计（CHUNK_OVERLAP_TOKENS）；
+  句子按各自的 token 数装入片段后，再对拼接后的片段整体计数，超出上限（拼接处分词不同）时按实测重新装入
+
+同样的字符数下中文的 token 数远多于英文，按字符分段时各片段的 token 数差异很大；
+按 token 分段使每个片段都恰好能被模型完整编码。
+"""
+
+import re
+from typing import Callable, List, Sequence, Tuple
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from config import Config
+
+# 句子结尾：中文 / 全角句末标点、省略号、英文句末标点后接空白、换行；
+# 其后的闭合引号与括号、空白都归入前一句，各句拼接后与原文完全一致
+_SENTENCE_END = re.compile(
+    r"(?:[。！？；]+|…+|[.!?;](?=\s)|\n+)[”’\"'」』）)\]]*[ \t　]*\n*"
+)
+
+# 按文本批量返回 token 数
+TokenLengths = Callable[[List[str]], List[int]]
+
+
+def split_sentences(text: str) -> List[str]:
+    """按句子边界切分（保留标点与空白，拼接后等于原文）"""
+    sentences, start = [], 0
+    for match in _SENTENCE_END.finditer(text):
+        if match.end() > start:
+            sentences.append(text[start:match.end()])
+            start = match.end()
+    if start < len(text):
+        sentences.append(text[start:])
+    return sentences
+
+
+class SentenceTokenSplitter:
+    """按 token 数把句子装入片段（与 RecursiveCharacterTextSplitter 一样提供 split_text）"""
+
+    def __init__(self, token_lengths: TokenLengths, chunk_size: int, chunk_overlap: int = 0):
+        if chunk_size <= 0:
+            raise ValueError(f"片段 token 上限必须为正数: {chunk_size}")
+        self.token_lengths = token_lengths
+        self.chunk_size = chunk_size
+        # 重叠至多为片段上限的一半，避免相邻片段几乎相同
+        self.chunk_overlap = min(max(chunk_overlap, 0), chunk_size // 2)
+
+    def length(self, text: str) -> int:
+        return self.token_lengths([text])[0]
+
+    def split_text(self, text: str) -> List[str]:
+        pieces: List[str] = []
+        lengths: List[int] = []
+        sentences = split_sentences(text)
+        for sentence, length in zip(sentences, self.token_lengths(sentences), strict=True):
+            if length > self.chunk_size:
+                # 超长的句子（表格、代码、无标点的长段落）在上限处硬切
+                for part in self._hard_split(sentence):
+                    pieces.append(part)
+                    lengths.append(self.length(part))
+            else:
+                pieces.append(sentence)
+                lengths.append(length)
+
+        groups = self._pack(lengths)
+        if not groups:
+            return []
+        texts = ["".join(pieces[i] for i in group).strip() for group in groups]
+        chunks: List[str] = []
+        for text, length, group in zip(texts, self.token_lengths(texts), groups, strict=True):
+            if length <= self.chunk_size:
+                chunks.append(text)
+            else:
+                chunks.extend(self._refit(pieces, group))
+        return [chunk for chunk in chunks if chunk]
+
+    def _pack(self, lengths: Sequence[int]) -> List[List[int]]:
+        """依次装入句子，超过上限时开始新片段，并带上前一片段末尾不超过重叠上限的整句；
+        返回每个片段包含的句子下标"""
+        groups: List[List[int]] = []
+        current: List[int] = []
+        total = 0
+        for index, length in enumerate(lengths):
+            if current and total + length > self.chunk_size:
+                groups.append(current)
+                carried, carried_total = [], 0
+                for i in reversed(current):
+                    if carried_total + lengths[i] > self.chunk_overlap:
+                        break
+                    carried.insert(0, i)
+                    carried_total += lengths[i]
+                # 带上的句子与新句子放不下时不再重叠
+                if carried_total + length > self.chunk_size:
+                    carried, carried_total = [], 0
+                current, total = carried, carried_total
+            current.append(index)
+            total += length
+        if current:
+            groups.append(current)
+        return groups
+
+    def _refit(self, pieces: Sequence[str], group: Sequence[int]) -> List[str]:
+        """整体计数超出上限的片段：按拼接后的实测 token 数重新装入（不再带重叠）"""
+        def join(indices: Sequence[int]) -> str:
+            return "".join(pieces[i] for i in indices).strip()
+
+        chunks: List[str] = []
+        current: List[int] = []
+        for index in group:
+            if current and self.length(join(current + [index])) > self.chunk_size:
+                chunks.append(join(current))
+                current = []
+            current.append(index)
+        if current:
+            chunks.append(join(current))
+        return chunks
+
+    def _hard_split(self, text: str) -> List[str]:
+        """二分查找不超过上限的最长前缀，依次切出"""
+        parts = []
+        while text:
+            if self.length(text) <= self.chunk_size:
+                parts.append(text)
+                break
+            low, high = 1, len(text) - 1
+            while low < high:
+                mid = (low + high + 1) // 2
+                if self.length(text[:mid]) <= self.chunk_size:
+                    low = mid
+                else:
+                    high = mid - 1
+            parts.append(text[:low])
+            text = text[low:]
+        return parts
+
+
+def create_text_splitter() -> Tuple[object, Callable[[str], int], int]:
+    """按配置创建分段器，返回（分段器, 长度函数, 片段上限），长度单位为字符或 token"""
+    if Config.TEXT_SPLITTER == "tokens":
+        from embedding_backends import TokenCounter, embedding_max_seq_length
+
+        # 模型编码时会加上首尾两个特殊 token
+        limit = embedding_max_seq_length() - 2
+        chunk_size = min(Config.CHUNK_TOKENS, limit) if Config.CHUNK_TOKENS > 0 else limit
+        splitter = SentenceTokenSplitter(
+            TokenCounter().lengths, chunk_size, Config.CHUNK_OVERLAP_TOKENS
+        )
+        return splitter, splitter.length, chunk_size
+    if Config.TEXT_SPLITTER != "chars":
+        raise ValueError(f"不支持的分段方式: {Config.TEXT_SPLITTER}")
+
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=Config.CHUNK_SIZE,
+        chunk_overlap=Config.CHUNK_OVERLAP,
+        length_function=len,
+    )
+    return splitter, len, Config.CHUNK_SIZE
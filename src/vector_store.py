@@ -1,15 +1,50 @@
-"""向量存储模块（兼容 LangChain 2025 最新版本）"""
+"""向量存储模块（兼容 LangChain 2025 最新版本）
 
+embedding 模型与向量库均按需初始化：构造 VectorStore 不加载模型、不导入 chromadb，
+首次检索 / 入库时才加载，也可调用 warm_up() 提前预热。
+
+向量索引后端由 Config.VECTOR_BACKEND 选择：
+
+- chroma：Chroma（HNSW），M / ef_construction / ef_search / 距离度量由 Config 配置
+- numpy：进程内 flat / IVF 索引（NumpyVectorIndex），向量以 float32 / float16 内存映射
+
+集合按版本管理（collection_versions.CollectionRegistry）：clear / rebuild / restore 在新版本中构建，
+完成后原子切换生效版本，旧版本保留用于回滚并延迟删除；其他进程在检查指针时自动跟随。
+
+多租户：每个租户是一个独立的逻辑集合（``<COLLECTION_NAME>-<tenant>``，各自有版本与入库清单），
+for_tenant() 返回共用 embedding 的租户 VectorStore，检索开销只与该租户的数据量有关。
+检索的元数据条件（来源、文档类型、日期）以 where 表达式交给向量索引过滤，而不是检索后再筛选。
+"""
+
+import asyncio
+import copy
 import os
 import shutil
-from typing import List, Optional
+import threading
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
 
-from langchain_chroma import Chroma
-# from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
 
+from chunk_batch import ChunkBatch
+from collection_versions import (
+    CollectionRegistry,
+    iter_snapshot_pages,
+    read_snapshot_info,
+    write_snapshot,
+)
 from config import Config
+from embedding_backends import LazyEmbeddings, create_embeddings, embedding_model_id
+from embedding_cache import CachedEmbeddings
+from ingest_manifest import IngestManifest, make_chunk_ids, source_key
+from lexical_index import LexicalIndex
+from metrics import metrics
+from search_filters import SearchFilter, validate_tenant
+
+if TYPE_CHECKING:
+    from langchain_core.vectorstores import VectorStore as LangChainVectorStore
 
 # 禁用 LangChain Telemetry（可选）
 os.environ["LANGCHAIN_TELEMETRY"] = "false"
@@ -18,53 +53,224 @@ os.environ["LANGCHAIN_TELEMETRY"] = "false"
 class VectorStore:
     """向量存储管理器"""
 
-    def __init__(self):
-        # 本地 embedding 模型（离线）
-        # 优先使用本地模型，如果不存在则从 HuggingFace 下载
-        local_model_path = Config.BASE_DIR / "model" / "paraphrase-multilingual-MiniLM-L12-v2"
-        
-        if local_model_path.exists():
-            model_name = str(local_model_path)
-            print(f"✓ 使用本地 Embedding 模型: {model_name}")
+    def __init__(
+        self,
+        embeddings: Optional[Embeddings] = None,
+        collection_name: Optional[str] = None,
+        tenant: Optional[str] = None,
+    ):
+        # Embedding 后端（huggingface / onnx），由 Config.EMBEDDING_BACKEND 选择，首次编码时加载；
+        # 也可直接传入 Embeddings 实例（基准测试使用离线哈希向量）
+        if embeddings is None:
+            embeddings = LazyEmbeddings(lambda: create_embeddings()[0])
+            model_id = embedding_model_id()
         else:
-            model_name = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
-            print(f"ℹ 本地模型不存在，将从 HuggingFace 下载: {model_name}")
-        
-        self.embeddings = HuggingFaceEmbeddings(
-            model_name=model_name,
-            model_kwargs={"device": "cpu"},
-            encode_kwargs={"normalize_embeddings": True},
+            model_id = type(embeddings).__name__
+        self.model_id = model_id
+        self.base_embeddings = embeddings
+        self.embeddings = embeddings
+
+        # 持久化 embedding 缓存：入库与检索共用，避免重复计算
+        self.embedding_cache: Optional[CachedEmbeddings] = None
+        if Config.EMBEDDING_CACHE_ENABLED:
+            self.embedding_cache = CachedEmbeddings(
+                self.embeddings,
+                model_id=model_id,
+                cache_path=Config.CACHE_DIR / "embeddings.sqlite3",
+                max_entries=Config.EMBEDDING_CACHE_MAX_ENTRIES,
+            )
+            self.embeddings = self.embedding_cache
+
+        # 服务端可挂载查询微批处理器（EmbeddingBatcher），供异步检索合并编码
+        self.query_batcher = None
+
+        # 向量库在首次访问 vectorstore 时打开
+        self._vectorstore: Optional["LangChainVectorStore"] = None
+        self._vectorstore_lock = threading.RLock()
+        # 当前生效的 HNSW ef_search（重新打开集合时沿用）
+        self._ef_search = Config.HNSW_EF_SEARCH
+
+        # 各租户的 VectorStore（由默认租户的实例统一创建与缓存）
+        self._root = self
+        self._tenants: Dict[str, "VectorStore"] = {}
+        self._tenants_lock = threading.Lock()
+        self._use_tenant(tenant, collection_name)
+
+    def _use_tenant(self, tenant: Optional[str], collection_name: Optional[str] = None):
+        """选择租户（逻辑集合）
+
+        指定 collection_name 时固定使用该版本（如构建中的新版本），否则跟随生效版本。
+        """
+        self.tenant = validate_tenant(tenant)
+        self.logical_name = (
+            f"{Config.COLLECTION_NAME}-{self.tenant}" if self.tenant else Config.COLLECTION_NAME
+        )
+        self.registry = CollectionRegistry(
+            Config.VECTOR_DB_DIR / f"{self.logical_name}.versions.json", self.logical_name
         )
+        self._pinned = collection_name is not None
+        self._next_pointer_check = 0.0
+        self._bind(collection_name or self.registry.active())
 
-        self.vectorstore: Optional[Chroma] = None
-        self._load_or_create_vectorstore()
+    def _bind(self, name: str):
+        """绑定到物理集合 name：入库清单与词法索引按版本分开保存"""
+        self.collection_name = name
+        self.manifest = IngestManifest(Config.MANIFEST_DIR / f"{name}.json")
+
+        # 词法倒排索引（BM25），随入库增量更新，供混合检索使用
+        self.lexical_index: Optional[LexicalIndex] = None
+        if Config.LEXICAL_INDEX_ENABLED:
+            self.lexical_index = LexicalIndex(Config.LEXICAL_INDEX_DIR / f"{name}.sqlite3")
+
+    @property
+    def vectorstore(self) -> "LangChainVectorStore":
+        """向量库（Chroma 或 NumpyVectorIndex，首次访问时打开）"""
+        if not self._pinned:
+            self._follow_active()
+        if self._vectorstore is None:
+            with self._vectorstore_lock:
+                if self._vectorstore is None:
+                    self._load_or_create_vectorstore()
+                    self._sync_lexical_index()
+        return self._vectorstore
+
+    def warm_up(self):
+        """预先打开向量库并加载 embedding 模型，避免首次请求承担初始化耗时"""
+        _ = self.vectorstore
+        if isinstance(self.base_embeddings, LazyEmbeddings):
+            self.base_embeddings.load()
+        # 顺带删除上次运行后已过期的旧版本
+        self.collect_garbage()
 
     def _load_or_create_vectorstore(self):
         """加载或创建向量存储"""
+        if Config.VECTOR_BACKEND == "numpy":
+            from numpy_index import NumpyVectorIndex
+
+            self._vectorstore = NumpyVectorIndex(
+                Config.VECTOR_DB_DIR / "numpy" / self.collection_name,
+                embedding_function=self.embeddings,
+                space=Config.VECTOR_SPACE,
+                dtype=Config.NUMPY_INDEX_DTYPE,
+                nlist=Config.NUMPY_IVF_NLIST,
+                nprobe=Config.NUMPY_IVF_NPROBE,
+            )
+            print(f"✓ 向量库已加载（numpy），文档片段数量：{self._count_docs()}")
+            return
+        if Config.VECTOR_BACKEND != "chroma":
+            raise ValueError(f"不支持的向量索引后端: {Config.VECTOR_BACKEND}")
+
+        from langchain_chroma import Chroma
 
+        # HNSW 构建参数只在新建集合时生效
+        collection_metadata = {
+            "hnsw:space": Config.VECTOR_SPACE,
+            "hnsw:M": Config.HNSW_M,
+            "hnsw:construction_ef": Config.HNSW_EF_CONSTRUCTION,
+            "hnsw:search_ef": Config.HNSW_EF_SEARCH,
+        }
         try:
-            self.vectorstore = Chroma(
-                collection_name="rag_store",
+            self._vectorstore = Chroma(
+                collection_name=self.collection_name,
                 persist_directory=str(Config.VECTOR_DB_DIR),
                 embedding_function=self.embeddings,
+                collection_metadata=collection_metadata,
             )
             print(f"✓ 向量库已加载，文档片段数量：{self._count_docs()}")
         except Exception as e:
             print(f"向量库加载失败，重新创建: {e}")
-            self.vectorstore = Chroma(
-                collection_name="rag_store",
+            self._vectorstore = Chroma(
+                collection_name=self.collection_name,
                 persist_directory=str(Config.VECTOR_DB_DIR),
                 embedding_function=self.embeddings,
+                collection_metadata=collection_metadata,
             )
+        # 已有集合沿用创建时的参数，ef_search 可以随时调整
+        self.set_search_params(ef_search=self._ef_search)
+
+    def set_search_params(self, ef_search: Optional[int] = None, nprobe: Optional[int] = None):
+        """调整检索参数：Chroma 的 HNSW ef_search，numpy 后端的 IVF nprobe"""
+        store = self.vectorstore
+        if self._is_numpy_backend():
+            if nprobe is not None:
+                store.nprobe = nprobe
+            return
+        if ef_search is None:
+            return
+        self._ef_search = ef_search
+        collection = store._collection
+        try:
+            current = (collection.configuration or {}).get("hnsw", {}).get("ef_search")
+            if current == ef_search:
+                return
+            collection.modify(configuration={"hnsw": {"ef_search": ef_search}})
+        except Exception as e:
+            # 旧版 chromadb 不支持修改已有集合的配置
+            print(f"ℹ 无法调整 HNSW ef_search，沿用集合创建时的设置: {e}")
+            return
+
+        # 已加载的 HNSW 段会继续使用旧的 ef_search，需要重新打开客户端才能生效
+        from chromadb.api.client import SharedSystemClient
+
+        with self._vectorstore_lock:
+            SharedSystemClient.clear_system_cache()
+            self._vectorstore = None
+            self._load_or_create_vectorstore()
+
+    def _is_numpy_backend(self) -> bool:
+        from numpy_index import NumpyVectorIndex
+
+        return isinstance(self.vectorstore, NumpyVectorIndex)
+
+    def _collection(self):
+        """底层集合：Chroma 的 collection，或 NumpyVectorIndex 本身
+
+        NumpyVectorIndex 提供与 collection 相同的 upsert / delete / update / get / count。
+        """
+        store = self.vectorstore
+        return store if self._is_numpy_backend() else store._collection
+
+    def _max_batch_size(self) -> int:
+        if self._is_numpy_backend():
+            return Config.WRITE_BATCH_SIZE
+        return self.vectorstore._client.get_max_batch_size()
+
+    def index_stats(self) -> dict:
+        """向量索引的后端与参数"""
+        if self._is_numpy_backend():
+            stats = self.vectorstore.stats()
+            return {"backend": "numpy", "collection": self.collection_name, **stats}
+        configuration = getattr(self.vectorstore._collection, "configuration", None) or {}
+        return {
+            "backend": "chroma",
+            "collection": self.collection_name,
+            "count": self._count_docs(),
+            **configuration.get("hnsw", {}),
+        }
 
     def _count_docs(self) -> int:
         """更安全的统计方法"""
         try:
-            col = self.vectorstore._client.get_collection("rag_store")
-            return col.count()
+            return self._collection().count()
         except:
             return 0
 
+    def _sync_lexical_index(self, page_size: int = 1000):
+        """词法索引为空而向量库已有数据时（如首次启用），从向量库重建"""
+        if self.lexical_index is None or self.lexical_index.count() > 0:
+            return
+        total = self._count_docs()
+        if not total:
+            return
+
+        print(f"ℹ 正在从向量库重建词法索引（{total} 个片段）...")
+        collection = self._collection()
+        for offset in range(0, total, page_size):
+            batch = collection.get(include=["documents"], limit=page_size, offset=offset)
+            self.lexical_index.add(batch["ids"], batch["documents"])
+        print("✓ 词法索引已重建")
+
+    @metrics.timed("add_documents")
     def add_documents(self, documents: List[Document]) -> List[str]:
         """添加文档到向量库"""
         if not documents:
@@ -72,27 +278,495 @@ class VectorStore:
 
         ids = self.vectorstore.add_documents(documents)
         # self.vectorstore.persist()
+        if self.lexical_index is not None:
+            self.lexical_index.add(ids, [doc.page_content for doc in documents])
 
         print(f"✓ 已添加 {len(documents)} 个文档片段（当前总数：{self._count_docs()}）")
+        if self.embedding_cache is not None:
+            stats = self.embedding_cache.stats()
+            print(f"ℹ Embedding 缓存：命中 {stats['hits']}，未命中 {stats['misses']}")
         return ids
 
-    def similarity_search(self, query: str, k: int = None) -> List[Document]:
-        """相似度搜索"""
+    def is_up_to_date(self, source_path: str, file_hash: str) -> bool:
+        """来源文件内容未变化时返回 True，可跳过解析与入库"""
+        return self.manifest.file_hash(source_path) == file_hash
+
+    def upsert_documents(self, documents: List[Document], file_hash: Optional[str] = None) -> dict:
+        """增量入库：只写入新增片段，删除已从文件中消失的片段
+
+        片段 ID 由来源路径 + 内容确定性生成，重复上传同一文件不会产生重复条目。
+        """
+        stats = {"added": 0, "removed": 0, "unchanged": 0}
+        if not documents:
+            return stats
+
+        # 按来源分组
+        groups = {}
+        for doc in documents:
+            groups.setdefault(source_key(doc.metadata), []).append(doc)
+
+        for source, docs in groups.items():
+            self._upsert_source(
+                source, [doc.page_content for doc in docs],
+                lambda index, docs=docs: docs[index].metadata, file_hash, stats,
+            )
+        return self._finish_upsert(stats)
+
+    def upsert_batch(self, batch: ChunkBatch, file_hash: Optional[str] = None) -> dict:
+        """增量入库一个文件的列式片段批次（只为需要写入的片段生成元数据）"""
+        stats = {"added": 0, "removed": 0, "unchanged": 0}
+        if not len(batch):
+            return stats
+        self._upsert_source(batch.source, batch.texts, batch.chunk_metadata, file_hash, stats)
+        return self._finish_upsert(stats)
+
+    def _upsert_source(
+        self,
+        source: str,
+        texts: List[str],
+        metadata_at: Callable[[int], dict],
+        file_hash: Optional[str],
+        stats: dict,
+    ):
+        """对比清单后写入一个来源文件的新增片段、删除消失的片段"""
+        ids, new_ids, removed_ids = self.plan_upsert(source, texts)
+        new_indices = [index for index, doc_id in enumerate(ids) if doc_id in new_ids]
+        kept = [(doc_id, metadata_at(index)) for index, doc_id in enumerate(ids)
+                if doc_id not in new_ids]
+        new_texts = [texts[index] for index in new_indices]
+
+        self.write_chunks(
+            ids=[ids[index] for index in new_indices],
+            texts=new_texts,
+            metadatas=[metadata_at(index) for index in new_indices],
+            embeddings=self.embed_documents(new_texts) if new_texts else [],
+            delete_ids=removed_ids,
+            kept=kept,
+        )
+
+        self.manifest.update(source, ids, file_hash=file_hash)
+        stats["added"] += len(new_indices)
+        stats["removed"] += len(removed_ids)
+        stats["unchanged"] += len(kept)
+
+    def _finish_upsert(self, stats: dict) -> dict:
+        self.manifest.save()
+        print(
+            f"✓ 增量入库：新增 {stats['added']}，删除 {stats['removed']}，"
+            f"未变化 {stats['unchanged']}（当前总数：{self._count_docs()}）"
+        )
+        return stats
+
+    def plan_upsert(self, source: str, texts: List[str]) -> Tuple[List[str], Set[str], Set[str]]:
+        """计算来源文件的片段 ID，并与清单对比得出（全部 ID，新增 ID，已消失 ID）"""
+        ids = make_chunk_ids(source, texts)
+        new_ids, removed_ids = self.manifest.diff(source, ids)
+        return ids, new_ids, removed_ids
+
+    @metrics.timed("write_chunks")
+    def write_chunks(
+        self,
+        ids: List[str],
+        texts: List[str],
+        metadatas: List[dict],
+        embeddings: List[List[float]],
+        delete_ids: Iterable[str] = (),
+        kept: Iterable[Tuple[str, dict]] = (),
+    ):
+        """以大批量写入已计算好向量的片段
+
+        - delete_ids：需要删除的片段
+        - kept：未变化片段，只刷新元数据（如 chunk_id/total_chunks），不重新计算向量
+        """
+        collection = self._collection()
+        max_batch = self._max_batch_size()
+
+        delete_ids = list(delete_ids)
+        for start in range(0, len(delete_ids), max_batch):
+            collection.delete(ids=delete_ids[start:start + max_batch])
+
+        for start in range(0, len(ids), max_batch):
+            end = start + max_batch
+            collection.upsert(
+                ids=ids[start:end],
+                embeddings=embeddings[start:end],
+                metadatas=metadatas[start:end],
+                documents=texts[start:end],
+            )
+
+        kept = list(kept)
+        for start in range(0, len(kept), max_batch):
+            batch = kept[start:start + max_batch]
+            collection.update(
+                ids=[doc_id for doc_id, _ in batch],
+                metadatas=[metadata for _, metadata in batch],
+            )
+
+        if self.lexical_index is not None:
+            self.lexical_index.delete(delete_ids)
+            self.lexical_index.add(ids, texts)
+
+    def embedding_cache_stats(self) -> dict:
+        """返回 embedding 缓存命中统计"""
+        if self.embedding_cache is None:
+            return {}
+        return self.embedding_cache.stats()
+
+    def similarity_search(
+        self,
+        query: str,
+        k: int = None,
+        mode: str = None,
+        filters: Optional[SearchFilter] = None,
+    ) -> List[Document]:
+        """相似度搜索
+
+        mode：vector（纯向量）或 hybrid（BM25 + 向量融合），默认取 Config.RETRIEVAL_MODE
+        filters：限定租户与元数据（来源、文档类型、日期），在向量索引内过滤
+        """
+        if k is None:
+            k = Config.RETRIEVAL_K
+
+        store, where = self._scope(filters)
+        # 先单独计算查询向量，便于分别统计编码与检索耗时
+        embedding = self.embed_query(query)
+        if store._use_hybrid(mode):
+            return store.hybrid_search(query, k, embedding, filters)
+        with metrics.stage("vector_search"):
+            return store.vectorstore.similarity_search_by_vector(embedding, k=k, filter=where)
+
+    async def asimilarity_search(
+        self,
+        query: str,
+        k: int = None,
+        mode: str = None,
+        filters: Optional[SearchFilter] = None,
+    ) -> List[Document]:
+        """异步相似度搜索
+
+        挂载了 query_batcher 时，并发查询的向量编码会被合并为一次批量计算；
+        向量检索本身在线程池中执行。
+        """
         if k is None:
             k = Config.RETRIEVAL_K
 
-        return self.vectorstore.similarity_search(query, k=k)
+        if self.query_batcher is None:
+            return await asyncio.to_thread(self.similarity_search, query, k, mode, filters)
+
+        store, where = self._scope(filters)
+        embedding = await self.aembed_query(query)
+        if store._use_hybrid(mode):
+            return await asyncio.to_thread(store.hybrid_search, query, k, embedding, filters)
+        with metrics.stage("vector_search"):
+            return await asyncio.to_thread(
+                store.vectorstore.similarity_search_by_vector, embedding, k, filter=where
+            )
+
+    def _use_hybrid(self, mode: Optional[str]) -> bool:
+        return (mode or Config.RETRIEVAL_MODE) == "hybrid" and self.lexical_index is not None
+
+    def _scope(self, filters: Optional[SearchFilter]) -> Tuple["VectorStore", Optional[dict]]:
+        """检索范围：（租户的 VectorStore, 元数据 where 表达式）"""
+        if filters is None:
+            return self, None
+        store = self.for_tenant(filters.tenant) if filters.tenant else self
+        return store, filters.where()
+
+    def hybrid_search(
+        self,
+        query: str,
+        k: int = None,
+        embedding: Optional[List[float]] = None,
+        filters: Optional[SearchFilter] = None,
+    ) -> List[Document]:
+        """混合检索：BM25 与向量检索各取候选，按倒数排名融合（RRF）"""
+        store, where = self._scope(filters)
+        if store is not self:
+            return store.hybrid_search(query, k, embedding, filters)
+        if k is None:
+            k = Config.RETRIEVAL_K
+        candidates = max(k, Config.HYBRID_CANDIDATES)
+
+        if embedding is None:
+            embedding = self.embed_query(query)
+        with metrics.stage("vector_search"):
+            vector_docs = self.vectorstore.similarity_search_by_vector(
+                embedding, k=candidates, filter=where
+            )
+        with metrics.stage("lexical_search"):
+            lexical_ids = [doc_id for doc_id, _ in self.lexical_index.search(query, candidates)]
+            if where and lexical_ids:
+                # 词法索引不含元数据：候选按同一条件在向量库中筛选（只查这些 ID）
+                allowed = set(
+                    self._collection().get(ids=lexical_ids, where=where, include=[])["ids"]
+                )
+                lexical_ids = [doc_id for doc_id in lexical_ids if doc_id in allowed]
+
+        scores = {}
+        for ranking in ([doc.id for doc in vector_docs], lexical_ids):
+            for rank, doc_id in enumerate(ranking):
+                scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (Config.HYBRID_RRF_K + rank + 1)
+        top_ids = sorted(scores, key=scores.get, reverse=True)[:k]
+
+        # 只出现在词法结果中的片段需要从向量库取回内容
+        docs_by_id = {doc.id: doc for doc in vector_docs}
+        missing = [doc_id for doc_id in top_ids if doc_id not in docs_by_id]
+        if missing:
+            docs_by_id.update({doc.id: doc for doc in self.vectorstore.get_by_ids(missing)})
+
+        return [docs_by_id[doc_id] for doc_id in top_ids if doc_id in docs_by_id]
+
+    @metrics.timed("embed_query")
+    def embed_query(self, query: str) -> List[float]:
+        """计算查询向量（经过 embedding 缓存）"""
+        return self.embeddings.embed_query(query)
+
+    @metrics.timed("embed_query")
+    async def aembed_query(self, query: str) -> List[float]:
+        """异步计算查询向量；挂载了 query_batcher 时与并发查询合并计算"""
+        if self.query_batcher is not None:
+            return await self.query_batcher.embed(query)
+        return await asyncio.to_thread(self.embeddings.embed_query, query)
+
+    @metrics.timed("embed_documents")
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """批量计算片段向量（经过 embedding 缓存）"""
+        metrics.inc("rag_embedded_texts_total", len(texts))
+        return self.embeddings.embed_documents(texts)
+
+    # ================================
+    # 集合版本
+    # ================================
+    def _follow_active(self):
+        """生效版本被切换（本进程或其他进程）后改用新版本；最多每隔一段时间检查一次指针文件"""
+        now = time.monotonic()
+        if now < self._next_pointer_check:
+            return
+        self._next_pointer_check = now + Config.COLLECTION_POINTER_CHECK_INTERVAL
+        active = self.registry.active()
+        if active != self.collection_name:
+            self._switch_to(active)
+
+    def _switch_to(self, name: str):
+        with self._vectorstore_lock:
+            if name == self.collection_name:
+                return
+            # 旧版本的对象不主动关闭：正在进行的检索仍可用完，随后被回收
+            opened = self._vectorstore is not None
+            self._bind(name)
+            if opened:
+                self._load_or_create_vectorstore()
+                self._sync_lexical_index()
+            print(f"ℹ 已切换到集合版本 {name}")
+
+    def _clone(self) -> "VectorStore":
+        """共用 embedding（含缓存）与查询微批处理器、尚未打开向量库的副本"""
+        store = copy.copy(self)
+        store._vectorstore = None
+        store._vectorstore_lock = threading.RLock()
+        return store
+
+    def spawn(self, collection_name: str) -> "VectorStore":
+        """绑定到指定版本的 VectorStore（同一租户）"""
+        store = self._clone()
+        store._pinned = True
+        store._bind(collection_name)
+        return store
+
+    def for_tenant(self, tenant: Optional[str]) -> "VectorStore":
+        """租户的 VectorStore（首次使用时创建并缓存，跟随该租户的生效版本）
+
+        tenant 为空时返回默认租户。
+        """
+        tenant = validate_tenant(tenant)
+        if tenant == self.tenant and not self._pinned:
+            return self
+        root = self._root
+        if tenant is None:
+            return root
+        with root._tenants_lock:
+            store = root._tenants.get(tenant)
+            if store is None:
+                store = root._clone()
+                store._use_tenant(tenant)
+                root._tenants[tenant] = store
+                # 顺带删除该租户已过期的旧版本（只在有过期版本时才打开向量库）
+                store._collect_garbage_quietly()
+        return store
+
+    def rebuild(self, build: Callable[["VectorStore"], Any], activate: bool = True) -> Any:
+        """在新版本中构建集合，完成后原子切换生效版本
+
+        build 接收绑定到新版本的 VectorStore（如 ``lambda s: ingest_directory(s, root)``）；
+        构建期间检索继续使用当前版本，构建失败时丢弃新版本。返回 build 的返回值。
+        """
+        name = self.registry.create()
+        staging = self.spawn(name)
+        # 构建期间定期刷新版本的 updated_at，其他进程的 collect_garbage 不会把它当作遗留版本删除
+        stop_heartbeat = threading.Event()
+        heartbeat = threading.Thread(
+            target=self._building_heartbeat, args=(name, stop_heartbeat), daemon=True
+        )
+        heartbeat.start()
+        try:
+            result = build(staging)
+            staging.manifest.save()
+        except BaseException:
+            stop_heartbeat.set()
+            heartbeat.join()
+            staging.close()
+            self._drop_collection(name)
+            raise
+        stop_heartbeat.set()
+        heartbeat.join()
+        staging.close()
+        if activate:
+            self.activate(name)
+        return result
+
+    def _building_heartbeat(self, name: str, stop: threading.Event):
+        interval = max(Config.COLLECTION_RETIRE_GRACE / 3, 1.0)
+        while not stop.wait(interval):
+            try:
+                self.registry.touch(name)
+            except Exception as e:
+                print(f"⚠ 刷新构建中版本失败: {e}")
+
+    def activate(self, name: str) -> Optional[str]:
+        """切换生效版本，返回被替换的版本名；被替换的版本超过保留期后删除"""
+        previous = self.registry.activate(name)
+        if not self._pinned:
+            self._switch_to(name)
+        if previous is not None:
+            self._schedule_garbage_collection()
+        return previous
+
+    def rollback(self) -> str:
+        """切回最近被替换、尚未删除的版本"""
+        previous = self.registry.previous()
+        if previous is None:
+            raise ValueError("没有可回滚的集合版本")
+        self.activate(previous)
+        return previous
+
+    def collect_garbage(self) -> List[str]:
+        """删除超出保留个数且退役时间超过 COLLECTION_RETIRE_GRACE 的旧版本，以及遗留的构建中版本"""
+        expired = self.registry.expired(
+            Config.COLLECTION_KEEP_VERSIONS, Config.COLLECTION_RETIRE_GRACE
+        )
+        for name in expired:
+            self._drop_collection(name)
+        return expired
+
+    def _schedule_garbage_collection(self):
+        """等其他进程切换到新版本后再删除旧版本；进程提前退出时由下次 warm_up 清理"""
+        timer = threading.Timer(Config.COLLECTION_RETIRE_GRACE + 1, self._collect_garbage_quietly)
+        timer.daemon = True
+        timer.start()
+
+    def _collect_garbage_quietly(self):
+        try:
+            self.collect_garbage()
+        except Exception as e:
+            print(f"⚠ 删除旧集合版本失败（下次启动时重试）: {e}")
+
+    def _drop_collection(self, name: str):
+        """删除一个非生效版本的向量数据、入库清单与词法索引"""
+        if name == self.registry.active():
+            raise ValueError(f"不能删除生效中的集合版本: {name}")
+        if self._is_numpy_backend():
+            shutil.rmtree(Config.VECTOR_DB_DIR / "numpy" / name, ignore_errors=True)
+        else:
+            try:
+                self.vectorstore._client.delete_collection(name)
+            except Exception:
+                pass  # 集合未创建过（如构建一开始就失败）
+        paths = [Config.MANIFEST_DIR / f"{name}.json"] + [
+            Config.LEXICAL_INDEX_DIR / f"{name}.sqlite3{suffix}" for suffix in ("", "-wal", "-shm")
+        ]
+        for path in paths:
+            try:
+                Path(path).unlink(missing_ok=True)
+            except OSError as e:
+                # Windows 上仍被打开的文件无法删除，残留文件不影响使用
+                print(f"ℹ 无法删除 {path}: {e}")
+        self.registry.remove(name)
+        print(f"ℹ 已删除旧集合版本 {name}")
+
+    def close(self):
+        """关闭本进程持有的索引文件（numpy 索引与词法索引）"""
+        with self._vectorstore_lock:
+            if self._vectorstore is not None and self._is_numpy_backend():
+                self._vectorstore.close()
+            self._vectorstore = None
+            if self.lexical_index is not None:
+                self.lexical_index.close()
 
     def clear(self):
-        """清空所有向量"""
+        """清空向量库：切换到一个新的空版本，旧版本保留用于回滚，过期后删除"""
         print("⚠ 清空向量库...")
-        shutil.rmtree(Config.VECTOR_DB_DIR, ignore_errors=True)
-        self._load_or_create_vectorstore()
-        print("✓ 向量库已重建")
+        self.rebuild(lambda staging: None)
+        print("✓ 向量库已清空（可用 rollback 恢复）")
+
+    # ================================
+    # 快照
+    # ================================
+    def snapshot(self, path, page_size: int = 1000) -> int:
+        """把当前版本导出为快照文件（片段、向量与入库清单），返回片段数"""
+        collection = self._collection()
+        total = self._count_docs()
+
+        def pages():
+            for offset in range(0, total, page_size):
+                batch = collection.get(
+                    include=["documents", "metadatas", "embeddings"], limit=page_size, offset=offset
+                )
+                yield batch, batch["embeddings"]
+
+        info = {
+            "collection": self.logical_name,
+            "tenant": self.tenant,
+            "version": self.collection_name,
+            "backend": Config.VECTOR_BACKEND,
+            "space": Config.VECTOR_SPACE,
+            "embedding_model": self.model_id,
+            "created_at": time.time(),
+        }
+        count = write_snapshot(Path(path), info, self.manifest.to_dict(), pages())
+        print(f"✓ 已导出快照 {path}（{count} 个片段）")
+        return count
+
+    def restore(self, path, activate: bool = True, force: bool = False) -> int:
+        """从快照恢复到一个新版本并切换（不影响恢复期间的检索），返回片段数
+
+        快照的 embedding 模型与当前不同时拒绝恢复（向量不可比），force=True 跳过检查。
+        """
+        info, manifest = read_snapshot_info(Path(path))
+        if info.get("embedding_model") != self.model_id and not force:
+            raise ValueError(
+                f"快照的 embedding 模型（{info.get('embedding_model')}）与当前（{self.model_id}）不一致"
+            )
+
+        def build(staging: "VectorStore") -> int:
+            for ids, documents, metadatas, embeddings in iter_snapshot_pages(Path(path)):
+                staging.write_chunks(ids, documents, metadatas, embeddings.tolist())
+            for source, entry in manifest.items():
+                staging.manifest.update(
+                    source, entry["chunk_ids"], file_hash=entry.get("file_hash")
+                )
+            return info["count"]
+
+        count = self.rebuild(build, activate=activate)
+        print(f"✓ 已从快照恢复 {count} 个片段")
+        return count
 
-    def get_retriever(self, k: int = None):
-        """获取检索器"""
+    def get_retriever(self, k: int = None, filters: Optional[SearchFilter] = None):
+        """获取检索器（filters 限定租户与元数据，在向量索引内过滤）"""
         if k is None:
             k = Config.RETRIEVAL_K
 
-        return self.vectorstore.as_retriever(search_kwargs={"k": k})
+        store, where = self._scope(filters)
+        search_kwargs = {"k": k}
+        if where:
+            search_kwargs["filter"] = where
+        return store.vectorstore.as_retriever(search_kwargs=search_kwargs)
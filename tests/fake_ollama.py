@@ -0,0 +1,189 @@
+"""本地假 Ollama 服务（仅依赖标准库）
+
+实现 ChatOllama 用到的接口，按配置的延迟逐 token 返回固定回答，
+并记录请求数与最大并发数，用于测试连接池的负载均衡、限流与故障转移。
+
+- POST /api/chat      NDJSON 流式 / 非流式回答
+- GET  /api/tags      模型列表
+- GET  /api/version   版本号
+
+单独运行（多开几个端口即可模拟多个实例）：
+    python -m tests.fake_ollama --port 11435 --first-token-ms 200
+"""
+
+import argparse
+import json
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+
+class FakeOllamaServer:
+    """在后台线程中运行的假 Ollama 服务"""
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        answer: str = "这是来自假 Ollama 服务的回答。",
+        first_token_ms: float = 0.0,
+        token_ms: float = 0.0,
+        model: str = "fake-model",
+    ):
+        self.answer = answer
+        self.first_token_ms = first_token_ms
+        self.token_ms = token_ms
+        self.model = model
+
+        self.requests = 0
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeOllamaServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> "FakeOllamaServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def tokens(self):
+        return [self.answer[i:i + 2] for i in range(0, len(self.answer), 2)]
+
+    def _enter(self):
+        with self._lock:
+            self.requests += 1
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+
+    def _exit(self):
+        with self._lock:
+            self.active -= 1
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, payload: dict, status: int = 200):
+                body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path == "/api/tags":
+                    self._send_json({"models": [{"name": server.model, "model": server.model}]})
+                elif self.path == "/api/version":
+                    self._send_json({"version": "0.0.0-fake"})
+                else:
+                    self._send_json({"error": "not found"}, status=404)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                request = json.loads(self.rfile.read(length) or b"{}")
+                if self.path != "/api/chat":
+                    self._send_json({"error": "not found"}, status=404)
+                    return
+
+                server._enter()
+                try:
+                    self._chat(request)
+                except (BrokenPipeError, ConnectionResetError):
+                    # 客户端提前断开（流式输出被中途关闭）
+                    pass
+                finally:
+                    server._exit()
+
+            def _chunk(self, content: str, done: bool, prompt_tokens: int = 0) -> dict:
+                chunk = {
+                    "model": server.model,
+                    "created_at": datetime.now(timezone.utc).isoformat(),
+                    "message": {"role": "assistant", "content": content},
+                    "done": done,
+                }
+                if done:
+                    chunk.update({
+                        "done_reason": "stop",
+                        "prompt_eval_count": prompt_tokens,
+                        "eval_count": len(server.tokens()),
+                    })
+                return chunk
+
+            def _chat(self, request: dict):
+                prompt_tokens = sum(
+                    len(str(m.get("content", ""))) for m in request.get("messages", [])
+                ) // 2
+                time.sleep(server.first_token_ms / 1000)
+
+                if not request.get("stream", True):
+                    time.sleep(server.token_ms * len(server.tokens()) / 1000)
+                    self._send_json(self._chunk(server.answer, True, prompt_tokens))
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for token in server.tokens():
+                    time.sleep(server.token_ms / 1000)
+                    self._write_chunk(self._chunk(token, False))
+                self._write_chunk(self._chunk("", True, prompt_tokens))
+                self.wfile.write(b"0\r\n\r\n")
+
+            def _write_chunk(self, payload: dict):
+                data = (json.dumps(payload, ensure_ascii=False) + "\n").encode("utf-8")
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地假 Ollama 服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--first-token-ms", type=float, default=200.0)
+    parser.add_argument("--token-ms", type=float, default=20.0)
+    parser.add_argument("--answer", default="这是来自假 Ollama 服务的回答。")
+    args = parser.parse_args()
+
+    server = FakeOllamaServer(
+        host=args.host, port=args.port, answer=args.answer,
+        first_token_ms=args.first_token_ms, token_ms=args.token_ms,
+    )
+    print(f"✓ 假 Ollama 服务已启动: {server.url}")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
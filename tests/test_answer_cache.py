@@ -0,0 +1,54 @@
+"""语义回答缓存测试"""
+
+from src.answer_cache import SemanticAnswerCache
+
+
+def test_similar_query_hits():
+    """测试相似问题且检索片段一致时命中"""
+    cache = SemanticAnswerCache(threshold=0.95)
+    cache.store("什么是 AX-100", [1.0, 0.0], ["b", "a"], "旗舰型号")
+
+    hit = cache.lookup([0.99, 0.05], ["a", "b"])
+    assert hit is not None
+    assert hit.answer == "旗舰型号"
+    assert cache.lookup([0.0, 1.0], ["a", "b"]) is None
+
+
+def test_changed_documents_invalidate():
+    """测试检索片段变化后不再命中"""
+    cache = SemanticAnswerCache()
+    cache.store("q", [1.0, 0.0], ["a"], "answer")
+    assert cache.lookup([1.0, 0.0], ["a2"]) is None
+
+
+def test_ttl_and_capacity():
+    """测试过期与容量淘汰"""
+    expired = SemanticAnswerCache(ttl=-1)
+    expired.store("q", [1.0, 0.0], ["a"], "answer")
+    assert expired.lookup([1.0, 0.0], ["a"]) is None
+
+    small = SemanticAnswerCache(max_entries=1)
+    small.store("q1", [1.0, 0.0], ["a"], "first")
+    small.store("q2", [0.0, 1.0], ["a"], "second")
+    assert small.stats()["entries"] == 1
+    assert small.lookup([1.0, 0.0], ["a"]) is None
+
+
+def test_history_scopes_answers_to_session():
+    """依赖历史的回答只在同一会话、同样的历史下命中；无历史的提问跨会话共享"""
+    from langchain_core.messages import AIMessage, HumanMessage
+    from src.answer_cache import context_key
+
+    alice = [HumanMessage(content="网关如何限流？"), AIMessage(content="按令牌桶限流。")]
+    bob = [HumanMessage(content="数据库如何备份？"), AIMessage(content="每天全量备份。")]
+    cache = SemanticAnswerCache()
+    cache.store("它失败了怎么办？", [1.0, 0.0], ["a"], "网关限流失败时返回 429",
+                context=context_key("alice", alice))
+
+    assert cache.lookup([1.0, 0.0], ["a"], context_key("alice", alice)) is not None
+    assert cache.lookup([1.0, 0.0], ["a"], context_key("bob", bob)) is None
+    assert cache.lookup([1.0, 0.0], ["a"], context_key("bob", alice)) is None
+    assert cache.lookup([1.0, 0.0], ["a"], context_key("carol", [])) is None
+
+    cache.store("网关如何限流？", [0.0, 1.0], ["b"], "按令牌桶限流。", context=context_key("alice", []))
+    assert cache.lookup([0.0, 1.0], ["b"], context_key("bob", [])) is not None
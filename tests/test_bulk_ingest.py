@@ -0,0 +1,79 @@
+"""批量入库流水线测试"""
+
+import threading
+
+from src import bulk_ingest
+from src.bulk_ingest import BulkIngestor
+from src.ingest_manifest import IngestManifest, make_chunk_ids
+
+
+class RecordingStore:
+    """只实现流水线用到的接口，记录写入的片段"""
+
+    def __init__(self, manifest_path):
+        self.manifest = IngestManifest(manifest_path)
+        self.written = []
+
+    def plan_upsert(self, source, texts):
+        ids = make_chunk_ids(source, texts)
+        new_ids, removed_ids = self.manifest.diff(source, ids)
+        return ids, new_ids, removed_ids
+
+    def embed_documents(self, texts):
+        return [[float(len(text))] for text in texts]
+
+    def write_chunks(self, ids, texts, metadatas, embeddings, delete_ids=(), kept=()):
+        self.written.extend(metadata["source"] for metadata in metadatas)
+
+
+def test_per_file_failure_does_not_block_pipeline(tmp_path, monkeypatch):
+    """某个文件生成元数据时出错：记为该文件的错误，其余文件照常入库，入库正常结束"""
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    for index in range(6):
+        (docs / f"doc{index}.txt").write_text(f"第 {index} 篇文档的内容。", encoding="utf-8")
+
+    original = bulk_ingest.ChunkBatch.chunk_metadata
+
+    def chunk_metadata(self, index):
+        if self.metadata["source"] == "doc2.txt":
+            raise RuntimeError("元数据生成失败")
+        return original(self, index)
+
+    monkeypatch.setattr(bulk_ingest.ChunkBatch, "chunk_metadata", chunk_metadata)
+
+    store = RecordingStore(tmp_path / "manifest.json")
+    ingestor = BulkIngestor(store, workers=1, queue_size=1, write_batch_size=1)
+    result = {}
+    thread = threading.Thread(
+        target=lambda: result.update(ingestor.ingest_directory(docs)), daemon=True
+    )
+    thread.start()
+    thread.join(timeout=120)
+
+    assert not thread.is_alive(), "入库流水线阻塞"
+    assert result["files"] == 6
+    assert result["failed"] == 1
+    assert result["errors"][0][0].endswith("doc2.txt")
+    assert sorted(store.written) == [f"doc{i}.txt" for i in range(6) if i != 2]
+    assert all(not source.endswith("doc2.txt") for source in store.manifest.sources())
+
+
+def test_failed_write_is_not_counted(tmp_path):
+    """写入失败的批次不计入新增片段数，文件记为失败"""
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    for index in range(3):
+        (docs / f"doc{index}.txt").write_text(f"第 {index} 篇文档的内容。", encoding="utf-8")
+
+    class FailingStore(RecordingStore):
+        def write_chunks(self, ids, texts, metadatas, embeddings, delete_ids=(), kept=()):
+            if any(metadata["source"] == "doc1.txt" for metadata in metadatas):
+                raise RuntimeError("磁盘已满")
+            super().write_chunks(ids, texts, metadatas, embeddings, delete_ids, kept)
+
+    store = FailingStore(tmp_path / "manifest.json")
+    result = BulkIngestor(store, workers=1, write_batch_size=1).ingest_directory(docs)
+
+    assert result["failed"] == 1
+    assert result["added"] == len(store.written) == 2
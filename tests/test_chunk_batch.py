@@ -0,0 +1,49 @@
+"""列式片段批次测试"""
+
+import pickle
+
+from src.chunk_batch import ChunkBatch
+from src.document_processor import DocumentProcessor
+
+
+def test_chunk_metadata_and_documents():
+    """逐片段的元数据由共享的文件级元数据与各列组合而成"""
+    batch = ChunkBatch(metadata={"source": "a.pdf", "source_path": "/docs/a.pdf"})
+    batch.append("第一段", 0, page=1, page_end=1)
+    batch.append("第二段", 5, page=1, page_end=2)
+
+    assert batch.source == "/docs/a.pdf"
+    docs = batch.to_documents()
+    assert [doc.page_content for doc in docs] == ["第一段", "第二段"]
+    assert docs[1].metadata == {
+        "source": "a.pdf", "source_path": "/docs/a.pdf", "chunk_id": 1, "total_chunks": 2,
+        "start_index": 5, "page": 1, "page_end": 2,
+    }
+    assert pickle.loads(pickle.dumps(batch)).to_documents() == docs
+
+
+def test_load_batch_offsets(tmp_path):
+    """片段的 start_index 指向其在全文中的位置"""
+    processor = DocumentProcessor()
+    processor.extraction_cache = None
+    text = "\n\n".join(f"第 {i} 段：网关会自动限制并发请求，失败时会重试三次。" * 8 for i in range(30))
+    path = tmp_path / "doc.txt"
+    path.write_text(text, encoding="utf-8")
+
+    batch = processor.load_batch(str(path))
+    assert len(batch) > 1
+    for chunk, start in zip(batch.texts, batch.starts):
+        assert text[start:start + len(chunk)] == chunk
+    assert [doc.page_content for doc in processor.load_document(str(path))] == batch.texts
+
+
+def test_split_pages_offsets():
+    """PDF 增量分段产出的偏移与整篇拼接后的位置一致"""
+    processor = DocumentProcessor()
+    pages = [
+        (number, " ".join(f"page{number} sentence {i}." for i in range(120)))
+        for number in range(1, 6)
+    ]
+    whole = "\n\n".join(text for _, text in pages)
+    for chunk, start, _, _ in processor._split_pages_at(pages):
+        assert whole[start:start + len(chunk)] == chunk
@@ -0,0 +1,94 @@
+"""集合版本与快照测试"""
+
+import time
+
+import numpy as np
+from src.collection_versions import (
+    CollectionRegistry,
+    iter_snapshot_pages,
+    read_snapshot_info,
+    write_snapshot,
+)
+
+
+def test_registry_defaults_to_legacy_collection(tmp_path):
+    """没有指针文件时生效版本即逻辑集合名（兼容已有数据）"""
+    registry = CollectionRegistry(tmp_path / "rag.versions.json", "rag")
+    assert registry.active() == "rag"
+    assert registry.previous() is None
+    assert not (tmp_path / "rag.versions.json").exists()
+
+
+def test_activate_rollback_and_expiry(tmp_path):
+    """切换后旧版本退役可回滚，超出保留个数且过了宽限期才可删除"""
+    path = tmp_path / "rag.versions.json"
+    registry = CollectionRegistry(path, "rag")
+    first = registry.create()
+    assert registry.active() == "rag"  # 构建中的版本不生效
+    assert registry.activate(first) == "rag"
+
+    # 其他进程（另一个实例）读到的是切换后的指针
+    other = CollectionRegistry(path, "rag")
+    assert other.active() == first
+
+    time.sleep(0.01)
+    second = registry.create()
+    registry.activate(second)
+    assert other.active() == second
+    assert other.previous() == first
+
+    assert registry.expired(keep=1, grace=3600) == []
+    assert registry.expired(keep=1, grace=0) == ["rag"]
+    assert registry.expired(keep=2, grace=0) == []
+
+    registry.remove("rag")
+    registry.activate(registry.previous())
+    assert registry.active() == first
+    assert [v["status"] for v in registry.versions()] == ["active", "retired"]
+    assert list(tmp_path.glob("*.tmp")) == []
+
+
+def test_abandoned_building_version_expires(tmp_path):
+    """构建进程被杀后遗留的 building 版本超过宽限期即可删除，仍在刷新的不删除"""
+    registry = CollectionRegistry(tmp_path / "rag.versions.json", "rag")
+    abandoned = registry.create()
+    running = registry.create()
+    assert registry.expired(keep=1, grace=3600) == []
+
+    time.sleep(0.05)
+    registry.touch(running)
+    assert registry.expired(keep=1, grace=0.03) == [abandoned]
+    assert registry.active() == "rag"
+
+
+def test_snapshot_round_trip(tmp_path):
+    """快照按页写入，读回的片段、向量与清单不变"""
+    vectors = np.random.default_rng(0).standard_normal((5, 8)).astype(np.float32)
+    records = {
+        "ids": [f"id-{i}" for i in range(5)],
+        "documents": [f"片段 {i}" for i in range(5)],
+        "metadatas": [{"source": "a.txt", "chunk_id": i} for i in range(5)],
+    }
+    pages = [
+        ({key: values[start:start + 2] for key, values in records.items()}, vectors[start:start + 2])
+        for start in range(0, 5, 2)
+    ]
+    manifest = {"a.txt": {"file_hash": "h", "chunk_ids": records["ids"]}}
+
+    path = tmp_path / "rag.snapshot"
+    assert write_snapshot(path, {"embedding_model": "m"}, manifest, iter(pages)) == 5
+
+    info, restored_manifest = read_snapshot_info(path)
+    assert info["count"] == 5 and info["pages"] == 3 and info["embedding_model"] == "m"
+    assert restored_manifest == manifest
+
+    ids, documents, metadatas, embeddings = [], [], [], []
+    for page in iter_snapshot_pages(path):
+        ids += page[0]
+        documents += page[1]
+        metadatas += page[2]
+        embeddings.append(page[3])
+    assert ids == records["ids"]
+    assert documents == records["documents"]
+    assert metadatas == records["metadatas"]
+    assert np.array_equal(np.concatenate(embeddings), vectors)
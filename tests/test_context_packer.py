@@ -0,0 +1,55 @@
+"""上下文打包测试"""
+
+from langchain_core.documents import Document
+from langchain_core.messages import AIMessage, HumanMessage
+from src.context_packer import ContextPacker, estimate_tokens, overlap_length
+
+
+def make_doc(doc_id, text, source="a.txt", chunk_id=0):
+    return Document(id=doc_id, page_content=text, metadata={"source": source, "chunk_id": chunk_id})
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("你好世界") == 4
+    assert estimate_tokens("abcdefgh") == 2
+
+
+def test_overlap_removed_between_adjacent_chunks():
+    """相邻片段之间的重叠文本只保留一份"""
+    shared = "这一段是两个相邻片段共有的重叠文本内容，用于测试去重。"
+    first = make_doc("1", "第一个片段的独有内容。" + shared, chunk_id=0)
+    second = make_doc("2", shared + "第二个片段的独有内容。", chunk_id=1)
+
+    packed = ContextPacker(budget=10000, chunk_overlap=200).pack("问题", [first, second], [])
+    assert packed.context.count(shared) == 1
+    assert "第二个片段的独有内容" in packed.context
+    assert overlap_length(first.page_content, second.page_content, 200) == len(shared)
+
+
+def test_lowest_ranked_chunks_dropped_within_budget():
+    """预算不足时舍弃排名最低的片段，总量不超过预算"""
+    docs = [make_doc(str(i), f"片段{i}" + "内容" * 200, source=f"{i}.txt") for i in range(5)]
+    packer = ContextPacker(budget=1000, overhead_tokens=100)
+    packed = packer.pack("问题", docs, [])
+
+    assert packed.tokens["total"] <= 1000
+    assert packed.doc_ids[0] == "0"
+    assert packed.dropped_docs > 0
+    assert "片段4" not in packed.context
+
+
+def test_history_keeps_newest_whole_turns():
+    """历史按整轮保留，优先保留最近的对话"""
+    history = []
+    for i in range(3):
+        history += [HumanMessage(content=f"问题{i}" + "长" * 100), AIMessage(content=f"回答{i}" + "长" * 100)]
+
+    packer = ContextPacker(budget=600, history_share=0.5, max_history_messages=6)
+    packed = packer.pack("新问题", [], history)
+
+    assert packed.history == history[-len(packed.history):]
+    assert len(packed.history) % 2 == 0
+    assert packed.history[-1].content.startswith("回答2")
+    assert packed.dropped_messages > 0
+    assert packed.context == "没有找到相关文档。"
@@ -27,3 +27,52 @@ def test_file_not_found(processor):
     """测试文件不存在"""
     with pytest.raises(FileNotFoundError):
         processor.load_document("nonexistent.pdf")
+
+
+def test_split_pages_matches_whole_document(processor):
+    """增量分段与整篇拼接后分段结果一致，并记录片段所在页码"""
+    pages = [
+        (number, " ".join(f"page{number} sentence {i}." for i in range(120)))
+        for number in range(1, 6)
+    ]
+    streamed = list(processor._split_pages_at(pages))
+    whole = processor.text_splitter.split_text("\n\n".join(text for _, text in pages))
+
+    assert [chunk for chunk, _, _, _ in streamed] == whole
+    for chunk, _, page, page_end in streamed:
+        assert f"page{page} " in chunk
+        assert f"page{page_end} " in chunk
+        assert page <= page_end
+
+
+def test_split_pages_flushes_in_splitter_units(processor):
+    """按 token 分段时缓冲区按 token 数触发分段，结果同样与整篇分段一致"""
+    from src.context_packer import estimate_tokens
+    from src.text_splitters import SentenceTokenSplitter
+
+    def lengths(texts):
+        return [estimate_tokens(text) for text in texts]
+
+    processor.text_splitter = SentenceTokenSplitter(lengths, chunk_size=60)
+    processor.chunk_length = processor.text_splitter.length
+    processor.chunk_size = 60
+    pages = [
+        (number, "".join(f"第{number}页第{i}条规则要求网关限制并发请求。" for i in range(30)))
+        for number in range(1, 5)
+    ]
+
+    consumed = []
+
+    def read_pages():
+        for page in pages:
+            consumed.append(page[0])
+            yield page
+
+    chunks = processor._split_pages_at(read_pages())
+    first = next(chunks)
+    # 第一页就超过两个片段上限（token 数），不必读完全部页面才产出片段
+    assert consumed == [1]
+
+    streamed = [first, *chunks]
+    whole = processor.text_splitter.split_text("\n\n".join(text for _, text in pages))
+    assert [chunk for chunk, _, _, _ in streamed] == whole
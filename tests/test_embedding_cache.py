@@ -0,0 +1,73 @@
+"""Embedding 缓存测试"""
+
+import pytest
+from langchain_core.embeddings import Embeddings
+from src.embedding_cache import CachedEmbeddings
+
+
+class CountingEmbeddings(Embeddings):
+    """记录调用次数的假 Embedding 模型"""
+
+    def __init__(self):
+        self.embedded = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def embed_query(self, text):
+        self.embedded.append(text)
+        return [float(len(text)), 0.0]
+
+
+@pytest.fixture
+def base():
+    return CountingEmbeddings()
+
+
+def make_cache(base, tmp_path, **kwargs):
+    return CachedEmbeddings(base, model_id="fake", cache_path=tmp_path / "emb.sqlite3", **kwargs)
+
+
+def test_cache_hits_skip_model(base, tmp_path):
+    """测试重复文本不再调用模型"""
+    cache = make_cache(base, tmp_path)
+    first = cache.embed_documents(["你好", "world"])
+    second = cache.embed_documents(["你好", "world", "新文本"])
+
+    assert second[:2] == first
+    assert base.embedded == ["你好", "world", "新文本"]
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["misses"] == 3
+
+
+def test_cache_persists_and_normalizes(base, tmp_path):
+    """测试缓存持久化与空白归一化"""
+    make_cache(base, tmp_path).embed_documents(["a  b"])
+    reopened = make_cache(base, tmp_path)
+    reopened.embed_documents(["a b"])
+
+    assert base.embedded == ["a  b"]
+    assert reopened.stats()["hits"] == 1
+
+
+def test_query_and_document_keys_are_separate(base, tmp_path):
+    """测试查询向量与文档向量分开缓存"""
+    cache = make_cache(base, tmp_path)
+    cache.embed_documents(["abc"])
+    assert cache.embed_query("abc") == [3.0, 0.0]
+    assert cache.embed_query("abc") == [3.0, 0.0]
+    assert base.embedded == ["abc", "abc"]
+
+
+def test_lru_eviction(base, tmp_path):
+    """测试超出容量时淘汰最久未使用的条目"""
+    cache = make_cache(base, tmp_path, max_entries=2)
+    cache.embed_documents(["a"])
+    cache.embed_documents(["b"])
+    cache.embed_documents(["a"])
+    cache.embed_documents(["c"])
+
+    assert cache.stats()["entries"] == 2
+    cache.embed_documents(["a"])
+    assert base.embedded == ["a", "b", "c"]
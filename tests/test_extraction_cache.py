@@ -0,0 +1,107 @@
+"""文本提取缓存测试"""
+
+import os
+import time
+
+import pytest
+from src.document_processor import DocumentProcessor
+from src.extraction_cache import ExtractionCache
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "doc.md"
+    path.write_text("# 标题\n\n网关会自动限制并发请求。\n", encoding="utf-8")
+    return path
+
+
+def test_roundtrip_and_fingerprint(tmp_path, source):
+    """内容、修改时间与提取器版本任一变化都不再命中"""
+    cache = ExtractionCache(tmp_path / "cache")
+    key = cache.key(source, "md-v1")
+    assert cache.get(key) is None
+
+    cache.put(key, [(1, "第一页\n换行"), (2, "second")])
+    assert cache.get(key) == [(1, "第一页\n换行"), (2, "second")]
+    assert cache.key(source, "md-v1") == key
+    assert cache.key(source, "md-v2") != key
+
+    source.write_text("# 标题\n\n内容已修改。\n", encoding="utf-8")
+    assert cache.key(source, "md-v1") != key
+    assert cache.stats()["hits"] == 1
+
+
+def test_corrupt_entry_is_a_miss(tmp_path, source):
+    cache = ExtractionCache(tmp_path / "cache")
+    key = cache.key(source, "md-v1")
+    cache.put(key, [(1, "text")])
+    cache.entry_path(key).write_bytes(b"not zlib")
+
+    assert cache.get(key) is None
+    assert not cache.entry_path(key).exists()
+
+
+def test_failed_write_leaves_no_entry(tmp_path):
+    cache = ExtractionCache(tmp_path / "cache")
+    with pytest.raises(RuntimeError):
+        with cache.writer("ab" * 20) as writer:
+            writer.add(1, "partial")
+            raise RuntimeError("解析失败")
+
+    assert cache.get("ab" * 20) is None
+    assert list((tmp_path / "cache").rglob("*")) == [tmp_path / "cache" / "ab"]
+
+
+def test_prune_by_age_and_size(tmp_path):
+    """先删除过期条目，再按最近使用时间淘汰到总大小以内"""
+    cache = ExtractionCache(tmp_path / "cache", max_bytes=0, max_age=3600)
+    now = time.time()
+    for index, age in enumerate([7200, 300, 200, 100]):
+        key = f"{index:02d}" * 20
+        cache.put(key, [(1, os.urandom(256).hex())])
+        os.utime(cache.entry_path(key), (now - age, now - age))
+
+    assert cache.prune() == 1
+    assert cache.stats()["entries"] == 3
+
+    sizes = [cache.entry_path(f"{index:02d}" * 20).stat().st_size for index in (1, 2, 3)]
+    cache.max_bytes = sizes[1] + sizes[2]
+    assert cache.prune() == 1
+    assert cache.get("01" * 20) is None
+    assert cache.get("03" * 20) is not None
+
+
+def test_prune_removes_stale_temp_files(tmp_path):
+    """写入进程被杀后遗留的临时文件计入总大小，过期后删除；仍在写入的临时文件保留"""
+    cache = ExtractionCache(tmp_path / "cache", max_bytes=0, max_age=0)
+    shard = tmp_path / "cache" / "ab"
+    shard.mkdir(parents=True)
+    stale, fresh = shard / f".{'ab' * 20}.1.tmp", shard / f".{'ab' * 20}.2.tmp"
+    stale.write_bytes(os.urandom(512))
+    fresh.write_bytes(os.urandom(512))
+    old = time.time() - 2 * 3600
+    os.utime(stale, (old, old))
+
+    assert cache.prune() == 1
+    assert not stale.exists() and fresh.exists()
+
+    # 临时文件计入总大小：超出上限时淘汰正式条目
+    cache.put("cd" * 20, [(1, "正文")])
+    cache.max_bytes = fresh.stat().st_size + cache.entry_path("cd" * 20).stat().st_size - 1
+    assert cache.prune() == 1
+    assert cache.get("cd" * 20) is None and fresh.exists()
+
+
+def test_processor_skips_extraction_on_hit(tmp_path, source):
+    """命中缓存时不再调用提取函数，分段结果不变"""
+    processor = DocumentProcessor()
+    processor.extraction_cache = ExtractionCache(tmp_path / "cache")
+    first = processor.load_document(str(source))
+
+    def fail(path):
+        raise AssertionError("不应再次解析")
+
+    processor._extract_markdown = fail
+    second = processor.load_document(str(source))
+    assert [doc.page_content for doc in second] == [doc.page_content for doc in first]
+    assert processor.extraction_cache.stats()["hits"] == 1
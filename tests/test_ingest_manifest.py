@@ -0,0 +1,33 @@
+"""入库清单测试"""
+
+from src.ingest_manifest import IngestManifest, file_sha256, make_chunk_ids
+
+
+def test_chunk_ids_are_deterministic():
+    """测试片段 ID 确定且区分来源与重复内容"""
+    ids = make_chunk_ids("a.txt", ["x", "y", "x"])
+    assert ids == make_chunk_ids("a.txt", ["x", "y", "x"])
+    assert len(set(ids)) == 3
+    assert ids[0] != make_chunk_ids("b.txt", ["x"])[0]
+
+
+def test_manifest_diff_and_persistence(tmp_path):
+    """测试增量对比与持久化"""
+    manifest = IngestManifest(tmp_path / "manifest.json")
+    manifest.update("a.txt", ["1", "2", "3"], file_hash="h1")
+    manifest.save()
+
+    reloaded = IngestManifest(tmp_path / "manifest.json")
+    assert reloaded.file_hash("a.txt") == "h1"
+    new_ids, removed_ids = reloaded.diff("a.txt", ["2", "3", "4"])
+    assert new_ids == {"4"}
+    assert removed_ids == {"1"}
+
+
+def test_file_sha256(tmp_path):
+    """测试文件哈希随内容变化"""
+    path = tmp_path / "doc.txt"
+    path.write_text("hello", encoding="utf-8")
+    first = file_sha256(path)
+    path.write_text("hello!", encoding="utf-8")
+    assert file_sha256(path) != first
@@ -0,0 +1,36 @@
+"""词法倒排索引测试"""
+
+from src.lexical_index import LexicalIndex, tokenize
+
+
+def test_tokenize_keeps_codes_and_cjk():
+    """测试产品代码保持完整、中文被切分"""
+    tokens = tokenize("型号 AX-100 的缺点")
+    assert "ax-100" in tokens
+    assert any(all("一" <= ch <= "鿿" for ch in token) for token in tokens)
+
+
+def test_bm25_ranks_exact_match_first(tmp_path):
+    """测试精确词命中的文档排在最前"""
+    index = LexicalIndex(tmp_path / "lexical.sqlite3")
+    index.add(
+        ["a", "b", "c"],
+        ["设备维护要点", "型号 AX-100 功耗较高", "型号 AX-200 功耗较低"],
+    )
+    results = index.search("AX-100 功耗", k=3)
+    assert results[0][0] == "b"
+    assert {doc_id for doc_id, _ in results} == {"b", "c"}
+
+
+def test_delete_and_persistence(tmp_path):
+    """测试删除、覆盖与持久化"""
+    path = tmp_path / "lexical.sqlite3"
+    index = LexicalIndex(path)
+    index.add(["a", "b"], ["alpha beta", "beta gamma"])
+    index.add(["a"], ["delta"])
+    index.delete(["b"])
+
+    reopened = LexicalIndex(path)
+    assert reopened.count() == 1
+    assert reopened.search("beta") == []
+    assert reopened.search("delta")[0][0] == "a"
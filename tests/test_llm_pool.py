@@ -0,0 +1,105 @@
+"""Ollama 连接池测试（使用本地假 Ollama 服务）"""
+
+import asyncio
+import socket
+import time
+
+import pytest
+from langchain_core.messages import HumanMessage
+from src.llm_pool import LLMBusyError, OllamaPool
+from tests.fake_ollama import FakeOllamaServer
+
+MESSAGES = [HumanMessage(content="你好")]
+
+
+def unused_url() -> str:
+    """一个没有服务监听的本地地址"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    return f"http://127.0.0.1:{port}"
+
+
+def test_invoke_and_stream_through_fake_server():
+    """普通调用与流式调用都经由连接池返回完整回答"""
+    with FakeOllamaServer(answer="答案在文档片段 1 中。") as server:
+        pool = OllamaPool([server.url], model="fake-model")
+        assert pool.invoke(MESSAGES).content == "答案在文档片段 1 中。"
+        chunks = [chunk.content for chunk in pool.stream(MESSAGES)]
+        assert "".join(chunks) == "答案在文档片段 1 中。"
+        assert pool.stats()["backends"][0]["in_flight"] == 0
+        assert server.requests == 2
+
+
+def test_least_outstanding_routing_and_concurrency_limit():
+    """并发请求均匀分到各后端，且每个后端不超过并发上限"""
+    servers = [FakeOllamaServer(first_token_ms=150).start() for _ in range(2)]
+    try:
+        pool = OllamaPool(
+            [s.url for s in servers], max_concurrency=2, queue_size=8, model="fake-model"
+        )
+
+        async def run():
+            return await asyncio.gather(*(pool.ainvoke(MESSAGES) for _ in range(6)))
+
+        results = asyncio.run(run())
+        assert len(results) == 6
+        # 前 4 个请求各分到 2 个，其余排队等空闲后端
+        assert sum(s.requests for s in servers) == 6
+        assert min(s.requests for s in servers) >= 2
+        assert all(s.max_active <= 2 for s in servers)
+        assert pool.stats()["queued"] == 2
+    finally:
+        for server in servers:
+            server.stop()
+
+
+def test_full_queue_fails_fast():
+    """后端满载且队列已满时立即返回繁忙，而不是等到超时"""
+    with FakeOllamaServer(first_token_ms=400) as server:
+        pool = OllamaPool(
+            [server.url], max_concurrency=1, queue_size=0, queue_timeout=30, model="fake-model"
+        )
+
+        async def run():
+            first = asyncio.create_task(pool.ainvoke(MESSAGES))
+            await asyncio.sleep(0.1)
+            started = time.perf_counter()
+            with pytest.raises(LLMBusyError):
+                await pool.ainvoke(MESSAGES)
+            elapsed = time.perf_counter() - started
+            await first
+            return elapsed
+
+        assert asyncio.run(run()) < 0.1
+        assert pool.stats()["rejected"] == 1
+
+
+def test_queue_timeout_raises_busy():
+    """排队超过 queue_timeout 后返回繁忙并退出队列"""
+    with FakeOllamaServer(first_token_ms=500) as server:
+        pool = OllamaPool(
+            [server.url], max_concurrency=1, queue_size=4, queue_timeout=0.1, model="fake-model"
+        )
+
+        async def run():
+            first = asyncio.create_task(pool.ainvoke(MESSAGES))
+            await asyncio.sleep(0.05)
+            with pytest.raises(LLMBusyError):
+                await pool.ainvoke(MESSAGES)
+            await first
+
+        asyncio.run(run())
+        assert pool.stats()["waiting"] == 0
+
+
+def test_failover_to_healthy_backend():
+    """连不上的后端被暂停调度，请求转到其他后端"""
+    with FakeOllamaServer() as server:
+        pool = OllamaPool([unused_url(), server.url], failure_cooldown=60, model="fake-model")
+        for _ in range(3):
+            assert pool.invoke(MESSAGES).content
+        stats = pool.stats()["backends"]
+        assert stats[0]["failures"] == 1
+        assert not stats[0]["available"]
+        assert server.requests == 3
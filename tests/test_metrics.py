@@ -0,0 +1,73 @@
+"""性能指标测试"""
+
+import asyncio
+import json
+
+from langchain_core.messages import AIMessage
+from src.metrics import MetricsRegistry
+
+
+def test_stage_histogram_and_prometheus():
+    """阶段耗时计入直方图并导出 Prometheus 文本"""
+    registry = MetricsRegistry()
+    for seconds in (0.002, 0.02, 0.2):
+        registry.record_stage("retrieve", seconds)
+
+    text = registry.render_prometheus()
+    assert "# TYPE rag_stage_seconds histogram" in text
+    assert 'rag_stage_seconds_bucket{stage="retrieve",le="0.005"} 1' in text
+    assert 'rag_stage_seconds_bucket{stage="retrieve",le="0.25"} 3' in text
+    assert 'rag_stage_seconds_count{stage="retrieve"} 3' in text
+
+    summary = registry.snapshot()["stages_ms"]["retrieve"]
+    assert summary["count"] == 3
+    assert summary["p50"] == 20.0
+
+
+def test_timed_decorator_sync_and_async():
+    """装饰器同时支持普通函数与协程函数"""
+    registry = MetricsRegistry()
+
+    @registry.timed("sync_stage")
+    def work(x):
+        return x * 2
+
+    @registry.timed("async_stage")
+    async def awork(x):
+        return x + 1
+
+    assert work(2) == 4
+    assert asyncio.run(awork(2)) == 3
+    stages = registry.snapshot()["stages_ms"]
+    assert stages["sync_stage"]["count"] == 1
+    assert stages["async_stage"]["count"] == 1
+
+
+def test_generation_tokens_and_trace_log(tmp_path):
+    """一轮对话的阶段明细、token 数写入 JSON 日志"""
+    log_file = tmp_path / "metrics.jsonl"
+    registry = MetricsRegistry(log_file=str(log_file))
+
+    with registry.trace("chat", session_id="s1"):
+        with registry.stage("retrieve"):
+            pass
+        meter = registry.generation()
+        meter.finish(AIMessage(
+            content="答案",
+            usage_metadata={"input_tokens": 120, "output_tokens": 30, "total_tokens": 150},
+        ))
+
+    record = json.loads(log_file.read_text(encoding="utf-8").strip())
+    assert record["session_id"] == "s1"
+    assert {"retrieve", "llm"} <= set(record["stages_ms"])
+    assert record["prompt_tokens"] == 120
+    assert record["completion_tokens"] == 30
+    assert registry.snapshot()["tokens"] == {"prompt": 120, "completion": 30}
+
+
+def test_disabled_registry_records_nothing():
+    registry = MetricsRegistry(enabled=False)
+    registry.record_stage("retrieve", 0.1)
+    registry.inc("rag_chat_turns_total")
+    assert registry.snapshot()["stages_ms"] == {}
+    assert registry.render_prometheus().strip() == ""
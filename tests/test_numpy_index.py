@@ -0,0 +1,140 @@
+"""NumPy 向量索引测试"""
+
+import numpy as np
+import pytest
+from src.numpy_index import NumpyVectorIndex
+
+
+def random_vectors(n, dim=16, seed=0):
+    return np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+
+
+def brute_force(vectors, query, k, space="l2"):
+    if space == "l2":
+        distances = ((vectors - query) ** 2).sum(axis=1)
+    else:
+        normed = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        distances = 1.0 - normed @ (query / np.linalg.norm(query))
+    return np.argsort(distances, kind="stable")[:k].tolist(), np.sort(distances)[:k]
+
+
+def fill(index, vectors):
+    ids = [f"doc-{i}" for i in range(len(vectors))]
+    index.upsert(
+        ids, vectors.tolist(),
+        metadatas=[{"source": f"{i}.txt"} for i in range(len(vectors))],
+        documents=[f"片段 {i}" for i in range(len(vectors))],
+    )
+    return ids
+
+
+@pytest.mark.parametrize("space", ["l2", "cosine"])
+def test_flat_search_matches_brute_force(tmp_path, space):
+    """精确检索的结果与距离与暴力计算一致（距离定义同 Chroma）"""
+    vectors = random_vectors(500)
+    index = NumpyVectorIndex(tmp_path, space=space)
+    fill(index, vectors)
+
+    query = random_vectors(1, seed=1)[0]
+    expected_rows, expected_distances = brute_force(vectors, query, 10, space)
+    hits = index.similarity_search_by_vector_with_score(query.tolist(), k=10)
+    assert [doc.id for doc, _ in hits] == [f"doc-{i}" for i in expected_rows]
+    assert np.allclose([d for _, d in hits], expected_distances, atol=1e-3)
+    assert hits[0][0].metadata == {"source": f"{expected_rows[0]}.txt"}
+
+
+def test_upsert_overwrite_delete_and_reopen(tmp_path):
+    """同 ID 原位覆盖，删除的行不再返回且会被复用，重新打开后数据不变"""
+    vectors = random_vectors(100)
+    index = NumpyVectorIndex(tmp_path)
+    ids = fill(index, vectors)
+
+    index.upsert(["doc-0"], [(vectors[5] + 0.001).tolist()], documents=["覆盖"])
+    assert index.count() == 100
+    top = index.similarity_search_by_vector(vectors[5].tolist(), k=2)
+    assert {doc.id for doc in top} == {"doc-0", "doc-5"}
+
+    index.delete(["doc-5"])
+    assert index.count() == 99
+    assert index.similarity_search_by_vector(vectors[5].tolist(), k=1)[0].id == "doc-0"
+    index.upsert(["new"], [vectors[7].tolist()], documents=["新片段"])
+    assert index.stats()["count"] == 100
+    assert index._size == 100  # 复用了被删除的行
+
+    before = index.similarity_search_by_vector_with_score(vectors[9].tolist(), k=5)
+    index.close()
+
+    reopened = NumpyVectorIndex(tmp_path, space="cosine", dtype="float16")
+    assert reopened.space == "l2"  # 以索引创建时的设置为准
+    assert reopened.count() == 100
+    after = reopened.similarity_search_by_vector_with_score(vectors[9].tolist(), k=5)
+    assert [doc.id for doc, _ in after] == [doc.id for doc, _ in before]
+    assert reopened.get(ids=["new", ids[1]])["documents"] == ["新片段", "片段 1"]
+    reopened.close()
+
+
+def test_ivf_recall(tmp_path):
+    """IVF 探测全部簇时与精确检索一致，只探测部分簇时召回率仍较高"""
+    vectors = random_vectors(2000)
+    flat = NumpyVectorIndex(tmp_path / "flat")
+    ivf = NumpyVectorIndex(tmp_path / "ivf", nlist=16, nprobe=16)
+    fill(flat, vectors)
+    fill(ivf, vectors)
+    # 写入时即完成训练，检索不再触发训练
+    assert ivf.centroids is not None
+
+    queries = random_vectors(20, seed=2)
+    truth = [[row for row, _ in flat.search(q, 10)] for q in queries]
+    assert [[row for row, _ in ivf.search(q, 10)] for q in queries] == truth
+    assert ivf.stats()["nlist"] == 16
+
+    ivf.nprobe = 8
+    found = sum(
+        len(set(expected) & {row for row, _ in ivf.search(q, 10)})
+        for q, expected in zip(queries, truth)
+    )
+    assert found / (10 * len(queries)) >= 0.8
+
+
+def test_float16_storage(tmp_path):
+    """float16 存储的前几名结果与 float32 基本一致"""
+    vectors = random_vectors(300)
+    exact = NumpyVectorIndex(tmp_path / "f32")
+    half = NumpyVectorIndex(tmp_path / "f16", dtype="float16")
+    fill(exact, vectors)
+    fill(half, vectors)
+
+    assert (tmp_path / "f16" / "vectors.bin").stat().st_size * 2 == (
+        tmp_path / "f32" / "vectors.bin"
+    ).stat().st_size
+    query = random_vectors(1, seed=3)[0]
+    expected = [row for row, _ in exact.search(query, 5)]
+    assert len(set(expected) & {row for row, _ in half.search(query, 5)}) >= 4
+
+
+def test_filtered_search(tmp_path):
+    """where 过滤在索引内完成：只返回满足条件的片段，结果与对子集暴力检索一致"""
+    vectors = random_vectors(300)
+    index = NumpyVectorIndex(tmp_path, nlist=4, nprobe=1)
+    ids = [f"doc-{i}" for i in range(len(vectors))]
+    index.upsert(
+        ids, vectors.tolist(),
+        metadatas=[
+            {"source": f"{i % 3}.txt", "doc_type": "pdf" if i % 2 else "md", "modified_at": i}
+            for i in range(len(vectors))
+        ],
+    )
+
+    where = {"$and": [{"doc_type": {"$in": ["pdf"]}}, {"modified_at": {"$gte": 100}}]}
+    subset = [i for i in range(len(vectors)) if i % 2 and i >= 100]
+    query = random_vectors(1, seed=4)[0]
+    expected, _ = brute_force(vectors[subset], query, 5)
+    hits = index.similarity_search_by_vector(query.tolist(), k=5, filter=where)
+    assert [doc.id for doc in hits] == [f"doc-{subset[i]}" for i in expected]
+
+    assert index.similarity_search_by_vector(query.tolist(), k=5, filter={"source": "x"}) == []
+    result = index.get(ids=ids[:6], where={"$or": [{"source": "0.txt"}, {"source": "2.txt"}]})
+    assert result["ids"] == ["doc-0", "doc-2", "doc-3", "doc-5"]
+    assert index.get(where={"modified_at": {"$lt": 3}})["ids"] == ids[:3]
+    with pytest.raises(ValueError):
+        index.get(where={"source": {"$like": "%"}})
@@ -0,0 +1,49 @@
+"""查询微批处理测试"""
+
+import asyncio
+
+from langchain_core.embeddings import Embeddings
+from src.query_batcher import EmbeddingBatcher
+
+
+class RecordingEmbeddings(Embeddings):
+    """记录每次批量调用的假 Embedding 模型"""
+
+    def __init__(self):
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(text))] for text in texts]
+
+    def embed_query(self, text):
+        return [float(len(text))]
+
+
+def test_concurrent_queries_share_one_batch():
+    """测试并发查询被合并为一次批量计算"""
+    base = RecordingEmbeddings()
+
+    async def run():
+        batcher = EmbeddingBatcher(base, max_batch_size=16, max_wait_ms=20)
+        vectors = await asyncio.gather(*(batcher.embed("x" * i) for i in range(1, 6)))
+        return batcher, vectors
+
+    batcher, vectors = asyncio.run(run())
+    assert vectors == [[1.0], [2.0], [3.0], [4.0], [5.0]]
+    assert len(base.calls) == 1
+    assert batcher.stats()["avg_batch_size"] == 5
+
+
+def test_full_batch_dispatches_immediately():
+    """测试攒满批次后立即计算"""
+    base = RecordingEmbeddings()
+
+    async def run():
+        batcher = EmbeddingBatcher(base, max_batch_size=2, max_wait_ms=1000)
+        return await asyncio.wait_for(
+            asyncio.gather(batcher.embed("a"), batcher.embed("bb")), timeout=0.5
+        )
+
+    assert asyncio.run(run()) == [[1.0], [2.0]]
+    assert base.calls == [["a", "bb"]]
@@ -0,0 +1,94 @@
+"""追问改写测试"""
+
+import asyncio
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from src.query_condenser import QueryCondenser, needs_condense
+
+HISTORY = [
+    HumanMessage(content="网关如何限制并发请求？"),
+    AIMessage(content="网关按令牌桶限制并发请求，详见文档片段 1。"),
+]
+
+
+class RecordingLLM:
+    """返回固定改写结果，并记录每次调用"""
+
+    def __init__(self, reply="网关限制并发请求失败时会怎样？"):
+        self.reply = reply
+        self.calls = []
+
+    def invoke(self, messages):
+        self.calls.append(messages)
+        if isinstance(self.reply, Exception):
+            raise self.reply
+        return AIMessage(content=self.reply)
+
+    async def ainvoke(self, messages):
+        return self.invoke(messages)
+
+
+@pytest.mark.parametrize("query", [
+    "它失败了怎么办？", "那缺点呢？", "还有其他限制吗？", "默认值？", "What about its timeout?",
+    "怎么关闭它？", "Why is that?",
+])
+def test_follow_ups_need_condense(query):
+    assert needs_condense(query, HISTORY)
+
+
+@pytest.mark.parametrize("query, history", [
+    ("它失败了怎么办？", []),
+    ("数据库如何定期备份历史记录？", HISTORY),
+    ("How does the scheduler rotate audit logs?", HISTORY),
+    # 指代词只是复合词或词首的一部分、this / that 引导从句、短而完整的问题
+    ("其它支付方式有哪些？", HISTORY),
+    ("和平区的门店营业时间是几点？", HISTORY),
+    ("Explain the error that appears on login", HISTORY),
+    ("如何申请退款？", HISTORY),
+])
+def test_first_turn_and_self_contained_queries_skip(query, history):
+    assert not needs_condense(query, history)
+
+
+def test_rewrite_is_cached_and_skips_llm_when_gated():
+    """只有追问调用 LLM；相同历史下的相同追问命中缓存"""
+    llm = RecordingLLM()
+    condenser = QueryCondenser(llm)
+
+    assert condenser.condense("数据库如何定期备份历史记录？", HISTORY) == "数据库如何定期备份历史记录？"
+    assert llm.calls == []
+
+    assert condenser.condense("它失败了怎么办？", HISTORY) == "网关限制并发请求失败时会怎样？"
+    assert condenser.condense("它失败了怎么办？", HISTORY) == "网关限制并发请求失败时会怎样？"
+    assert len(llm.calls) == 1
+    assert "网关如何限制并发请求" in llm.calls[0][-1].content
+
+    # 历史不同时不复用改写结果
+    other = [HumanMessage(content="调度器如何轮转审计日志？"), AIMessage(content="每小时一次。")]
+    asyncio.run(condenser.acondense("它失败了怎么办？", other))
+    assert len(llm.calls) == 2
+    stats = condenser.stats()
+    assert (stats["skipped"], stats["hits"], stats["rewrites"]) == (1, 1, 2)
+
+
+def test_reply_is_cleaned():
+    """去掉推理模型的思考过程与标签"""
+    llm = RecordingLLM("<think>用户指的是网关。</think>\n独立问题：“网关限流失败时会怎样？”\n")
+    assert QueryCondenser(llm).condense("它失败了怎么办？", HISTORY) == "网关限流失败时会怎样？"
+
+
+@pytest.mark.parametrize("reply", [RuntimeError("busy"), "", "<think>未完成的思考"])
+def test_falls_back_to_original_query(reply):
+    """LLM 出错或结果为空时使用原问题，且不缓存"""
+    condenser = QueryCondenser(RecordingLLM(reply))
+    assert condenser.condense("它失败了怎么办？", HISTORY) == "它失败了怎么办？"
+    assert condenser.stats()["failures"] == 1
+    assert condenser.stats()["entries"] == 0
+
+
+def test_cache_is_bounded():
+    condenser = QueryCondenser(RecordingLLM(), cache_max_entries=2)
+    for query in ("它呢？", "那个呢？", "这些呢？"):
+        condenser.condense(query, HISTORY)
+    assert condenser.stats()["entries"] == 2
@@ -0,0 +1,66 @@
+"""交叉编码器重排序测试"""
+
+from langchain_core.documents import Document
+from src.reranker import CrossEncoderReranker
+
+
+class RecordingCrossEncoder:
+    """按片段中包含的问题字符数打分，并记录每次批量调用"""
+
+    def __init__(self):
+        self.calls = []
+
+    def predict(self, pairs, batch_size=32, **kwargs):
+        self.calls.append(list(pairs))
+        return [float(sum(ch in text for ch in set(query))) for query, text in pairs]
+
+
+def make_docs():
+    return [
+        Document(id="a", page_content="无关内容", metadata={"source": "a.txt"}),
+        Document(id="b", page_content="退货流程说明", metadata={"source": "b.txt"}),
+        Document(id="c", page_content="退货", metadata={"source": "c.txt"}),
+    ]
+
+
+def test_rerank_orders_by_score_and_keeps_top_n():
+    """按交叉编码器分数重排，只保留前 top_n 个并附带分数"""
+    model = RecordingCrossEncoder()
+    reranker = CrossEncoderReranker(lambda: model)
+
+    docs = reranker.rerank("退货流程", make_docs(), top_n=2)
+    assert [doc.id for doc in docs] == ["b", "c"]
+    assert docs[0].metadata["rerank_score"] > docs[1].metadata["rerank_score"]
+    assert docs[0].metadata["source"] == "b.txt"
+
+
+def test_scores_are_batched_and_cached():
+    """未命中缓存的片段分批打分，重复的（问题, 片段）直接命中缓存"""
+    model = RecordingCrossEncoder()
+    reranker = CrossEncoderReranker(lambda: model, batch_size=2)
+    docs = make_docs()
+
+    reranker.rerank("退货流程", docs, top_n=3)
+    assert [len(call) for call in model.calls] == [2, 1]
+
+    reranker.rerank("退货流程", docs + [Document(page_content="退货地址")], top_n=3)
+    assert [len(call) for call in model.calls] == [2, 1, 1]
+    stats = reranker.stats()
+    assert stats["hits"] == 3
+    assert stats["misses"] == 4
+
+
+def test_model_loaded_lazily():
+    """创建时不加载模型，第一次打分时才加载"""
+    loads = []
+
+    def factory():
+        loads.append(1)
+        return RecordingCrossEncoder()
+
+    reranker = CrossEncoderReranker(factory)
+    assert not reranker.loaded
+    assert reranker.rerank("问题", [], top_n=3) == []
+    assert not loads
+    reranker.rerank("问题", make_docs(), top_n=1)
+    assert loads == [1]
@@ -0,0 +1,55 @@
+"""检索过滤条件测试"""
+
+from datetime import date, datetime
+
+import pytest
+from src.search_filters import SearchFilter, to_timestamp
+
+
+def test_empty_filter():
+    """没有任何条件时不生成 where，请求参数全为空时不构造过滤条件"""
+    assert SearchFilter().where() is None
+    assert SearchFilter().is_empty()
+    assert SearchFilter.from_dict({"tenant": "", "source": None}) is None
+    assert SearchFilter.from_dict(None) is None
+
+
+def test_where_expression():
+    """单个条件直接返回，多个条件用 $and 组合；文档类型统一为小写扩展名"""
+    assert SearchFilter(source="a.pdf").where() == {"source": {"$in": ["a.pdf"]}}
+
+    where = SearchFilter(
+        source=["a.pdf", "b.md"], doc_type=[".PDF", "md"], date_from="2025-01-01",
+        date_to=date(2025, 1, 31),
+    ).where()
+    conditions = where["$and"]
+    assert conditions[0] == {"source": {"$in": ["a.pdf", "b.md"]}}
+    assert conditions[1] == {"doc_type": {"$in": ["pdf", "md"]}}
+    assert conditions[2] == {"modified_at": {"$gte": datetime(2025, 1, 1).timestamp()}}
+    # 只给日期时上界包含当天
+    end = conditions[3]["modified_at"]["$lte"]
+    assert datetime(2025, 1, 31, 23, 59).timestamp() < end < datetime(2025, 2, 1).timestamp()
+
+
+def test_tenant_only_filter():
+    """只指定租户时选择集合，不产生元数据条件"""
+    search_filter = SearchFilter.from_dict({"tenant": "acme"})
+    assert search_filter.tenant == "acme"
+    assert search_filter.where() is None
+    assert search_filter.to_dict() == {"tenant": "acme"}
+
+
+@pytest.mark.parametrize("values", [
+    {"tenant": "../etc"},
+    {"tenant": "a" * 64},
+    {"date_from": "昨天"},
+])
+def test_invalid_values(values):
+    with pytest.raises(ValueError):
+        SearchFilter(**values)
+
+
+def test_to_timestamp():
+    assert to_timestamp(1700000000) == 1700000000.0
+    assert to_timestamp("2025-03-01T12:00:00") == datetime(2025, 3, 1, 12).timestamp()
+    assert to_timestamp(date(2025, 3, 1)) == datetime(2025, 3, 1).timestamp()
@@ -0,0 +1,90 @@
+"""会话存储测试"""
+
+import time
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from src.session_store import InMemorySessionStore, SqliteSessionStore, create_session_store
+
+
+def turn(i):
+    return [HumanMessage(content=f"问题 {i}"), AIMessage(content=f"回答 {i}")]
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    store = create_session_store(
+        request.param, max_messages=4, max_sessions=100, path=tmp_path / "sessions.sqlite3"
+    )
+    yield store
+    store.close()
+
+
+def test_trim_on_write_and_window(store):
+    """写入时裁剪到 max_messages 条，读取只返回需要的最近几条"""
+    for i in range(5):
+        store.append("s1", turn(i))
+
+    history = store.load("s1")
+    assert [m.content for m in history] == ["问题 3", "回答 3", "问题 4", "回答 4"]
+    assert isinstance(history[0], HumanMessage) and isinstance(history[1], AIMessage)
+    assert [m.content for m in store.load("s1", 2)] == ["问题 4", "回答 4"]
+    assert store.load("s1", 0) == []
+    assert store.load("unknown") == []
+
+
+def test_sessions_are_isolated_and_clearable(store):
+    store.append("a", turn(1))
+    store.append("b", turn(2))
+    assert len(store) == 2
+    store.clear("a")
+    assert store.load("a") == []
+    assert [m.content for m in store.load("b")] == ["问题 2", "回答 2"]
+    assert len(store) == 1
+
+
+def test_memory_lru_eviction():
+    """超过会话数上限时淘汰最久未使用的会话（读取也算使用）"""
+    store = InMemorySessionStore(max_messages=2, max_sessions=2)
+    store.append("a", turn(1))
+    store.append("b", turn(2))
+    store.load("a")
+    store.append("c", turn(3))
+    assert store.load("b") == []
+    assert store.load("a") and store.load("c")
+    assert store.stats()["evicted"] == 1
+
+
+def test_idle_eviction(tmp_path):
+    for store in (
+        InMemorySessionStore(max_messages=2, idle_ttl=0.05),
+        SqliteSessionStore(tmp_path / "sessions.sqlite3", max_messages=2, idle_ttl=0.05),
+    ):
+        store.append("old", turn(1))
+        time.sleep(0.1)
+        store.append("new", turn(2))
+        assert store.evict_idle() == 1
+        assert store.load("old") == [] and store.load("new")
+        store.close()
+
+
+def test_sqlite_persists_across_instances(tmp_path):
+    path = tmp_path / "sessions.sqlite3"
+    first = SqliteSessionStore(path, max_messages=4)
+    first.append("s", turn(1))
+    first.close()
+
+    second = SqliteSessionStore(path, max_messages=4)
+    assert [m.content for m in second.load("s")] == ["问题 1", "回答 1"]
+    second.close()
+
+
+def test_memory_load_counts_as_activity():
+    """读取刷新最后活动时间，与 LRU 顺序一致"""
+    store = InMemorySessionStore(max_messages=2, idle_ttl=0.05)
+    store.append("idle", turn(1))
+    store.append("read", turn(2))
+    time.sleep(0.1)
+    assert store.load("read")
+    assert store.evict_idle() == 1
+    assert store.load("idle") == [] and store.load("read")
@@ -0,0 +1,129 @@
+"""结构化文本提取与按章节分段测试"""
+
+import pytest
+from src.document_processor import DocumentProcessor
+from src.structured_text import docx_sections, markdown_sections
+
+MARKDOWN = """---
+title: 部署
+---
+# 部署指南
+
+介绍 **网关** 与 `rate_limit`，详见[文档](http://example.com)。
+
+## 网关
+
+- 令牌桶
+  - 每秒 *10* 个
+1. 先部署
+
+| 参数 | 默认值 |
+|------|--------|
+| rate | 10 |
+
+```yaml
+# 不是标题
+a: 1 | 2
+```
+
+存储
+----
+数据保存在 SQLite。
+"""
+
+
+def test_markdown_sections():
+    """标题构成章节路径；列表、表格与代码块按结构转为纯文本"""
+    sections = markdown_sections(MARKDOWN)
+    assert [path for path, _ in sections] == ["部署指南", "部署指南 > 网关", "部署指南 > 存储"]
+
+    assert sections[0][1] == "部署指南\n\n介绍 网关 与 rate_limit，详见文档。"
+    gateway = sections[1][1]
+    assert "- 令牌桶\n  - 每秒 10 个\n1. 先部署" in gateway
+    assert "参数 | 默认值\nrate | 10" in gateway
+    assert "# 不是标题\na: 1 | 2" in gateway
+    assert "---" not in gateway
+    assert sections[2][1] == "存储\n数据保存在 SQLite。"
+
+
+def test_docx_sections(tmp_path):
+    """按文档顺序提取标题、列表与表格（合并单元格只保留一次）"""
+    from docx import Document
+
+    doc = Document()
+    doc.add_heading("运维手册", 0)
+    doc.add_heading("网关", 1)
+    doc.add_paragraph("网关负责限流。")
+    doc.add_paragraph("令牌桶", style="List Bullet")
+    table = doc.add_table(rows=2, cols=3)
+    table.cell(0, 0).merge(table.cell(0, 1)).text = "参数"
+    table.cell(0, 2).text = "说明"
+    for col, text in enumerate(["rate", "10", "每秒请求数"]):
+        table.cell(1, col).text = text
+    doc.add_heading("存储", 1)
+    doc.add_paragraph("数据保存在 SQLite。")
+    path = tmp_path / "manual.docx"
+    doc.save(str(path))
+
+    sections = docx_sections(path)
+    assert sections == [
+        ("运维手册", "运维手册"),
+        ("运维手册 > 网关", "网关\n\n网关负责限流。\n- 令牌桶\n\n参数 | 说明\nrate | 10 | 每秒请求数"),
+        ("运维手册 > 存储", "存储\n\n数据保存在 SQLite。"),
+    ]
+
+
+def test_docx_outline_level_body_text(tmp_path):
+    """大纲级别 0-8 视为标题，9 表示正文"""
+    from docx import Document
+    from docx.oxml import OxmlElement
+    from docx.oxml.ns import qn
+
+    doc = Document()
+    for text, level in [("概述", "0"), ("正文段落。", "9")]:
+        paragraph = doc.add_paragraph(text)
+        outline = OxmlElement("w:outlineLvl")
+        outline.set(qn("w:val"), level)
+        paragraph._p.get_or_add_pPr().append(outline)
+    path = tmp_path / "outline.docx"
+    doc.save(str(path))
+
+    assert docx_sections(path) == [("概述", "概述\n\n正文段落。")]
+
+
+@pytest.fixture
+def processor():
+    processor = DocumentProcessor()
+    processor.extraction_cache = None
+    return processor
+
+
+def test_split_sections_merges_siblings_and_keeps_boundaries(processor):
+    """同一上级章节下的短章节合并，片段不跨越顶级章节，长章节在章节内分段"""
+    long_text = "限流\n\n" + " ".join(f"第 {i} 条规则。" for i in range(300))
+    sections = [
+        ("指南 > 网关", "网关\n\n说明。"),
+        ("指南 > 存储", "存储\n\n说明。"),
+        ("附录", "附录\n\n术语表。"),
+        ("附录 > 限流", long_text),
+    ]
+    chunks = list(processor._split_sections(sections))
+    whole = "\n\n".join(text for _, text in sections)
+
+    assert chunks[0] == ("网关\n\n说明。\n\n存储\n\n说明。", 0, "指南")
+    assert chunks[1][0].startswith("附录\n\n术语表。") and chunks[1][2] == "附录"
+    assert len(chunks) > 3
+    for chunk, start, _ in chunks:
+        assert whole[start:start + len(chunk)] == chunk
+        assert len(chunk) <= processor.chunk_size
+    assert {path for _, _, path in chunks[2:]} == {"附录 > 限流"}
+
+
+def test_markdown_chunks_carry_section_path(processor, tmp_path):
+    path = tmp_path / "guide.md"
+    path.write_text(MARKDOWN, encoding="utf-8")
+    docs = processor.load_document(str(path))
+    # 全部章节都在"部署指南"之下且总长不超过 CHUNK_SIZE，合并为一个片段
+    assert [doc.metadata["section_path"] for doc in docs] == ["部署指南"]
+    assert docs[0].page_content.startswith("部署指南\n\n介绍 网关")
+    assert docs[0].page_content.endswith("数据保存在 SQLite。")
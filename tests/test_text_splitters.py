@@ -0,0 +1,69 @@
+"""按 token 分段测试"""
+
+from src.context_packer import estimate_tokens
+from src.text_splitters import SentenceTokenSplitter, split_sentences
+
+
+def lengths(texts):
+    return [estimate_tokens(text) for text in texts]
+
+
+def test_split_sentences_cjk_and_english():
+    text = "网关会限制并发请求。失败时会重试三次！为什么？\nThe gateway caches tokens. Version 1.5 is out"
+    sentences = split_sentences(text)
+    assert "".join(sentences) == text
+    assert sentences == [
+        "网关会限制并发请求。", "失败时会重试三次！", "为什么？\n",
+        "The gateway caches tokens. ", "Version 1.5 is out",
+    ]
+
+
+def test_split_sentences_keeps_closing_quotes():
+    assert split_sentences("他说：“已完成。”随后退出。") == ["他说：“已完成。”", "随后退出。"]
+
+
+def test_chunks_end_on_sentence_boundaries_within_limit():
+    text = "".join(f"第{i}条规则要求网关限制并发请求。" for i in range(40))
+    splitter = SentenceTokenSplitter(lengths, chunk_size=50)
+    chunks = splitter.split_text(text)
+
+    assert len(chunks) > 1
+    assert "".join(chunks) == text
+    for chunk in chunks:
+        assert chunk.endswith("。")
+        assert estimate_tokens(chunk) <= 50
+
+
+def test_overlap_carries_whole_sentences():
+    sentences = [f"规则{i}需要校验访问权限。" for i in range(12)]
+    splitter = SentenceTokenSplitter(lengths, chunk_size=40, chunk_overlap=15)
+    chunks = splitter.split_text("".join(sentences))
+
+    for previous, chunk in zip(chunks, chunks[1:]):
+        last_sentence = split_sentences(previous)[-1]
+        assert chunk.startswith(last_sentence)
+        assert estimate_tokens(chunk) <= 40
+
+
+def test_long_sentence_is_hard_split():
+    text = "无标点的长段落" * 40
+    splitter = SentenceTokenSplitter(lengths, chunk_size=30)
+    chunks = splitter.split_text(text)
+
+    assert "".join(chunks) == text
+    assert all(estimate_tokens(chunk) <= 30 for chunk in chunks)
+    assert estimate_tokens(chunks[0]) == 30
+
+
+def test_joined_chunk_is_remeasured():
+    """拼接后的 token 数多于各句之和时（拼接处分词不同），按整体计数重新装入"""
+    def joined_lengths(texts):
+        # 每个句子衔接处多算 3 个 token
+        return [len(text) + 3 * max(text.count("。") - 1, 0) for text in texts]
+
+    text = "".join(f"规则{i}要求校验。" for i in range(30))
+    splitter = SentenceTokenSplitter(joined_lengths, chunk_size=40)
+    chunks = splitter.split_text(text)
+
+    assert "".join(chunks) == text
+    assert all(length <= 40 for length in joined_lengths(chunks))